@@ -21,10 +21,14 @@ import os
 from stable_baselines3 import PPO
 from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecMonitor, VecEnv
 from stable_baselines3.common.monitor import Monitor
+from callbacks import TelemetryCallback
 
-def train_agent(env, total_timesteps=100_000,call_back=None, model_name="ppo_microgrid_model_placeholder"):
+def train_agent(env, total_timesteps=100_000,call_back=None, model_name="ppo_microgrid_model_placeholder", telemetry=True):
     """
     env: either a gymnasium.Env or a VecEnv
+    call_back: callback or list of callbacks passed to model.learn
+    telemetry: also install a TelemetryCallback (throughput, rollout vs update time,
+               worker latency; telemetry/ in TensorBoard and telemetry.csv in the run directory)
     """
 
     # 1) If it's not already a VecEnv, wrap it into one:
@@ -43,6 +47,9 @@ def train_agent(env, total_timesteps=100_000,call_back=None, model_name="ppo_mic
 
     # Create and train PPO
     model = PPO("MlpPolicy", env, verbose=1,tensorboard_log="./tensorboard/")
-    model.learn(total_timesteps=total_timesteps, callback=call_back)
+    call_backs = list(call_back) if isinstance(call_back, list) else [call_back] if call_back is not None else []
+    if telemetry:
+        call_backs.append(TelemetryCallback())
+    model.learn(total_timesteps=total_timesteps, callback=call_backs)
     model.save(model_name)
     return model
@@ -0,0 +1,475 @@
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+import scenarios
+from env import MicrogridEnv
+from vec_env import MicrogridVecEnv
+from reward import compute_reward, REWARD_DTYPE
+from param_store import load_params, compile_params
+from scenarios import generate_mixed_scenario_dataset, DEFAULT_EVENTS
+from state_action import PARAM_KEYS
+from config import HORIZON
+
+PARAM_DIR = "data/parameters/1year"
+BENCH_HISTORY = "../output/benchmarks/history.json"
+SEED = 19
+EVAL_HORIZONS = (48, 1752, 7008)
+ROLLOUT_ENVS = (1, 4, 16)
+ROLLOUT_STEPS = 256  # PPO n_steps per env of one timed rollout
+REGRESSION_THRESHOLD = 0.10
+
+# Import-time budgets (seconds, fresh interpreter) of the modules env workers load; none of
+# them may pull in a plotting or RL-framework dependency (HEAVY_MODULES)
+IMPORT_BUDGETS = {
+    "env": 0.3,
+    "dynamics": 0.2,
+    "reward": 0.2,
+    "scenarios": 0.3,
+    "monitor": 0.2,
+    "param_store": 0.2,
+    "shm_worker": 0.3,
+    "test": 0.3,
+}
+HEAVY_MODULES = ("matplotlib", "pandas", "torch", "stable_baselines3")
+
+
+# === SYNTHETIC DATASET ===
+
+def write_synthetic_params(path, hours=8760, seed=SEED):
+    """
+    Write a parameter directory (one single-column CSV per entry of PARAM_KEYS) with
+    plausible daily profiles, for running the benchmarks without the real dataset.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(path, exist_ok=True)
+    h = np.arange(hours)
+    hour = h % 24
+    load = 50 + 20 * np.sin(2 * np.pi * h / 24) + rng.normal(0, 3, hours)
+
+    # EV sessions of 10 h: available, arrival and departure flags, energy required
+    A = np.zeros(hours, dtype=int)
+    for start in range(0, hours - 10, 24):
+        if rng.random() < 0.5:
+            A[start + 8:start + 18] = 1
+    session_start = ((A == 1) & (np.r_[0, A[:-1]] == 0)).astype(int)
+    leave_possible = ((A == 1) & (np.r_[A[1:], 0] == 0)).astype(int)
+    Eev_required = A * np.repeat(rng.uniform(50, 70, hours // 24 + 1), 24)[:hours]
+
+    price_import = rng.uniform(0.02, 0.06, hours)
+    series = {
+        "load": load,
+        "price_import": price_import, "price_export": price_import,
+        "price_ev": np.where((hour >= 16) & (hour < 21), 0.38, 0.18),
+        "rho_gas": 0.3, "Cop_ma_wt": 0.02, "Cop_ma_pv": 0.01, "rho_fuel": 11.5, "C_startup": 5.0, "C_degrad_es": 0.02,
+        "eta_chp": 0.4, "eta_dg": 0.3, "eta_ch_es": 0.9, "eta_dis_es": 0.9, "eta_ch_ev": 0.95, "alpha_chp": 0.8,
+        "H_demand": np.where(np.isin(hour, (6, 7, 8, 9, 18, 19, 20, 21)), 0.3, 0.0),
+        "P_grid_import_max": 1.5 * load.max(), "P_grid_export_max": load.max(),
+        "PWT_max": rng.uniform(0, 20, hours), "PPV_max": np.clip(30 * np.sin((hour - 6) / 12 * np.pi), 0, None),
+        "PCHP_max": 25.0, "PDG_max": 40.0, "Pdis_es_max": 30.0, "Pch_es_max": 30.0,
+        "PEV_max": 60.0,
+        "Ees_min": 40.0, "Ees_max": 200.0,
+        "Eev_required": Eev_required,
+        "A": A, "session_start": session_start, "leave_possible": leave_possible,
+    }
+    for key in PARAM_KEYS:
+        values = np.broadcast_to(series[key], (hours,))
+        pd.DataFrame({key: values}).to_csv(os.path.join(path, f"{key}.csv"), index=False)
+    return path
+
+
+# === TIMING ===
+
+def measure(fn, ops=1, repeat=5):
+    """
+    Time `fn` (called without arguments) and return its result record.
+
+    Args:
+        fn: the work to time
+        ops: operations performed by one call (results are reported per operation)
+        repeat: timed rounds; each round calls fn `number` times, with `number`
+                chosen so that a round lasts at least 0.2 s
+
+    Returns:
+        dict: 'median_s' / 'best_s' per operation, 'ops_per_s', 'ops', 'number', 'repeat'
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    per_op = np.array(timer.repeat(repeat=repeat, number=number)) / (number * ops)
+    median = float(np.median(per_op))
+    return {
+        "median_s": median,
+        "best_s": float(per_op.min()),
+        "ops_per_s": 1.0 / median if median > 0 else float("inf"),
+        "ops": ops,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+# === BENCHMARKS ===
+# Each takes the shared context and the repeat count, and returns {name: result}
+
+def bench_env(ctx, repeat):
+    """MicrogridEnv step and reset rate, and _get_obs alone"""
+    env = MicrogridEnv({}, ctx["scenario_1752"])
+    actions = np.random.default_rng(SEED).uniform(-1, 1, (1000, 7)).astype(np.float32)
+    actions[:, 2:] = np.abs(actions[:, 2:])
+    env.reset(seed=SEED)
+
+    def steps():
+        for action in actions:
+            _, _, terminated, _, _ = env.step(action)
+            if terminated:
+                env.reset()
+
+    def resets():
+        for _ in range(100):
+            env.reset()
+
+    results = {"env_step": measure(steps, ops=len(actions), repeat=repeat),
+               "env_reset": measure(resets, ops=100, repeat=repeat)}
+
+    events_env = MicrogridEnv({}, ctx["scenario_1752"], randomize_events=DEFAULT_EVENTS)
+    events_env.reset(seed=SEED)
+
+    def event_resets():
+        for _ in range(100):
+            events_env.reset()
+
+    results["env_reset[events]"] = measure(event_resets, ops=100, repeat=repeat)
+
+    env.reset(seed=SEED)
+    for action in actions[:24]:
+        env.step(action)
+
+    def observations():
+        for _ in range(1000):
+            env._get_obs()
+
+    results["env_get_obs"] = measure(observations, ops=1000, repeat=repeat)
+    return results
+
+
+def bench_reward(ctx, repeat):
+    """compute_reward alone, with typical mid-episode values"""
+    out = np.zeros((), dtype=REWARD_DTYPE)
+    kwargs = dict(
+        t=10,
+        p_import=30.0, p_export=0.0, p_wt=12.0, p_pv=8.0, p_chp=10.0, p_dg=0.0, p_dis_es=5.0, p_ch_es=0.0, p_ch_ev=20.0,
+        price_import=0.04, price_export=0.04, price_ev=0.18,
+        Cop_ma_wt=0.02, Cop_ma_pv=0.01, rho_gas=0.3, rho_fuel=11.5, C_startup=5.0, C_degrad_es=0.02,
+        eta_chp=0.4, eta_dg=0.3,
+        u_chp=1, u_dg=0, prev_u_chp=1, prev_u_dg=0,
+        load=55.0, H_demand=0.3, H_chp=8.0,
+        soc_es=120.0, soc_ev=40.0, ees_min=40.0, ees_max=200.0,
+        leave_possible=1, Eev_required=60.0,
+    )
+
+    def rewards():
+        for _ in range(1000):
+            compute_reward(**kwargs)
+
+    def rewards_out():
+        for _ in range(1000):
+            compute_reward(**kwargs, out=out)
+
+    return {"compute_reward": measure(rewards, ops=1000, repeat=repeat),
+            "compute_reward[out]": measure(rewards_out, ops=1000, repeat=repeat)}
+
+
+def bench_params(ctx, repeat):
+    """load_params from the compiled store, and compiling the store from the CSVs"""
+    path = ctx["param_dir"]
+    with tempfile.TemporaryDirectory() as tmp:
+        store_path = os.path.join(tmp, "params.store")
+        return {"load_params": measure(lambda: load_params(path), repeat=repeat),
+                "compile_params": measure(lambda: compile_params(path, store_path), repeat=min(repeat, 3))}
+
+
+def bench_scenarios(ctx, repeat):
+    """generate_mixed_scenario_dataset: generated from scratch, and read back from the disk cache"""
+    params = ctx["params"]
+
+    def cold():
+        scenarios._memory_cache.clear()
+        generate_mixed_scenario_dataset(params, seed=SEED, cache_dir=None)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        generate_mixed_scenario_dataset(params, seed=SEED, cache_dir=cache_dir)
+
+        def cached():
+            scenarios._memory_cache.clear()
+            generate_mixed_scenario_dataset(params, seed=SEED, cache_dir=cache_dir)
+
+        return {"scenario_generate": measure(cold, repeat=repeat),
+                "scenario_generate[disk_cache]": measure(cached, repeat=repeat)}
+
+
+def bench_evaluation(ctx, repeat):
+    """test.evaluate_policy (untrained PPO policy) and test.evaluate_baseline per horizon"""
+    from test import evaluate_policy, evaluate_baseline
+    policy = ctx["policy"]
+    results = {}
+    for horizon in EVAL_HORIZONS:
+        scenario = generate_mixed_scenario_dataset(ctx["params"], total_hours=horizon, seed=SEED, cache_dir=None)
+        rounds = repeat if horizon < HORIZON else min(repeat, 3)
+        results[f"evaluate_policy[{horizon}h]"] = measure(
+            lambda: evaluate_policy(policy, scenario, horizon), ops=horizon, repeat=rounds)
+        results[f"evaluate_baseline[{horizon}h]"] = measure(
+            lambda: evaluate_baseline(scenario, horizon), ops=horizon, repeat=rounds)
+    return results
+
+
+def bench_rollout(ctx, repeat):
+    """PPO rollout collection (n_steps per env, policy forward passes included) per env count"""
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import VecMonitor
+    results = {}
+    for n_envs in ROLLOUT_ENVS:
+        env = VecMonitor(make_vec_env(ctx, n_envs))
+        model = PPO("MlpPolicy", env, n_steps=ROLLOUT_STEPS, batch_size=64, seed=SEED, device="cpu", verbose=0)
+        _, callback = model._setup_learn(ROLLOUT_STEPS * n_envs, callback=None)
+        callback.on_training_start(locals(), globals())
+
+        def rollout():
+            model.collect_rollouts(model.env, callback, model.rollout_buffer, n_rollout_steps=ROLLOUT_STEPS)
+
+        results[f"ppo_rollout[{n_envs}env]"] = measure(rollout, ops=ROLLOUT_STEPS * n_envs, repeat=min(repeat, 3))
+        env.close()
+    return results
+
+
+def make_vec_env(ctx, n_envs):
+    """The training vector env of main.py over n_envs scenarios of 1752 h"""
+    scenario_list = [ctx["scenario_1752"]] * n_envs
+    if ctx["vec_env"] == "shm":
+        from shm_vec_env import SharedMemoryVecEnv
+        return SharedMemoryVecEnv([lambda s=s: MicrogridEnv({}, s, copy_obs=False) for s in scenario_list])
+    return MicrogridVecEnv(scenario_list)
+
+
+def bench_imports(ctx, repeat):
+    """Import time of the worker-side modules, each in a fresh interpreter, and the heavy modules they load"""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for module, budget in IMPORT_BUDGETS.items():
+        code = (
+            f"import sys, time, json; sys.path.insert(0, {src_dir!r}); t = time.perf_counter(); import {module}; "
+            f"print(json.dumps([time.perf_counter() - t, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))"
+        )
+        times = []
+        for _ in range(max(repeat, 3)):
+            out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+            seconds, heavy = json.loads(out.strip().splitlines()[-1])
+            times.append(seconds)
+        median = float(np.median(times))
+        results[f"import[{module}]"] = {
+            "median_s": median,
+            "best_s": float(min(times)),
+            "ops_per_s": 1.0 / median,
+            "ops": 1,
+            "number": 1,
+            "repeat": len(times),
+            "budget_s": budget,
+            "heavy_modules": heavy,
+        }
+    return results
+
+
+def import_violations(run):
+    """Messages for the import benchmarks of a run that exceed their budget or load heavy modules"""
+    messages = []
+    for name, result in run["results"].items():
+        if "budget_s" not in result:
+            continue
+        if result["median_s"] > result["budget_s"]:
+            messages.append(f"{name} takes {result['median_s']:.3f} s (budget {result['budget_s']:.3f} s)")
+        if result["heavy_modules"]:
+            messages.append(f"{name} loads {', '.join(result['heavy_modules'])}")
+    return messages
+
+
+BENCHMARKS = {
+    "imports": bench_imports,
+    "env": bench_env,
+    "reward": bench_reward,
+    "params": bench_params,
+    "scenarios": bench_scenarios,
+    "evaluation": bench_evaluation,
+    "rollout": bench_rollout,
+}
+
+
+# === HISTORY ===
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_history(path=BENCH_HISTORY):
+    """List of recorded runs (oldest first); empty when the file does not exist"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def append_history(run, path=BENCH_HISTORY):
+    """Append one run to the history file (written atomically)"""
+    history = load_history(path)
+    history.append(run)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".json")
+    with os.fdopen(fd, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp, path)
+
+
+def compare_runs(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare the median time per operation of the benchmarks both runs have.
+
+    Returns:
+        list of (name, baseline median_s, current median_s, relative change, regressed)
+    """
+    rows = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before, after = baseline["results"][name]["median_s"], result["median_s"]
+        change = after / before - 1.0 if before > 0 else 0.0
+        rows.append((name, before, after, change, change > threshold))
+    return rows
+
+
+def print_comparison(rows, baseline, current, threshold):
+    print(f"\nBaseline {baseline.get('commit')} ({baseline['timestamp']}) -> "
+          f"current {current.get('commit')} ({current['timestamp']}), threshold +{threshold:.0%}")
+    for name, before, after, change, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        print(f"  {name:<34} {before * 1e6:>12.2f} us -> {after * 1e6:>12.2f} us  {change:>+8.1%}  {flag}")
+    n_regressed = sum(row[-1] for row in rows)
+    print(f"{n_regressed} regression(s) in {len(rows)} benchmarks")
+
+
+# === MAIN ===
+
+def run_benchmarks(names, param_dir=PARAM_DIR, repeat=5, vec_env="native", verbose=True):
+    """
+    Run the selected benchmark groups with fixed seeds.
+
+    Every result is the median (and best) time per operation (one env step, one reset,
+    one scenario, ...) over `repeat` timed rounds; a round calls the benchmark enough
+    times to last at least 0.2 s (timeit's autorange).
+
+    Args:
+        names: benchmark groups to run (BENCHMARKS keys); None runs all
+        param_dir: 1-year parameter directory (a synthetic one is used when it does not exist)
+        repeat: timed rounds per benchmark (the slowest ones use at most 3)
+        vec_env: vector env of the rollout benchmark, 'native' (MicrogridVecEnv) or 'shm'
+
+    Returns:
+        dict: the run record (metadata and {benchmark name: result})
+    """
+    np.random.seed(SEED)
+    synthetic = not os.path.isdir(param_dir)
+    tmp = tempfile.TemporaryDirectory() if synthetic else None
+    if synthetic:
+        param_dir = write_synthetic_params(os.path.join(tmp.name, "1year"))
+        if verbose:
+            print(f"{PARAM_DIR} not found: using a synthetic dataset")
+
+    ctx = {"param_dir": param_dir, "params": load_params(param_dir), "vec_env": vec_env}
+    ctx["scenario_1752"] = generate_mixed_scenario_dataset(ctx["params"], total_hours=1752, seed=SEED, cache_dir=None)
+    selected = [g for g in BENCHMARKS if names is None or g in names]
+    if "evaluation" in selected:
+        from stable_baselines3 import PPO
+        ctx["policy"] = PPO("MlpPolicy", MicrogridEnv({}, ctx["scenario_1752"]), seed=SEED, device="cpu")
+
+    results = {}
+    try:
+        for group in selected:
+            for name, result in BENCHMARKS[group](ctx, repeat).items():
+                results[name] = result
+                if verbose:
+                    print(f"{name:<34} {result['median_s'] * 1e6:>12.2f} us/op  {result['ops_per_s']:>14,.0f} ops/s")
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    import torch
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "synthetic_data": synthetic,
+        "vec_env": vec_env,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    # python benchmark.py                      run everything and append the run to the history
+    # python benchmark.py --only env reward    only these benchmark groups
+    # python benchmark.py --compare            run, then flag benchmarks slower than the previous run
+    # python benchmark.py --compare-only       compare the last two runs of the history
+    # Exits with status 1 when a regression beyond --threshold is found, or when a worker-side
+    # module exceeds its import budget (IMPORT_BUDGETS) or imports a plotting / RL framework.
+    parser = argparse.ArgumentParser(description="Microgrid environment and pipeline benchmarks")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=None, help="benchmark groups to run")
+    parser.add_argument("--data", default=PARAM_DIR, help="1-year parameter directory")
+    parser.add_argument("--repeat", type=int, default=5, help="timed rounds per benchmark")
+    parser.add_argument("--vec-env", choices=("native", "shm"), default="native", help="vector env of the PPO rollouts")
+    parser.add_argument("--history", default=BENCH_HISTORY, help="JSON history file")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+    parser.add_argument("--compare", action="store_true", help="compare this run with the previous run of the history")
+    parser.add_argument("--compare-only", action="store_true", help="compare the last two runs of the history and exit")
+    parser.add_argument("--baseline", type=int, default=None,
+                        help="history index of the run to compare against (default: the latest earlier run sharing benchmarks)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    if args.compare_only:
+        if not history:
+            sys.exit(f"No run in {args.history}")
+        current, history = history[-1], history[:-1]
+    else:
+        current = run_benchmarks(args.only, args.data, args.repeat, args.vec_env)
+        if not args.no_save:
+            append_history(current, args.history)
+            print(f"Appended to {args.history}")
+
+    violations = import_violations(current)
+    for message in violations:
+        print(f"IMPORT BUDGET: {message}")
+    if not (args.compare or args.compare_only):
+        sys.exit(1 if violations else 0)
+
+    if args.baseline is not None:
+        baseline = history[args.baseline]
+    else:
+        baseline = next((run for run in reversed(history) if set(run["results"]) & set(current["results"])), None)
+    if baseline is None:
+        sys.exit("No earlier run in the history to compare against")
+
+    rows = compare_runs(baseline, current, args.threshold)
+    print_comparison(rows, baseline, current, args.threshold)
+    sys.exit(1 if violations or any(row[-1] for row in rows) else 0)
@@ -0,0 +1,319 @@
+import os
+import csv
+import time
+import shutil
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback, EventCallback
+from evaluation import evaluate_batch
+from env import STEP_PHASES
+from config import HORIZON
+
+# Evaluation suite of the current pool worker (set once by _init_eval_worker)
+_eval_suite = None
+
+
+def _init_eval_worker(scenarios, horizon, obs_schema):
+    global _eval_suite
+    _eval_suite = (scenarios, horizon, obs_schema)
+    # The pool shares the machine with training: one thread per evaluation worker
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+def _evaluate_snapshot(path, indices, deterministic):
+    scenarios, horizon, obs_schema = _eval_suite
+    result = evaluate_batch(path, [scenarios[i] for i in indices], horizon, deterministic, obs_schema)
+    return result["total_cost"], np.array([r.sum() for r in result["rewards"]])
+
+
+class AsyncEvalCallback(EventCallback):
+    """
+    Evaluate policy snapshots in a separate process pool while training continues.
+
+    Every `eval_freq` calls the current model is saved to `snapshot_dir` and its
+    evaluation on a fixed scenario suite is submitted to the pool (split in shards over
+    the workers, each stepping its shard with evaluation.evaluate_batch). Finished
+    evaluations are picked up on later steps: their results are logged (eval/...) and the
+    best snapshot is copied to `best_model_save_path`. Training envs are never touched.
+
+    Like EvalCallback, `best_mean_reward` is exposed and `callback_on_new_best`
+    (e.g. StopTrainingOnRewardThreshold) runs whenever it improves.
+    """
+
+    def __init__(self, scenarios, eval_freq=10_000, best_model_save_path=None, snapshot_dir="./eval_snapshots/",
+                 n_workers=1, horizon=HORIZON, obs_schema=None, deterministic=True, max_pending=2,
+                 start_method=None, wait_on_end=True, callback_on_new_best=None, verbose=1):
+        """
+        Args:
+            scenarios: fixed evaluation suite (list of parameter dicts, e.g. evaluation.scenario_suite)
+            eval_freq: evaluate every `eval_freq` callback calls (vector env steps)
+            best_model_save_path: directory receiving best_model.zip (None: not kept)
+            snapshot_dir: where policy snapshots are written for the workers
+            n_workers: evaluation processes
+            horizon: episode length used when a scenario has no 'load' series
+            obs_schema: observation schema of the trained policy (default: full layout)
+            deterministic: evaluate the deterministic policy
+            max_pending: snapshots allowed in flight; further evaluations are skipped until one finishes
+            start_method: pool start method (default: forkserver when available, else spawn)
+            wait_on_end: wait for pending evaluations when training ends
+            callback_on_new_best: callback triggered when the best mean reward improves
+        """
+        super().__init__(callback_on_new_best, verbose=verbose)
+        self.scenarios = scenarios
+        self.eval_freq = eval_freq
+        self.best_model_save_path = best_model_save_path
+        self.snapshot_dir = snapshot_dir
+        self.n_workers = max(1, min(n_workers, len(scenarios)))
+        self.horizon = horizon
+        self.obs_schema = obs_schema
+        self.deterministic = deterministic
+        self.max_pending = max_pending
+        self.start_method = start_method
+        self.wait_on_end = wait_on_end
+
+        self.best_mean_reward = -np.inf
+        self.last_mean_reward = -np.inf
+        self.evaluations = []  # (timesteps, mean_reward, mean_cost) of every finished evaluation
+        self._pool = None
+        self._pending = []  # (timesteps, snapshot path, futures)
+        self._continue = True
+
+    def _init_callback(self):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        if self.best_model_save_path is not None:
+            os.makedirs(self.best_model_save_path, exist_ok=True)
+        start_method = self.start_method
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=mp.get_context(start_method),
+            initializer=_init_eval_worker,
+            initargs=(self.scenarios, self.horizon, self.obs_schema),
+        )
+
+    def _on_step(self):
+        if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
+            self._submit()
+        self._collect()
+        return self._continue
+
+    def _submit(self):
+        if len(self._pending) >= self.max_pending:
+            if self.verbose >= 1:
+                print(f"Skipping evaluation at {self.num_timesteps} steps: {len(self._pending)} still running")
+            return
+        path = os.path.join(self.snapshot_dir, f"snapshot_{self.num_timesteps}.zip")
+        self.model.save(path)
+        shards = np.array_split(np.arange(len(self.scenarios)), self.n_workers)
+        futures = [self._pool.submit(_evaluate_snapshot, path, shard.tolist(), self.deterministic) for shard in shards if len(shard)]
+        self._pending.append((self.num_timesteps, path, futures))
+
+    def _collect(self, wait=False):
+        still_pending = []
+        for timesteps, path, futures in self._pending:
+            if wait or all(f.done() for f in futures):
+                costs, rewards = zip(*(f.result() for f in futures))
+                self._report(timesteps, path, np.concatenate(costs), np.concatenate(rewards))
+            else:
+                still_pending.append((timesteps, path, futures))
+        self._pending = still_pending
+
+    def _report(self, timesteps, path, costs, rewards):
+        mean_reward, mean_cost = float(rewards.mean()), float(costs.mean())
+        self.last_mean_reward = mean_reward
+        self.evaluations.append((timesteps, mean_reward, mean_cost))
+
+        self.logger.record("eval/mean_reward", mean_reward)
+        self.logger.record("eval/std_reward", float(rewards.std()))
+        self.logger.record("eval/mean_cost", mean_cost)
+        self.logger.record("eval/snapshot_timesteps", timesteps)
+        if self.verbose >= 1:
+            print(f"Eval of {timesteps} steps: mean reward {mean_reward:.2f}, mean cost {mean_cost:.2f}")
+
+        if mean_reward > self.best_mean_reward:
+            self.best_mean_reward = mean_reward
+            if self.best_model_save_path is not None:
+                shutil.copyfile(path, os.path.join(self.best_model_save_path, "best_model.zip"))
+            if self.verbose >= 1:
+                print("New best mean reward!")
+            self._continue = self._continue and self._on_event()
+        os.remove(path)
+
+    def _on_training_end(self):
+        if self._pool is None:
+            return
+        if self.wait_on_end:
+            self._collect(wait=True)
+            self.logger.dump(self.num_timesteps)
+        self._pool.shutdown(wait=self.wait_on_end, cancel_futures=not self.wait_on_end)
+        self._pool = None
+
+
+class PhaseTimingCallback(BaseCallback):
+    """
+    Log where env step time goes, per phase (see MicrogridEnv.get_phase_timings).
+
+    Enables the envs' phase timers when training starts and, at the end of every
+    rollout, reads and resets them through env_method (summed over the envs) and
+    records timing/<phase>_pct (share of the timed step time) and timing/<phase>_us
+    (mean time per call), plus timing/step_us. The timers are switched off again
+    when training ends.
+    """
+
+    def _init_callback(self):
+        self.training_env.env_method("set_phase_timing", True)
+
+    def _on_step(self):
+        return True
+
+    def _on_rollout_end(self):
+        timings = self.training_env.env_method("get_phase_timings", reset=True)
+        ns = {phase: sum(t[phase]['ns'] for t in timings) for phase in STEP_PHASES}
+        calls = {phase: sum(t[phase]['calls'] for t in timings) for phase in STEP_PHASES}
+        total = sum(ns.values())
+        if total == 0:
+            return
+        for phase in STEP_PHASES:
+            self.logger.record(f"timing/{phase}_pct", 100.0 * ns[phase] / total)
+            if calls[phase]:
+                self.logger.record(f"timing/{phase}_us", ns[phase] / calls[phase] / 1e3)
+        if calls['params']:
+            self.logger.record("timing/step_us", total / calls['params'] / 1e3)
+
+    def _on_training_end(self):
+        self.training_env.env_method("set_phase_timing", False)
+
+
+class TelemetryCallback(BaseCallback):
+    """
+    Record where training wall-clock time goes (installed by agent.train_agent).
+
+    Per rollout, logged under telemetry/ and appended as one row to a CSV file:
+        steps_per_s         env steps collected per second of rollout
+        rollout_s, train_s  time collecting the rollout and in the gradient update after it
+        rollout_pct         share of rollout + update time spent collecting
+        forward_ms          policy forward pass per batch (forward hooks on model.policy)
+        env_step_ms         rest of a vector step (env stepping, buffer writes, callbacks)
+        episode_end_ms      extra time of vector steps where an episode ended
+                            (auto-reset, CVaR) over the other steps
+        worker<i>_step_ms, worker<i>_idle_pct
+                            per worker process of a SharedMemoryVecEnv: time stepping its
+                            envs per vector step, and share of its time spent waiting for work
+    The update after a rollout only ends once the logs are dumped, so train_s and
+    rollout_pct appear in TensorBoard one rollout late (the CSV rows are complete).
+    """
+
+    def __init__(self, csv_path=None, verbose=0):
+        """
+        Args:
+            csv_path: CSV file receiving one row per rollout (default: telemetry.csv in the
+                      logger's directory, e.g. the TensorBoard run; not written if there is none)
+        """
+        super().__init__(verbose)
+        self.csv_path = csv_path
+        self._csv_file = None
+        self._csv_writer = None
+        self._hooks = []
+        self._workers = None
+        self._forward_start = 0
+        self._row = None  # metrics of the last rollout, completed once its update is over
+        self._last_train = None
+        self._train_start = None
+
+    def _init_callback(self):
+        if self.csv_path is None and self.logger.get_dir():
+            self.csv_path = os.path.join(self.logger.get_dir(), "telemetry.csv")
+        policy = self.model.policy
+        self._hooks = [
+            policy.register_forward_pre_hook(self._before_forward),
+            policy.register_forward_hook(self._after_forward),
+        ]
+        self._workers = getattr(self.training_env.unwrapped, "get_worker_stats", None)
+
+    def _before_forward(self, module, args):
+        self._forward_start = time.perf_counter_ns()
+
+    def _after_forward(self, module, args, output):
+        self._forward_ns += time.perf_counter_ns() - self._forward_start
+        self._forward_calls += 1
+
+    def _on_rollout_start(self):
+        now = time.perf_counter_ns()
+        if self._row is not None:
+            self._finish_row(now)
+        self._rollout_start = self._last_step = now
+        self._steps_at_start = self.num_timesteps
+        self._forward_ns, self._forward_calls = 0, 0
+        self._step_ns = [0, 0]  # total time of vector steps without / with an episode end
+        self._step_calls = [0, 0]
+        if self._workers is not None:
+            self._workers(reset=True)
+
+    def _on_step(self):
+        now = time.perf_counter_ns()
+        ended = int(bool(np.any(self.locals["dones"])))
+        self._step_ns[ended] += now - self._last_step
+        self._step_calls[ended] += 1
+        self._last_step = now
+        return True
+
+    def _on_rollout_end(self):
+        now = time.perf_counter_ns()
+        rollout_s = (now - self._rollout_start) / 1e9
+        calls = sum(self._step_calls)
+        row = {
+            "timesteps": self.num_timesteps,
+            "steps_per_s": (self.num_timesteps - self._steps_at_start) / rollout_s,
+            "rollout_s": rollout_s,
+            "forward_ms": self._forward_ns / max(self._forward_calls, 1) / 1e6,
+            "env_step_ms": (sum(self._step_ns) - self._forward_ns) / max(calls, 1) / 1e6,
+            "episode_end_ms": 0.0,
+        }
+        if self._step_calls[0] and self._step_calls[1]:
+            row["episode_end_ms"] = (self._step_ns[1] / self._step_calls[1] - self._step_ns[0] / self._step_calls[0]) / 1e6
+        if self._workers is not None:
+            for w, stats in enumerate(self._workers()):
+                total = stats["step_ns"] + stats["idle_ns"]
+                row[f"worker{w}_step_ms"] = stats["step_ns"] / max(stats["steps"], 1) / 1e6
+                row[f"worker{w}_idle_pct"] = 100.0 * stats["idle_ns"] / total if total else 0.0
+
+        for key, value in row.items():
+            if key != "timesteps":
+                self.logger.record(f"telemetry/{key}", value)
+        if self._last_train is not None:
+            self.logger.record("telemetry/train_s", self._last_train["train_s"])
+            self.logger.record("telemetry/rollout_pct", self._last_train["rollout_pct"])
+        self._row = row
+        self._train_start = now
+
+    def _finish_row(self, now):
+        """Add the duration of the update that followed the last rollout and write its CSV row"""
+        row = self._row
+        row["train_s"] = (now - self._train_start) / 1e9
+        row["rollout_pct"] = 100.0 * row["rollout_s"] / (row["rollout_s"] + row["train_s"])
+        self._last_train = row
+        self._row = None
+        if self.csv_path is None:
+            return
+        if self._csv_writer is None:
+            self._csv_file = open(self.csv_path, "w", newline="")
+            self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=list(row))
+            self._csv_writer.writeheader()
+        self._csv_writer.writerow(row)
+        self._csv_file.flush()
+
+    def _on_training_end(self):
+        if self._row is not None:
+            self._finish_row(time.perf_counter_ns())
+        for hook in self._hooks:
+            hook.remove()
+        self._hooks = []
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file, self._csv_writer = None, None
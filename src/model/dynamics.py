@@ -1,3 +1,5 @@
+import numpy as np
+
 def update_battery_soc(prev_soc, p_charge, p_discharge, eta_charge, eta_discharge):
     """
     Update battery state of charge based on charge/discharge power
@@ -92,3 +94,55 @@ def process_battery_action(action, p_ch_es_max, p_dis_es_max):
         u_es = 0
     
     return p_ch_es, p_dis_es, u_es
+
+
+def update_ev_soc_batch(prev_soc, p_charge, eta_charge, is_session_start):
+    """
+    Vectorized update_ev_soc over arrays of EVs/timesteps
+    
+    Args:
+        prev_soc: Previous states of charge
+        p_charge: Charging powers (kW)
+        eta_charge: Charging efficiencies
+        is_session_start: Boolean array, True where a charging session starts
+    
+    Returns:
+        Updated EV SOCs
+    """
+    return np.where(is_session_start, 0.0, prev_soc) + eta_charge * p_charge
+
+def process_grid_action_batch(action, p_import_max, p_export_max):
+    """
+    Vectorized process_grid_action over an array of grid actions
+    
+    Args:
+        action: Grid control actions in [-1, 1]
+        p_import_max: Maximum import powers (kW)
+        p_export_max: Maximum export powers (kW)
+    
+    Returns:
+        tuple: (p_import, p_export, u_maingrid) arrays, same conventions as process_grid_action
+    """
+    export = action < 0
+    p_import = np.where(export, 0.0, action * p_import_max)
+    p_export = np.where(export, -action * p_export_max, 0.0)
+    u_maingrid = (~export).astype(np.float64)
+    return p_import, p_export, u_maingrid
+
+def process_battery_action_batch(action, p_ch_es_max, p_dis_es_max):
+    """
+    Vectorized process_battery_action over an array of battery actions
+    
+    Args:
+        action: Battery control actions in [-1, 1]
+        p_ch_es_max: Maximum charging powers (kW)
+        p_dis_es_max: Maximum discharging powers (kW)
+    
+    Returns:
+        tuple: (p_ch_es, p_dis_es, u_es) arrays, same conventions as process_battery_action
+    """
+    discharge = action < 0
+    p_ch_es = np.where(discharge, 0.0, action * p_ch_es_max)
+    p_dis_es = np.where(discharge, -action * p_dis_es_max, 0.0)
+    u_es = discharge.astype(np.float64)
+    return p_ch_es, p_dis_es, u_es
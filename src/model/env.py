@@ -1,27 +1,72 @@
 import numpy as np
-import os
+import time
 import gymnasium as gym 
-from state_action import get_observation_space, get_action_space
+from state_action import get_observation_space, get_action_space, build_param_table, N_PARAMS, PARAM_INDEX, PARAM_DEFAULTS, ObservationSchema
 from config import OBS_DIM,HORIZON, CVAR_ALPHA, CVAR_VIOL_WEIGHT
 from dynamics import update_battery_soc, update_ev_soc, process_grid_action, process_battery_action
-from reward import compute_reward
+from reward import compute_reward, REWARD_COMPONENTS, REWARD_DTYPE
 from monitor import RewardTracker  
+from scenarios import EventOverlay, apply_overlay, EVENT_PARAM_KEYS
+
+# Previous-step powers, in observation order
+POWER_KEYS = ('p_import', 'p_export', 'p_wt', 'p_pv', 'p_chp', 'p_dg', 'p_ch_es', 'p_dis_es', 'p_ch_ev')
+POWER_DTYPE = np.dtype([(k, np.float64) for k in POWER_KEYS])
+
+# Phases of a step timed by the opt-in instrumentation (see set_phase_timing)
+STEP_PHASES = ('params', 'dynamics', 'reward', 'tracker', 'cvar', 'obs')
 
 
 
 
 class MicrogridEnv(gym.Env):
-    def __init__(self, data, params,horizon=HORIZON):
-        print(f"[ENV __init__ PID={os.getpid()}]")
+    def __init__(self, data, params,horizon=HORIZON, randomize_events=None, info_keys=REWARD_COMPONENTS, copy_obs=True,
+                 obs_schema=None, time_phases=False):
+        """
+        Args:
+            data: unused, kept for compatibility
+            params: parameter dict (series per parameter), e.g. from param_store.load_params
+            horizon: episode length used when params has no 'load' series
+            randomize_events: optional event specification (see scenarios.DEFAULT_EVENTS).
+                When given, every reset draws a fresh set of outages / storage failures /
+                load spikes from the env's np_random on top of `params`.
+                reset(options={"events": spec}) overrides it for one episode.
+            info_keys: breakdown components copied into the info dict of every step
+                (default: all of them; () returns an empty info, plus 'cvar_vio' at the
+                end of an episode). The full breakdown of the last step is always
+                readable, without copies, from self.breakdown.
+            copy_obs: return a fresh observation array from step/reset. With False the
+                env returns its own buffer, which the next step overwrites (the
+                terminal observation is still a copy, so auto-reset cannot clobber it).
+            obs_schema: state_action.ObservationSchema selecting the observed features and
+                dtype, or "compact" to drop the parameters that are constant over `params`
+                (the ones randomize_events can change are kept). Default: full layout.
+            time_phases: accumulate per-phase step timings from the start (see set_phase_timing)
+        """
         super().__init__()
         self.data = data
         self.params = params
         self.T = len(params.get("load", [horizon]))  #
         self.t = 0
-        
+
+        # Compile the parameter series once into a (T, N_PARAMS) table in observation order.
+        # Missing values fall back to the dynamics defaults for stepping, but read as 0 in the observation.
+        # Dynamics and reward read the float64 table; only the observation copy is float32.
+        self._param_table, complete = build_param_table(params, self.T, PARAM_DEFAULTS, dtype=np.float64)
+        self._obs_param_table = self._param_table.astype(np.float32) if complete else build_param_table(params, self.T)[0]
+        self._obs = np.zeros(OBS_DIM, dtype=np.float32)
+        self.copy_obs = copy_obs
+
+        # Per-step outputs are written into these preallocated records instead of new dicts
+        self.breakdown = np.zeros((), dtype=REWARD_DTYPE)
+        self.info_keys = tuple(info_keys)
+        self._full_info = self.info_keys == REWARD_COMPONENTS
+
+        # Per-episode disturbance overlay on top of the shared table (empty unless events are sampled)
+        self.randomize_events = randomize_events
+        self.events = EventOverlay(self.T, randomize_events)
 
         # Initialize storage and startup trackers
-        self.soc_es = params.get('Ees_min', [0])[0] if 'Ees_min' in params and len(params['Ees_min']) > 0 else 0  # Battery to min
+        self.soc_es = float(self._param_table[0, PARAM_INDEX["Ees_min"]]) if self.T > 0 else 0  # Battery to min
         self.soc_ev = 0.0                   
         self.prev_u_chp = 0
         self.prev_u_dg = 0
@@ -29,24 +74,40 @@ class MicrogridEnv(gym.Env):
         self.prev_u_maingrid = 0
         
         # Store previous decision variables for state vector
-        self.prev_powers = {
-            'p_import': 0, 'p_export': 0, 'p_wt': 0, 'p_pv': 0, 'p_chp': 0, 
-            'p_dg': 0, 'p_ch_es': 0, 'p_dis_es': 0, 'p_ch_ev': 0
-        }
+        self.prev_powers = np.zeros((), dtype=POWER_DTYPE)
+        self._prev_powers_flat = self.prev_powers.reshape(1).view(np.float64)  # (9,) view of the same record
         self.prev_H_chp = 0
         self.prev_soc_es = 0
         self.prev_soc_ev = 0
 
-        self.observation_space = get_observation_space()
+        # Observed features (the full layout is built in self._obs, then selected)
+        if isinstance(obs_schema, str):
+            if obs_schema != "compact":
+                raise ValueError(f"Unknown obs_schema {obs_schema!r}")
+            obs_schema = ObservationSchema.compact(self._obs_param_table, keep=EVENT_PARAM_KEYS if randomize_events else ())
+        self.obs_schema = obs_schema or ObservationSchema()
+        self._obs_out = None if self.obs_schema.is_full else np.zeros(len(self.obs_schema), dtype=self.obs_schema.dtype)
+        self.observation_space = get_observation_space(self.obs_schema)
         self.action_space = get_action_space()
-        self.reward_tracker = RewardTracker()  # Track reward components
+        self.reward_tracker = RewardTracker(capacity=self.T)  # Track reward components (one episode)
+
+        # Per-phase step timers (nanoseconds and calls, in STEP_PHASES order); off unless enabled
+        self._clock = None
+        self._phase_ns = [0] * len(STEP_PHASES)
+        self._phase_calls = [0] * len(STEP_PHASES)
+        self.set_phase_timing(time_phases)
 
     def reset(self, *, seed=None, options=None):
         if seed is not None:
             super().reset(seed=seed)
+
+        # Draw this episode's events; the parameter table itself is never copied
+        events = (options or {}).get("events", self.randomize_events)
+        if events or self.events:
+            self.events.sample(self.np_random, events or ())
         
         self.t = 0
-        self.soc_es = self.params.get('Ees_min', [0])[0] if 'Ees_min' in self.params and len(self.params['Ees_min']) > 0 else 0
+        self.soc_es = float(self._param_table[0, PARAM_INDEX["Ees_min"]]) if self.T > 0 else 0
         self.soc_ev = 0.0
         self.prev_u_chp = 0
         self.prev_u_dg = 0
@@ -54,82 +115,32 @@ class MicrogridEnv(gym.Env):
         self.prev_u_maingrid = 0
         
         # Reset previous decision variables
-        self.prev_powers = {
-            'p_import': 0, 'p_export': 0, 'p_wt': 0, 'p_pv': 0, 'p_chp': 0, 
-            'p_dg': 0, 'p_ch_es': 0, 'p_dis_es': 0, 'p_ch_ev': 0
-        }
+        self.prev_powers[()] = 0
         self.prev_H_chp = 0
         self.prev_soc_es = self.soc_es
         self.prev_soc_ev = self.soc_ev
+        self.reward_tracker.new_episode()
         
         return self._get_obs(), {}
 
     def _get_obs(self):
         """Build observation vector according to state_action.py specification"""
-        obs = np.zeros(OBS_DIM, dtype=np.float32)
-        
-        # Safe parameter access
-        def safe_param(name, default=0):
-            if name in self.params and self.t < len(self.params[name]):
-                return self.params[name][self.t]
-            return default
-        
-        idx = 0
-        
+        obs = self._obs
+
         # === PARAMETERS from data/parameters/default ===
-        
-        # Load parameter (power value)
-        obs[idx] = safe_param("load")
-        idx += 1
-        
-        # Price parameters (grid-related prices)
-        obs[idx:idx+3] = [safe_param("price_import"), safe_param("price_export"), safe_param("price_ev")]
-        idx += 3
-        
-        # Cost parameters (cost-related)
-        obs[idx:idx+6] = [safe_param("rho_gas"), safe_param("Cop_ma_wt"), safe_param("Cop_ma_pv"), 
-                          safe_param("rho_fuel"), safe_param("C_startup"), safe_param("C_degrad_es")]
-        idx += 6
-        
-        # Efficiency parameters (binary/scalar factors)
-        obs[idx:idx+6] = [safe_param("eta_chp"), safe_param("eta_dg"), safe_param("eta_ch_es"), 
-                          safe_param("eta_dis_es"), safe_param("eta_ch_ev"), safe_param("alpha_chp")]
-        idx += 6
-        
-        # Heat demand (power/heat value)
-        obs[idx] = safe_param("H_demand")
-        idx += 1
-        
-        # Power capacity limits (power values)
-        obs[idx:idx+8] = [safe_param("P_grid_import_max"), safe_param("P_grid_export_max"), 
-                          safe_param("PWT_max"), safe_param("PPV_max"), safe_param("PCHP_max"), 
-                          safe_param("PDG_max"), safe_param("Pdis_es_max"), safe_param("Pch_es_max")]
-        idx += 8
-        
-        # EV max power (power value)
-        obs[idx] = safe_param("PEV_max")
-        idx += 1
-        
-        # Energy capacity limits (energy values)
-        obs[idx:idx+2] = [safe_param("Ees_min"), safe_param("Ees_max")]
-        idx += 2
-        
-        # EV required energy (energy value)
-        obs[idx] = safe_param("Eev_required")
-        idx += 1
-        
-        # EV availability and session flags (binary/scalar factors)
-        obs[idx:idx+3] = [safe_param("A"), safe_param("session_start"), safe_param("leave_possible")]
-        idx += 3
-        
+        # One row of the compiled table, already in observation order (zeros past the horizon)
+        if self.t < self.T:
+            obs[:N_PARAMS] = self._obs_param_table[self.t]
+            if self.events.flags[self.t]:
+                apply_overlay(obs[:N_PARAMS], self.events.flags[self.t], self.events.load_scale[self.t])
+        else:
+            obs[:N_PARAMS] = 0.0
+
         # === DECISION VARIABLES ===
-        
+        idx = N_PARAMS
+
         # Power values from previous timestep
-        obs[idx:idx+9] = [self.prev_powers['p_import'], self.prev_powers['p_export'], 
-                          self.prev_powers['p_wt'], self.prev_powers['p_pv'], 
-                          self.prev_powers['p_chp'], self.prev_powers['p_dg'], 
-                          self.prev_powers['p_ch_es'], self.prev_powers['p_dis_es'], 
-                          self.prev_powers['p_ch_ev']]
+        obs[idx:idx+9] = self._prev_powers_flat
         idx += 9
         
         # Heat variable from previous timestep
@@ -137,14 +148,22 @@ class MicrogridEnv(gym.Env):
         idx += 1
         
         # Energy states from previous timestep
-        obs[idx:idx+2] = [self.prev_soc_es, self.prev_soc_ev]
+        obs[idx] = self.prev_soc_es
+        obs[idx+1] = self.prev_soc_ev
         idx += 2
         
         # Binary states from previous timestep
-        obs[idx:idx+4] = [self.prev_u_chp, self.prev_u_dg, self.prev_u_es, self.prev_u_maingrid]
+        obs[idx] = self.prev_u_chp
+        obs[idx+1] = self.prev_u_dg
+        obs[idx+2] = self.prev_u_es
+        obs[idx+3] = self.prev_u_maingrid
         idx += 4
+
+        # Observed features only, in the schema's order and dtype
+        if self._obs_out is not None:
+            obs = self.obs_schema.select(obs, out=self._obs_out)
         
-        return obs
+        return obs.copy() if self.copy_obs else obs
 
     def step(self, action):
         """
@@ -160,33 +179,34 @@ class MicrogridEnv(gym.Env):
         [6] p_pv control ([0, 1])
         """
         
-        # Safe parameter access
-        def safe_param(name, default=0):
-            if name in self.params and self.t < len(self.params[name]):
-                return self.params[name][self.t]
-            return default
-        
+        if self.t >= self.T:
+            # The parameter table ends at T: an episode cannot be stepped past its horizon
+            raise RuntimeError(f"Episode is over (t={self.t}, horizon {self.T}): call reset() before stepping again")
+
+        clock = self._clock  # None unless phase timing is enabled
+        if clock is not None:
+            t0 = clock()
+
         # === STEP 1: Extract Parameters ===
-        # Load all required parameters for current timestep
-        p_import_max = safe_param("P_grid_import_max", 100)
-        p_export_max = safe_param("P_grid_export_max", 100)
-        p_ch_es_max = safe_param("Pch_es_max", 50)
-        p_dis_es_max = safe_param("Pdis_es_max", 50)
-        p_wt_max = safe_param("PWT_max", 50)
-        p_pv_max = safe_param("PPV_max", 50)
-        p_chp_max = safe_param("PCHP_max", 25)
-        p_dg_max = safe_param("PDG_max", 30)
-        p_ev_max = safe_param("PEV_max", 60)
-        
-        # Get efficiency parameters
-        eta_ch_es = safe_param("eta_ch_es", 0.9)
-        eta_dis_es = safe_param("eta_dis_es", 0.9)
-        eta_ch_ev = safe_param("eta_ch_ev", 0.95)
-        alpha_chp = safe_param("alpha_chp", 0.8)
-        
+        # Read the whole row for the current timestep at once (columns in state_action.PARAM_KEYS order)
+        row = self._param_table[self.t]
+        if self.events.flags[self.t]:
+            row = apply_overlay(row.copy(), self.events.flags[self.t], self.events.load_scale[self.t])
+        (current_load,
+         price_import, price_export, price_ev,
+         rho_gas, Cop_ma_wt, Cop_ma_pv, rho_fuel, C_startup, C_degrad_es,
+         eta_chp, eta_dg, eta_ch_es, eta_dis_es, eta_ch_ev, alpha_chp,
+         H_demand,
+         p_import_max, p_export_max, p_wt_max, p_pv_max, p_chp_max, p_dg_max, p_dis_es_max, p_ch_es_max,
+         p_ev_max,
+         ees_min, ees_max,
+         Eev_required,
+         ev_availability, session_start, leave_possible) = row.tolist()
+
         # Get EV session parameters
-        is_session_start = safe_param("session_start", 0) == 1
-        ev_availability = safe_param("A", 0)
+        is_session_start = session_start == 1
+        if clock is not None:
+            t0 = self._lap(0, t0)
         
         # === STEP 2: Process Actions ===
         
@@ -218,30 +238,22 @@ class MicrogridEnv(gym.Env):
         new_soc_es = update_battery_soc(self.soc_es, p_ch_es, p_dis_es, eta_ch_es, eta_dis_es)
         
         # Apply battery capacity constraints
-        ees_min = safe_param("Ees_min", 0)
-        ees_max = safe_param("Ees_max", 300)
         new_soc_es = max(ees_min, min(new_soc_es, ees_max))
         
         # Update EV SOC using dynamics function
         new_soc_ev = update_ev_soc(self.soc_ev, p_ch_ev, eta_ch_ev, is_session_start)
-        
-        new_soc_ev = update_ev_soc(self.soc_ev, p_ch_ev, eta_ch_ev, is_session_start)
 
         # Enforce physical SOC limits (e.g. 0–70 kWh)
         Eev_min = 0.2*70
         Eev_max = 70
-        new_soc_ev = np.clip(new_soc_ev, Eev_min, Eev_max)
+        new_soc_ev = max(Eev_min, min(new_soc_ev, Eev_max))
 
 
         
         # === STEP 5: Store Current State for Next Timestep ===
         
-        # Store previous values for state vector
-        self.prev_powers = {
-            'p_import': p_import, 'p_export': p_export, 'p_wt': p_wt, 'p_pv': p_pv, 
-            'p_chp': p_chp, 'p_dg': p_dg, 'p_ch_es': p_ch_es, 'p_dis_es': p_dis_es, 
-            'p_ch_ev': p_ch_ev
-        }
+        # Store previous values for state vector (written into the preallocated record)
+        self._prev_powers_flat[:] = (p_import, p_export, p_wt, p_pv, p_chp, p_dg, p_ch_es, p_dis_es, p_ch_ev)
         self.prev_H_chp = H_chp
         self.prev_soc_es = self.soc_es
         self.prev_soc_ev = self.soc_ev
@@ -253,35 +265,25 @@ class MicrogridEnv(gym.Env):
         # Update current energy states
         self.soc_es = new_soc_es
         self.soc_ev = new_soc_ev
+        if clock is not None:
+            t0 = self._lap(1, t0)
         
         # === STEP 6: Compute Reward ===
         
-        # Get current parameters needed for reward calculation
-        current_load = safe_param("load", 0)
-        H_demand = safe_param("H_demand", 0)
-        leave_possible = safe_param("leave_possible", 0)
-        Eev_required = safe_param("Eev_required", 0)
-        
-        # Calculate reward using the reward function
+        # Calculate reward using the reward function (breakdown written into self.breakdown)
         reward,breakdown = compute_reward(
             t=self.t,
             # Power variables
             p_import=p_import, p_export=p_export, p_wt=p_wt, p_pv=p_pv, 
             p_chp=p_chp, p_dg=p_dg, p_dis_es=p_dis_es, p_ch_es=p_ch_es, p_ch_ev=p_ch_ev,
             # Price parameters
-            price_import=safe_param("price_import", 0),
-            price_export=safe_param("price_export", 0),
-            price_ev=safe_param("price_ev", 0),
+            price_import=price_import, price_export=price_export, price_ev=price_ev,
             # Cost parameters
-            Cop_ma_wt=safe_param("Cop_ma_wt", 0),
-            Cop_ma_pv=safe_param("Cop_ma_pv", 0),
-            rho_gas=safe_param("rho_gas", 0),
-            rho_fuel=safe_param("rho_fuel", 0),
-            C_startup=safe_param("C_startup", 0),
-            C_degrad_es=safe_param("C_degrad_es", 0),
+            Cop_ma_wt=Cop_ma_wt, Cop_ma_pv=Cop_ma_pv,
+            rho_gas=rho_gas, rho_fuel=rho_fuel,
+            C_startup=C_startup, C_degrad_es=C_degrad_es,
             # Efficiency parameters
-            eta_chp=safe_param("eta_chp", 0.9),
-            eta_dg=safe_param("eta_dg", 0.9),
+            eta_chp=eta_chp, eta_dg=eta_dg,
             # Binary states (current and previous)
             u_chp=u_chp, u_dg=u_dg, 
             prev_u_chp=self.prev_u_chp, prev_u_dg=self.prev_u_dg,
@@ -291,8 +293,11 @@ class MicrogridEnv(gym.Env):
             soc_es=self.soc_es, soc_ev=self.soc_ev,
             ees_min=ees_min, ees_max=ees_max,
             # EV parameters
-            leave_possible=leave_possible, Eev_required=Eev_required
+            leave_possible=leave_possible, Eev_required=Eev_required,
+            out=self.breakdown
         )
+        if clock is not None:
+            t0 = self._lap(2, t0)
         
         # === STEP 7: Update Time and Check Termination ===
         self.t += 1
@@ -301,13 +306,69 @@ class MicrogridEnv(gym.Env):
         
 
         self.reward_tracker.log(breakdown)
+
+        # Only the opted-in components are copied out of the record
+        if self._full_info:
+            info = dict(zip(REWARD_COMPONENTS, breakdown.tolist()))
+        else:
+            info = {k: float(breakdown[k]) for k in self.info_keys}
+        if clock is not None:
+            t0 = self._lap(3, t0)
         if terminated:
             cvar_vio = self.reward_tracker.compute_cvar(alpha=CVAR_ALPHA)
             reward -= CVAR_VIOL_WEIGHT * cvar_vio
-            breakdown["cvar_vio"] = cvar_vio
+            info["cvar_vio"] = cvar_vio
+            if clock is not None:
+                t0 = self._lap(4, t0)
 
-        
-        return self._get_obs(), float(reward), terminated, truncated, breakdown
+        obs = self._get_obs()
+        if terminated and not self.copy_obs:
+            obs = obs.copy()
+        if clock is not None:
+            self._lap(5, t0)
+        return obs, float(reward), terminated, truncated, info
+
+    def reward_summary(self, series=False):
+        """
+        Reward statistics of the finished episodes (see RewardTracker.summary), e.g.
+        vec_env.env_method("reward_summary") instead of get_attr("reward_tracker").
+        """
+        return self.reward_tracker.summary(series)
+
+    def _lap(self, phase, t0):
+        """Charge the time since t0 to `phase` (index into STEP_PHASES) and return the current time"""
+        t1 = self._clock()
+        self._phase_ns[phase] += t1 - t0
+        self._phase_calls[phase] += 1
+        return t1
+
+    def set_phase_timing(self, enabled=True):
+        """
+        Turn the per-phase step timers on or off. When off, a step only pays a few
+        `is None` checks; accumulated timings are kept either way.
+        """
+        self._clock = time.perf_counter_ns if enabled else None
+
+    def get_phase_timings(self, reset=False):
+        """
+        Accumulated step timings per phase.
+
+        Phases (STEP_PHASES): 'params' (parameter row and event overlay), 'dynamics'
+        (action processing and state updates), 'reward' (compute_reward), 'tracker'
+        (RewardTracker.log and info dict), 'cvar' (episode-end CVaR), 'obs' (_get_obs).
+
+        Args:
+            reset: zero the timers after reading them
+
+        Returns:
+            dict: phase -> {'ns': total nanoseconds, 'calls': number of timed calls}
+        """
+        timings = {phase: {'ns': ns, 'calls': calls}
+                   for phase, ns, calls in zip(STEP_PHASES, self._phase_ns, self._phase_calls)}
+        if reset:
+            self._phase_ns = [0] * len(STEP_PHASES)
+            self._phase_calls = [0] * len(STEP_PHASES)
+        return timings
 
     def render(self, mode='human'):
         pass
@@ -0,0 +1,315 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from vec_env import MicrogridVecEnv
+from baseline import BaselineController
+from scenarios import generate_mixed_scenario_dataset, scenario_key
+from state_action import build_param_table, PARAM_KEYS, PARAM_INDEX, PARAM_DEFAULTS
+from dynamics import process_grid_action_batch, process_battery_action_batch
+from reward import compute_reward_batch, REWARD_COMPONENTS
+from monitor import cvar, VIOLATION_COMPONENTS
+from config import HORIZON, CVAR_ALPHA, CVAR_VIOL_WEIGHT
+
+# Physical EV SOC limits applied by the env after every step (kWh)
+EV_SOC_MIN = 0.2 * 70
+EV_SOC_MAX = 70
+
+# Results of the MILP oracle (src/offline/oracle.py): one <scenario key>.npz per solved scenario
+ORACLE_DIR = '../output/oracle'
+
+
+def scenario_suite(params, seeds, horizons=(HORIZON,)):
+    """
+    Build the evaluation scenarios for every (seed, horizon) pair.
+
+    Args:
+        params: base parameter dict (e.g. load_params('data/testset/1year'))
+        seeds: iterable of scenario seeds
+        horizons: iterable of scenario lengths
+
+    Returns:
+        list of scenario dicts, seed-major (all horizons of the first seed first)
+    """
+    return [
+        generate_mixed_scenario_dataset(params, total_hours=h, seed=s)
+        for s in seeds for h in horizons
+    ]
+
+
+def suite_keys(params, seeds, horizons=(HORIZON,)):
+    """Scenario cache keys of scenario_suite(params, seeds, horizons), in the same order"""
+    return [scenario_key(params, s, h) for s in seeds for h in horizons]
+
+
+def load_oracle_results(keys, oracle_dir=ORACLE_DIR):
+    """
+    Load the MILP oracle results of the given scenarios, shaped like evaluate_batch's output
+    so they can be compared with a policy's evaluation of the same scenarios.
+
+    The oracle only falls short of the load, heat and EV requirements where they cannot be met
+    at all (e.g. a grid outage with more load than the local units cover), at a value of lost
+    load above any supply cost. 'total_cost' and 'costs' leave that value out, as a policy's
+    total_true_cost leaves out its violations: read them together with 'shortfall'.
+
+    Args:
+        keys: scenario keys (see suite_keys)
+        oracle_dir: result directory of src/offline/oracle.py
+
+    Returns:
+        dict: 'total_cost' -> (N,) cost of the optimal dispatch per scenario (NaN when not solved or no solution)
+              'costs'      -> list of (T_i,) per-step costs (None when not solved)
+              'objective'  -> (N,) optimal cost including the value of lost load
+              'shortfall'  -> {'load', 'heat', 'ev': (N,) kW(h) short per scenario} (NaN when not solved)
+              'penalties'  -> list of {'load', 'heat', 'ev': (T_i,) shortfall normalized like the
+                              env's penalty_load, penalty_heat, penalty_ev} (None when not solved)
+              'gap', 'bound', 'solve_time' -> (N,) solver statistics (NaN when not solved)
+              'status'     -> list of solver statuses ('missing' when not solved)
+              'dispatch'   -> list of {variable name: (T_i,) array} (None when not solved)
+    """
+    out = {"total_cost": np.full(len(keys), np.nan), "costs": [], "objective": np.full(len(keys), np.nan),
+           "shortfall": {k: np.full(len(keys), np.nan) for k in ("load", "heat", "ev")}, "penalties": [], "gap": np.full(len(keys), np.nan), "bound": np.full(len(keys), np.nan),
+           "solve_time": np.full(len(keys), np.nan), "status": [], "dispatch": []}
+    for i, key in enumerate(keys):
+        path = os.path.join(oracle_dir, f"{key}.npz")
+        if not os.path.exists(path):
+            out["costs"].append(None)
+            out["penalties"].append(None)
+            out["status"].append("missing")
+            out["dispatch"].append(None)
+            continue
+        with np.load(path) as f:
+            out["total_cost"][i], out["objective"][i] = f["costs"].sum(), f["objective"]
+            out["gap"][i], out["bound"][i], out["solve_time"][i] = f["gap"], f["bound"], f["solve_time"]
+            out["costs"].append(f["costs"])
+            for k, name in enumerate(f["shortfall_variables"].tolist()):
+                out["shortfall"][name[2:]][i] = f["shortfall"][:, k].sum()
+            out["penalties"].append({name[2:]: f["penalties"][:, k] for k, name in enumerate(f["shortfall_variables"].tolist())})
+            out["status"].append(str(f["status"]))
+            out["dispatch"].append(dict(zip(f["variables"].tolist(), f["dispatch"].T)))
+    return out
+
+
+def load_policy(policy):
+    """Resolve a policy spec: 'baseline', a saved PPO path, or an already loaded policy"""
+    if isinstance(policy, str) and policy != "baseline":
+        from stable_baselines3 import PPO
+        return PPO.load(policy, device="cpu")
+    return policy
+
+
+def evaluate_batch(policy, scenarios, horizon=HORIZON, deterministic=True, obs_schema=None):
+    """
+    Roll out one episode of `policy` on every scenario, all scenarios stepped in lockstep.
+
+    Scenarios may have different lengths; each one is scored only up to its own horizon.
+
+    Args:
+        policy: 'baseline' (a BaselineController per scenario), a saved PPO path, or any
+                object with an SB3-style predict(obs, deterministic=...) method, which is
+                called once per timestep on the whole (N, OBS_DIM) observation batch
+        scenarios: list of parameter dicts (including the 'scenario' tags for the baseline)
+        horizon: episode length used when a scenario has no 'load' series
+        deterministic: passed to predict
+        obs_schema: observation schema the policy was trained with (default: full layout)
+
+    Returns:
+        dict: 'total_cost' -> (N,) summed total_true_cost per scenario
+              'costs'      -> list of (T_i,) per-step total_true_cost arrays
+              'rewards'    -> list of (T_i,) per-step reward arrays
+    """
+    policy = load_policy(policy)
+    env = MicrogridVecEnv(scenarios, horizon=horizon, info_keys=(), obs_schema=obs_schema, track_rewards=False)
+    n, T = env.num_envs, env.T
+    costs = np.zeros((n, int(T.max())))
+    rewards = np.zeros((n, int(T.max())))
+    controllers = [BaselineController(p) for p in scenarios] if policy == "baseline" else None
+
+    obs = env.reset()
+    for step in range(int(T.max())):
+        if controllers is not None:
+            actions = np.stack([c.select_action(min(step, T[i] - 1)) for i, c in enumerate(controllers)])
+        else:
+            actions, _ = policy.predict(obs, deterministic=deterministic)
+        obs, reward, _, _ = env.step(actions)
+        # Envs past their own horizon have been auto-reset: their steps are not recorded
+        active = step < T
+        costs[active, step] = env.breakdown["total_true_cost"][active]
+        rewards[active, step] = reward[active]
+    env.close()
+
+    return {
+        "total_cost": costs.sum(axis=1),
+        "costs": [costs[i, :T[i]] for i in range(n)],
+        "rewards": [rewards[i, :T[i]] for i in range(n)],
+    }
+
+
+def _evaluate_shard(args):
+    policy, scenarios, horizon, deterministic, obs_schema = args
+    # Shards already run in parallel: keep each worker's policy forward pass single-threaded
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    return evaluate_batch(policy, scenarios, horizon, deterministic, obs_schema)
+
+
+def evaluate_scenarios(policy, scenarios, horizon=HORIZON, deterministic=True, n_workers=None, shard_size=None,
+                       obs_schema=None):
+    """
+    evaluate_batch spread over a process pool.
+
+    The scenarios are cut into contiguous shards; every worker loads the policy once per
+    shard and steps its shard in lockstep. Results come back in scenario order.
+
+    Args:
+        policy: 'baseline' or a saved PPO path (loaded inside the workers)
+        scenarios: list of parameter dicts
+        horizon: episode length used when a scenario has no 'load' series
+        deterministic: passed to predict
+        n_workers: pool size (default: os.cpu_count(); 1 runs in-process)
+        shard_size: scenarios per shard (default: split evenly over the workers)
+        obs_schema: observation schema the policy was trained with (default: full layout)
+
+    Returns:
+        dict: as evaluate_batch
+    """
+    n_workers = min(n_workers or os.cpu_count() or 1, len(scenarios))
+    if n_workers <= 1:
+        return evaluate_batch(policy, scenarios, horizon, deterministic, obs_schema)
+
+    shard_size = shard_size or -(-len(scenarios) // n_workers)
+    shards = [scenarios[i:i + shard_size] for i in range(0, len(scenarios), shard_size)]
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        results = list(pool.map(_evaluate_shard, [(policy, s, horizon, deterministic, obs_schema) for s in shards]))
+
+    return {
+        "total_cost": np.concatenate([r["total_cost"] for r in results]),
+        "costs": [c for r in results for c in r["costs"]],
+        "rewards": [c for r in results for c in r["rewards"]],
+    }
+
+
+def _clipped_scan(x0, delta, lo, hi, restart=None):
+    """
+    x[t] = clip((0 if restart[t] else x[t-1]) + delta[t], lo[t], hi[t]) along the last axis
+    of `delta`, starting from x[-1] = x0. lo, hi and restart are (T,) and shared by any
+    leading axes of `delta` (e.g. candidate plans), which are scanned together.
+    """
+    T = delta.shape[-1]
+    restart = np.zeros(T, dtype=bool) if restart is None else restart
+    if delta.ndim == 1:
+        # Single trajectory: plain float recursion is much faster than per-step NumPy calls
+        out = []
+        x = float(x0)
+        for d, l, h, r in zip(delta.tolist(), lo.tolist(), hi.tolist(), restart.tolist()):
+            x = max(l, min((0.0 if r else x) + d, h))
+            out.append(x)
+        return np.array(out)
+
+    out = np.empty_like(delta)
+    x = np.broadcast_to(np.asarray(x0, dtype=np.float64), delta.shape[:-1])
+    for t in range(T):
+        x = np.maximum(lo[t], np.minimum((0.0 if restart[t] else x) + delta[..., t], hi[t]))
+        out[..., t] = x
+    return out
+
+
+def evaluate_trajectory(params, actions, soc_es0=None, soc_ev0=0.0, include_cvar=True, detail="full"):
+    """
+    Score a whole open-loop action plan without stepping the env.
+
+    Replays exactly what MicrogridEnv.step does for each action in turn (same dispatch,
+    SOC clipping, reward terms and the CVaR charge on the last step), but everything
+    except the SOC recursion runs as array operations over the whole horizon.
+
+    Args:
+        params: (T, N_PARAMS) parameter table in state_action.PARAM_KEYS order, or a
+                parameter dict as passed to MicrogridEnv
+        actions: (T, 7) action plan, or (K, T, 7) for K candidate plans on the same table
+        soc_es0: initial battery SOC (default: Ees_min at t=0, as on env reset)
+        soc_ev0: initial EV SOC
+        include_cvar: subtract the episode-end CVaR term from the last reward, as the env does
+        detail: reward breakdown to return ('none', 'totals' or 'full', see reward.compute_reward_batch)
+
+    Returns:
+        dict of (T,) / (K, T) arrays: the dispatch (p_import ... p_ch_ev, H_chp), unit states
+        (u_chp, u_dg, u_es, u_maingrid), SOCs after each step (soc_es, soc_ev), 'reward' and
+        the selected compute_reward breakdown components; plus 'cvar_vio' ((), or (K,);
+        only when the violations are computed, i.e. with include_cvar or detail='full')
+    """
+    actions = np.asarray(actions, dtype=np.float64)
+    if isinstance(params, dict):
+        params, _ = build_param_table(params, actions.shape[-2], PARAM_DEFAULTS)
+    table = np.asarray(params, dtype=np.float64)[:actions.shape[-2]]
+    col = {k: table[:, PARAM_INDEX[k]] for k in PARAM_KEYS}
+    a = np.moveaxis(actions, -1, 0)
+
+    # === Dispatch ===
+    p_import, p_export, u_maingrid = process_grid_action_batch(a[0], col["P_grid_import_max"], col["P_grid_export_max"])
+    p_ch_es, p_dis_es, u_es = process_battery_action_batch(a[1], col["Pch_es_max"], col["Pdis_es_max"])
+    p_wt = a[2] * col["PWT_max"]
+    p_chp = a[3] * col["PCHP_max"]
+    p_dg = a[4] * col["PDG_max"]
+    p_ch_ev = a[5] * col["PEV_max"] * col["A"]
+    p_pv = a[6] * col["PPV_max"]
+    H_chp = col["alpha_chp"] * p_chp
+    u_chp = (p_chp > 0).astype(np.float64)
+    u_dg = (p_dg > 0).astype(np.float64)
+
+    # === SOC recursion (the only sequential part) ===
+    shape = p_ch_es.shape
+    T = shape[-1]
+    soc_es0 = col["Ees_min"][0] if soc_es0 is None and T > 0 else (soc_es0 or 0.0)
+    soc_es = _clipped_scan(
+        soc_es0,
+        col["eta_ch_es"] * p_ch_es - p_dis_es / col["eta_dis_es"],
+        col["Ees_min"], col["Ees_max"],
+    )
+    soc_ev = _clipped_scan(
+        soc_ev0,
+        col["eta_ch_ev"] * p_ch_ev,
+        np.full(T, EV_SOC_MIN), np.full(T, EV_SOC_MAX),
+        restart=col["session_start"] == 1,
+    )
+
+    # === Reward ===
+    # The env stores the current unit states as "previous" before the reward, so it sees prev_u == u
+    reward, breakdown = compute_reward_batch(
+        p_import=p_import, p_export=p_export, p_wt=p_wt, p_pv=p_pv,
+        p_chp=p_chp, p_dg=p_dg, p_dis_es=p_dis_es, p_ch_es=p_ch_es, p_ch_ev=p_ch_ev,
+        price_import=col["price_import"], price_export=col["price_export"], price_ev=col["price_ev"],
+        Cop_ma_wt=col["Cop_ma_wt"], Cop_ma_pv=col["Cop_ma_pv"],
+        rho_gas=col["rho_gas"], rho_fuel=col["rho_fuel"],
+        C_startup=col["C_startup"], C_degrad_es=col["C_degrad_es"],
+        eta_chp=col["eta_chp"], eta_dg=col["eta_dg"],
+        u_chp=u_chp, u_dg=u_dg, prev_u_chp=u_chp, prev_u_dg=u_dg,
+        load=col["load"], H_demand=col["H_demand"], H_chp=H_chp,
+        soc_es=soc_es, soc_ev=soc_ev,
+        ees_min=col["Ees_min"], ees_max=col["Ees_max"],
+        leave_possible=col["leave_possible"], Eev_required=col["Eev_required"],
+        # The CVaR term needs the violations, whatever breakdown the caller asked for
+        detail="full" if include_cvar else detail
+    )
+    reward = np.array(np.broadcast_to(reward, shape))
+
+    result = {
+        "p_import": p_import, "p_export": p_export, "p_wt": p_wt, "p_pv": p_pv,
+        "p_chp": p_chp, "p_dg": p_dg, "p_ch_es": p_ch_es, "p_dis_es": p_dis_es, "p_ch_ev": p_ch_ev,
+        "H_chp": H_chp,
+        "u_chp": u_chp, "u_dg": u_dg, "u_es": u_es, "u_maingrid": u_maingrid,
+        "soc_es": soc_es, "soc_ev": soc_ev,
+        "reward": reward,
+    }
+    if breakdown is not None and "penalty_load" in breakdown.dtype.names:
+        violations = sum(breakdown[k] for k in VIOLATION_COMPONENTS)
+        cvar_vio = np.array([cvar(v, CVAR_ALPHA) for v in violations.reshape(-1, T)]).reshape(shape[:-1])
+        if include_cvar and T > 0:
+            reward[..., -1] -= CVAR_VIOL_WEIGHT * cvar_vio
+        result["cvar_vio"] = cvar_vio if cvar_vio.ndim else float(cvar_vio)
+
+    if detail != "none":
+        fields = REWARD_COMPONENTS if detail == "full" else REWARD_COMPONENTS[:2]
+        result.update({k: breakdown[k] for k in fields})
+    return result
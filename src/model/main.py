@@ -1,34 +1,32 @@
-import os
-import pandas as pd
 from env import MicrogridEnv
+from vec_env import MicrogridVecEnv
+from shm_vec_env import SharedMemoryVecEnv
 from agent import train_agent
-from scenarios import generate_mixed_scenario_dataset
-from stable_baselines3.common.env_checker import check_env
-from stable_baselines3.common.callbacks import EvalCallback, StopTrainingOnRewardThreshold
-from stable_baselines3.common.vec_env import SubprocVecEnv
+from scenarios import generate_mixed_scenario_dataset, DEFAULT_EVENTS
+from param_store import load_params
+from stable_baselines3.common.callbacks import StopTrainingOnRewardThreshold
+from callbacks import AsyncEvalCallback, PhaseTimingCallback
+from evaluation import scenario_suite
 from stable_baselines3.common.monitor import Monitor
+from monitor import plot_reward_summary
 from config import HORIZON
 
-import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 
-PARAM_DIR = "data/parameters/1year"  # Directory containing parameter CSV files
+PARAM_DIR = "data/parameters/1year"  # Directory containing parameter CSV files (compiled to a store on first load)
+EVAL_PARAM_DIR = "data/testset/1year"  # Held-out parameters of the evaluation suite
+EVAL_HORIZON = 1752  # length of the test set (20% of a year), as evaluated in test.py
 
-def load_params(path):
-    params = {}
-    for fname in os.listdir(path):
-        if fname.endswith(".csv"):
-            key = fname.replace(".csv", "")
-            params[key] = pd.read_csv(os.path.join(path, fname)).iloc[:, 0].tolist()
-    return params
 
-
-def make_env(seed_offset=19):
+def make_env(seed_offset=19, randomize=False):
     def _init(seed=seed_offset):
         params = load_params(PARAM_DIR)
+        if randomize:
+            # Event-free base horizon; every reset draws its own events on top of it
+            base = generate_mixed_scenario_dataset(params, events=())
+            return Monitor(MicrogridEnv({}, base, randomize_events=DEFAULT_EVENTS, copy_obs=False))
         scenarios = generate_mixed_scenario_dataset(params, seed=seed)
-        return Monitor(MicrogridEnv({}, scenarios))
+        return Monitor(MicrogridEnv({}, scenarios, copy_obs=False))
     return _init
 
 
@@ -37,39 +35,58 @@ if __name__ == "__main__":
 
     n_envs = 3 # Number of parallel environments
     seed_offset = 19
+    use_native_vec_env = True  # step all scenarios in-process with MicrogridVecEnv instead of worker processes
+    start_method = None  # worker start method: "fork", "forkserver" or "spawn" (None: forkserver if available)
+    n_workers = None  # worker processes (None: one per available core, at most one per env)
+    randomize_scenarios = True  # draw fresh disturbance events on every reset instead of one fixed scenario per env
+    time_env_phases = False  # log the share of env step time per phase (timing/ in TensorBoard)
     
 
     # Test that the environment follows the gymnasium API
     #for i in range(n_envs):
         #check_env(env_fns[i])
 
-    env_fns = [make_env(seed_offset + i) for i in range(n_envs)]
-    env = SubprocVecEnv(env_fns)
+    if use_native_vec_env:
+        params = load_params(PARAM_DIR)
+        if randomize_scenarios:
+            base = generate_mixed_scenario_dataset(params, events=())
+            env = MicrogridVecEnv([base] * n_envs, randomize_events=DEFAULT_EVENTS)
+        else:
+            env = MicrogridVecEnv([generate_mixed_scenario_dataset(params, seed=seed_offset + i) for i in range(n_envs)])
+    else:
+        env_fns = [make_env(seed_offset + i, randomize=randomize_scenarios) for i in range(n_envs)]
+        env = SharedMemoryVecEnv(env_fns, start_method=start_method, n_workers=n_workers)
+    env.seed(seed_offset)
 
 
 
     stop_cb = StopTrainingOnRewardThreshold(reward_threshold=1000 ,verbose=1)
-    eval_cb = EvalCallback(
-    env,
+    # Fixed evaluation suite, scored out of process on policy snapshots while training continues
+    eval_scenarios = scenario_suite(load_params(EVAL_PARAM_DIR), seeds=range(100, 108), horizons=(EVAL_HORIZON,))
+    eval_cb = AsyncEvalCallback(
+    eval_scenarios,
     callback_on_new_best=stop_cb,
     eval_freq=HORIZON * 50,       # run evaluation every 100k steps
-    n_eval_episodes=8,
+    n_workers=2,
     best_model_save_path="./best_model/",
     verbose=1
 )
+    callbacks = [eval_cb, PhaseTimingCallback()] if time_env_phases else eval_cb
     model = train_agent(
     env,
     total_timesteps=400_000,
-    call_back=eval_cb,
+    call_back=callbacks,
     model_name="ppo_0.4_M_microgrid_model_cost_importance_0.1_v4"
 )
 
 
-    trackers = env.get_attr("reward_tracker")
-    for i, tracker in enumerate(trackers):
-        print(f"=== Env #{i} reward breakdown ===")
-        tracker.plot()      # uses the class's plt.figure, plt.plot, etc.
-        tracker.clear()
+    # Reward statistics are aggregated where the envs run: only their summaries are sent back
+    summaries = env.env_method("reward_summary", series=True)
+    for i, summary in enumerate(summaries):
+        print(f"=== Env #{i} reward breakdown ({summary['episodes']} episodes, {summary['steps']} steps) ===")
+        for key in summary['components']:
+            print(f"{key:>16}: mean {summary['mean'][key]:.4f}  p95 {summary['quantiles'][key][0.95]:.4f}  max {summary['max'][key]:.4f}")
+        plot_reward_summary(summary, title=f"Env #{i} reward components")
 
 
    # … assume `env` is your SubprocVecEnv, `model` is your trained PPO …
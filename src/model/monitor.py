@@ -1,25 +1,240 @@
-import matplotlib.pyplot as plt
+import numpy as np
+from collections import deque
+from reward import REWARD_COMPONENTS  # components logged per step (keys of the compute_reward breakdown)
+
+VIOLATION_COMPONENTS = ('penalty_load', 'penalty_heat', 'penalty_batt', 'penalty_ev')
+SUMMARY_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+
+def cvar(values, alpha=0.05):
+    """CVaR (mean of the worst `alpha` tail) of a 1-D array of per-step violations"""
+    if len(values) == 0:
+        return 0.0
+    q = np.quantile(values, 1.0 - alpha)
+    return float(values[values >= q].mean())
+
 
 class RewardTracker:
-    def __init__(self):
-        self.history = []
+    """
+    Per-step reward breakdown stored in preallocated NumPy arrays.
+
+    The episode buffer holds one row per step and one column per component and is
+    rewound by new_episode(), so memory stays bounded by the episode length.
+    An optional ring buffer keeps the last `history_size` steps across episodes.
+
+    Finished episodes are folded into running aggregates (per-component count, sum,
+    sum of squares, min and max, a uniform reservoir sample for quantiles, per-episode
+    sums and violation CVaR, and a downsampled series of block means). summary()
+    returns them in a few kilobytes, e.g. through env_method("reward_summary"),
+    instead of shipping the tracker itself.
+    """
+
+    def __init__(self, capacity=1024, components=REWARD_COMPONENTS, history_size=0,
+                 sample_size=4096, series_points=1024, max_episodes=10_000, seed=0):
+        """
+        Args:
+            capacity: initial episode buffer length (grows if an episode is longer)
+            components: reward components logged per step
+            history_size: steps kept in the cross-episode ring buffer (0: none)
+            sample_size: reservoir size used for the summary quantiles
+            series_points: maximum points of the downsampled series (block means whose
+                           length doubles whenever the series fills up)
+            max_episodes: per-episode summaries kept (the most recent ones)
+            seed: seed of the reservoir sampling
+        """
+        self.components = tuple(components)
+        self._viol_cols = [i for i, k in enumerate(self.components) if k in VIOLATION_COMPONENTS]
+        self._episode = np.zeros((max(int(capacity), 1), len(self.components)))
+        self._record_dtype = np.dtype([(k, np.float64) for k in self.components])
+        self._records = self._episode.view(self._record_dtype).reshape(-1)  # structured view of the rows
+        self.n = 0
+        self._history = np.zeros((history_size, len(self.components))) if history_size > 0 else None
+        self._history_pos = 0  # total number of steps ever written to the ring
+
+        # Running aggregates over finished episodes (see summary)
+        self._rng = np.random.default_rng(seed)
+        self._sample = np.zeros((sample_size, len(self.components)))
+        self._series = np.zeros((series_points - series_points % 2, len(self.components)))
+        self._episode_stats = deque(maxlen=max_episodes)
+        self._reset_aggregates()
+
+    def _reset_aggregates(self):
+        n_comp = len(self.components)
+        self.steps = 0
+        self.episodes = 0
+        self._sum = np.zeros(n_comp)
+        self._sumsq = np.zeros(n_comp)
+        self._min = np.full(n_comp, np.inf)
+        self._max = np.full(n_comp, -np.inf)
+        self._series_n = 0  # filled points of the series
+        self._stride = 1  # steps per series point
+        self._block_sum = np.zeros(n_comp)  # partial block of the series
+        self._block_n = 0
+        self._episode_stats.clear()
 
     def log(self, breakdown):
-        # breakdown should be a dict with all reward components
-        self.history.append(breakdown.copy())
+        """
+        Append one step. `breakdown` is either a dict of reward components or a
+        structured record with one field per component (copied without allocating).
+        """
+        if self.n == len(self._episode):
+            self._episode = np.concatenate([self._episode, np.zeros_like(self._episode)])
+            self._records = self._episode.view(self._record_dtype).reshape(-1)
+        if isinstance(breakdown, dict):
+            self._episode[self.n] = [breakdown.get(k, 0.0) for k in self.components]
+        else:
+            self._records[self.n] = breakdown
+        if self._history is not None:
+            self._history[self._history_pos % len(self._history)] = self._episode[self.n]
+            self._history_pos += 1
+        self.n += 1
+
+    def new_episode(self):
+        """Fold the finished episode into the aggregates and rewind the episode buffer
+        (the cross-episode ring buffer is kept)"""
+        if self.n:
+            self.log_episode(self._episode[:self.n])
+        self.n = 0
+
+    def log_episode(self, rows):
+        """
+        Fold a whole finished episode into the aggregates.
+
+        Args:
+            rows: (n_steps, n_components) array of per-step components, in `components` order
+        """
+        n = len(rows)
+        if n == 0:
+            return
+        self._sum += rows.sum(axis=0)
+        self._sumsq += np.square(rows).sum(axis=0)
+        np.minimum(self._min, rows.min(axis=0), out=self._min)
+        np.maximum(self._max, rows.max(axis=0), out=self._max)
+
+        # Reservoir sampling (algorithm R, vectorized: later rows win duplicate slots as they would in sequence)
+        size = len(self._sample)
+        fill = min(max(size - self.steps, 0), n)
+        self._sample[self.steps:self.steps + fill] = rows[:fill]
+        if fill < n:
+            seen = np.arange(self.steps + fill, self.steps + n) + 1
+            slots = (self._rng.random(n - fill) * seen).astype(np.int64)
+            keep = slots < size
+            self._sample[slots[keep]] = rows[fill:][keep]
+
+        violations = rows[:, self._viol_cols].sum(axis=1)
+        self._episode_stats.append((n, rows.sum(axis=0), cvar(violations)))
+        self._fold_series(rows)
+        self.steps += n
+        self.episodes += 1
+
+    def _fold_series(self, rows):
+        """Append rows to the downsampled series of block means"""
+        pos, n, width = 0, len(rows), rows.shape[1]
+        while pos < n:
+            if self._block_n:
+                # Complete the partial block
+                take = min(self._stride - self._block_n, n - pos)
+                self._block_sum += rows[pos:pos + take].sum(axis=0)
+                self._block_n += take
+                pos += take
+                if self._block_n == self._stride:
+                    if self._series_n == len(self._series):
+                        self._compact_series()
+                    self._series[self._series_n] = self._block_sum / self._block_n
+                    self._series_n += 1
+                    self._block_sum[:] = 0
+                    self._block_n = 0
+                continue
+            if self._series_n == len(self._series):
+                self._compact_series()
+            k = min((n - pos) // self._stride, len(self._series) - self._series_n)
+            if k:
+                blocks = rows[pos:pos + k * self._stride].reshape(k, self._stride, width)
+                self._series[self._series_n:self._series_n + k] = blocks.mean(axis=1)
+                self._series_n += k
+                pos += k * self._stride
+            elif n - pos < self._stride:
+                self._block_sum += rows[pos:].sum(axis=0)
+                self._block_n = n - pos
+                pos = n
+
+    def _compact_series(self):
+        """Halve the resolution of the full series: merge neighbouring points, double the stride"""
+        half = len(self._series) // 2
+        self._series[:half] = (self._series[0::2] + self._series[1::2]) / 2
+        self._series_n = half
+        self._stride *= 2
+
+    def summary(self, series=False):
+        """
+        Aggregates over the finished episodes, small enough to send between processes.
+
+        Args:
+            series: also return the downsampled per-component series for plotting
+
+        Returns:
+            dict: 'components', 'steps', 'episodes'
+                  'sum', 'mean', 'std', 'min', 'max' -> {component: float}
+                  'quantiles' -> {component: {q: value}} for SUMMARY_QUANTILES (from the reservoir)
+                  'episode_length' -> (E,) lengths of the last episodes,
+                  'episode_sum' -> {component: (E,) per-episode sums}, 'episode_cvar' -> (E,) violation CVaR
+                  'series' (only with series=True) -> {component: (P,) block means}, 'series_stride' -> steps per point
+        """
+        steps = max(self.steps, 1)
+        mean = self._sum / steps
+        std = np.sqrt(np.maximum(self._sumsq / steps - mean ** 2, 0.0))
+        sample = self._sample[:min(self.steps, len(self._sample))]
+        quantiles = np.quantile(sample, SUMMARY_QUANTILES, axis=0) if len(sample) else np.zeros((len(SUMMARY_QUANTILES), len(self.components)))
+        stats = list(self._episode_stats)
+        episode_sum = np.array([s for _, s, _ in stats]).reshape(len(stats), len(self.components))
+
+        out = {
+            'components': self.components,
+            'steps': self.steps,
+            'episodes': self.episodes,
+            'sum': dict(zip(self.components, self._sum.tolist())),
+            'mean': dict(zip(self.components, mean.tolist())),
+            'std': dict(zip(self.components, std.tolist())),
+            'min': dict(zip(self.components, self._min.tolist())),
+            'max': dict(zip(self.components, self._max.tolist())),
+            'quantiles': {k: dict(zip(SUMMARY_QUANTILES, quantiles[:, i].tolist())) for i, k in enumerate(self.components)},
+            'episode_length': np.array([n for n, _, _ in stats], dtype=np.int64),
+            'episode_sum': {k: episode_sum[:, i] for i, k in enumerate(self.components)},
+            'episode_cvar': np.array([c for _, _, c in stats]),
+        }
+        if series:
+            out['series'] = {k: self._series[:self._series_n, i].copy() for i, k in enumerate(self.components)}
+            out['series_stride'] = self._stride
+        return out
+
+    def episode(self):
+        """Dict of per-step arrays for the current episode (views, not copies)"""
+        return {k: self._episode[:self.n, i] for i, k in enumerate(self.components)}
+
+    def history(self):
+        """Dict of per-step arrays for the last `history_size` steps in chronological order"""
+        if self._history is None:
+            return self.episode()
+        size = len(self._history)
+        if self._history_pos <= size:
+            rows = self._history[:self._history_pos]
+        else:
+            rows = np.roll(self._history, -(self._history_pos % size), axis=0)
+        return {k: rows[:, i] for i, k in enumerate(self.components)}
 
     def plot(self):
-        if not self.history:
+        data = self.history()
+        if not len(data[self.components[0]]):
             print("No reward data to plot.")
             return
 
-        keys = [k for k in self.history[0].keys() if k not in ("timestep", "total_true_cost")]
-        timesteps = [r.get('timestep', i) for i, r in enumerate(self.history)]
+        import matplotlib.pyplot as plt  # imported on first plot only: env workers never load it
+        keys = [k for k in self.components if k != "total_true_cost"]
+        timesteps = np.arange(len(data[keys[0]]))
 
         plt.figure(figsize=(12, 8))
         for key in keys:
-            values = [r[key] for r in self.history]
-            plt.plot(timesteps, values, label=key)
+            plt.plot(timesteps, data[key], label=key)
         plt.xlabel("Timestep")
         plt.ylabel("Value")
         plt.title("Reward Component Evolution")
@@ -28,25 +243,32 @@ class RewardTracker:
         plt.show()
 
     def clear(self):
-        self.history = []
+        self.n = 0
+        self._history_pos = 0
+        self._reset_aggregates()
+
     def compute_cvar(self, alpha=0.05):
-        import numpy as np
-        if not self.history:
-            return 0.0
-
-        vals = []
-        for r in self.history:
-            v = 0.0
-            v += r.get('penalty_load', 0.0)
-            v += r.get('penalty_heat', 0.0)
-            v += r.get('penalty_batt', 0.0)
-            v += r.get('penalty_ev', 0.0)
-            vals.append(v)
-
-        if len(vals) == 0:
-            return 0.0
-
-        q = np.quantile(vals, 1.0 - alpha)
-        tail = [v for v in vals if v >= q]
-        return float(np.mean(tail)) if tail else 0.0
-w
\ No newline at end of file
+        """CVaR (mean of the worst `alpha` tail) of the summed violations over the current episode"""
+        return cvar(self._episode[:self.n, self._viol_cols].sum(axis=1), alpha)
+
+
+def plot_reward_summary(summary, title="Reward Component Evolution"):
+    """Plot the downsampled component series of a RewardTracker.summary(series=True)"""
+    series = summary.get('series')
+    if not series or not len(next(iter(series.values()))):
+        print("No reward data to plot.")
+        return
+
+    import matplotlib.pyplot as plt
+    keys = [k for k in summary['components'] if k != "total_true_cost"]
+    timesteps = np.arange(len(series[keys[0]])) * summary['series_stride']
+
+    plt.figure(figsize=(12, 8))
+    for key in keys:
+        plt.plot(timesteps, series[key], label=key)
+    plt.xlabel(f"Timestep (mean over {summary['series_stride']} steps)")
+    plt.ylabel("Value")
+    plt.title(title)
+    plt.legend()
+    plt.tight_layout()
+    plt.show()
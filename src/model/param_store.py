@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import tempfile
+import numpy as np
+
+# Compiled store written next to the parameter CSVs it was built from
+STORE_FILENAME = "_params.store"
+
+# File layout: magic | uint32 header length | JSON header | padding | float64 data
+# The data holds a (n_dense, T_max) block of dense series followed by a (2, n_runs) block
+# of run starts/values; constant series live in the header only.
+_MAGIC = b"MGPSTORE"
+_VERSION = 2
+_ALIGN = 64
+
+# A series is stored as runs when it has at most len / RUN_LENGTH_RATIO value changes
+RUN_LENGTH_RATIO = 4
+
+
+class ConstantSeries:
+    """A parameter series that holds one value at every timestep"""
+
+    def __init__(self, value, length):
+        self.value = float(value)
+        self.length = int(length)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return ConstantSeries(self.value, len(range(*t.indices(self.length))))
+        if not -self.length <= t < self.length:
+            raise IndexError(t)
+        return self.value
+
+    def __iter__(self):
+        return iter(self.dense())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.full(self.length, self.value, dtype=dtype or np.float64)
+
+    def dense(self):
+        """Expanded per-timestep array"""
+        return np.full(self.length, self.value)
+
+    def __repr__(self):
+        return f"ConstantSeries({self.value}, length={self.length})"
+
+
+class RunLengthSeries:
+    """A piecewise-constant parameter series: values[i] holds from starts[i] up to starts[i + 1]"""
+
+    def __init__(self, starts, values, length):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.length = int(length)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return compact_series(self.dense()[t])
+        if t < 0:
+            t += self.length
+        if not 0 <= t < self.length:
+            raise IndexError(t)
+        return float(self.values[np.searchsorted(self.starts, t, side="right") - 1])
+
+    def __iter__(self):
+        return iter(self.dense())
+
+    def __array__(self, dtype=None, copy=None):
+        return self.dense().astype(dtype or np.float64, copy=False)
+
+    def dense(self):
+        """Expanded per-timestep array"""
+        return np.repeat(self.values, np.diff(np.append(self.starts, self.length)))
+
+    def __repr__(self):
+        return f"RunLengthSeries({len(self.values)} runs, length={self.length})"
+
+
+def compact_series(values):
+    """
+    Pick the smallest representation of a series: ConstantSeries when every value is
+    equal, RunLengthSeries when it changes rarely, the dense array otherwise.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return values
+    change = np.flatnonzero(values[1:] != values[:-1]) + 1
+    if len(change) == 0:
+        return ConstantSeries(values[0], n)
+    if (len(change) + 1) * RUN_LENGTH_RATIO <= n:
+        starts = np.concatenate([[0], change])
+        return RunLengthSeries(starts, values[starts], n)
+    return values
+
+
+def densify(params):
+    """Copy of a parameter dict with every compact series expanded to a dense array"""
+    return {k: v.dense() if isinstance(v, (ConstantSeries, RunLengthSeries)) else v for k, v in params.items()}
+
+
+def _source_fingerprint(path):
+    """(name, size, mtime) of every parameter CSV in `path`, used to detect stale stores"""
+    fingerprint = []
+    for fname in sorted(os.listdir(path)):
+        if fname.endswith(".csv"):
+            st = os.stat(os.path.join(path, fname))
+            fingerprint.append([fname, st.st_size, st.st_mtime_ns])
+    return fingerprint
+
+
+def _read_csv_dir(path):
+    """
+    Parse every parameter CSV in `path` into compact series. A single-row CSV is a
+    scalar parameter and is broadcast to the length of the longest series.
+    """
+    import pandas as pd  # only needed to (re)compile the store from the CSVs
+    raw = {}
+    for fname in sorted(os.listdir(path)):
+        if fname.endswith(".csv"):
+            key = fname.replace(".csv", "")
+            raw[key] = pd.read_csv(os.path.join(path, fname)).iloc[:, 0].to_numpy(dtype=np.float64)
+    T = max((len(v) for v in raw.values()), default=0)
+    return {
+        k: ConstantSeries(v[0], T) if len(v) == 1 else compact_series(v)
+        for k, v in raw.items()
+    }
+
+
+def compile_params(path, store_path=None):
+    """
+    Parse the single-column parameter CSVs in `path` into one memory-mappable store file.
+
+    Args:
+        path: directory of parameter CSVs (e.g. data/parameters/1year)
+        store_path: output file (defaults to <path>/_params.store)
+
+    Returns:
+        str: path of the written store
+    """
+    store_path = store_path or os.path.join(path, STORE_FILENAME)
+    fingerprint = _source_fingerprint(path)
+    series = _read_csv_dir(path)
+
+    encodings = {}
+    dense, runs = [], []
+    n_runs = 0
+    for k, v in series.items():
+        if isinstance(v, ConstantSeries):
+            encodings[k] = {"kind": "constant", "value": v.value, "length": v.length}
+        elif isinstance(v, RunLengthSeries):
+            encodings[k] = {"kind": "runs", "offset": n_runs, "count": len(v.values), "length": v.length}
+            runs.append(np.stack([v.starts.astype(np.float64), v.values]))
+            n_runs += len(v.values)
+        else:
+            encodings[k] = {"kind": "dense", "row": len(dense), "length": len(v)}
+            dense.append(v)
+    T = max((len(v) for v in dense), default=0)
+    dense_block = np.zeros((len(dense), T), dtype=np.float64)
+    for i, v in enumerate(dense):
+        dense_block[i, :len(v)] = v
+    runs_block = np.concatenate(runs, axis=1) if runs else np.zeros((2, 0))
+
+    header = json.dumps({
+        "version": _VERSION,
+        "params": encodings,
+        "dense_shape": list(dense_block.shape),
+        "runs_count": n_runs,
+        "dtype": dense_block.dtype.str,
+        "sources": fingerprint,
+    }).encode()
+    prefix = len(_MAGIC) + 4 + len(header)
+    padding = b" " * (-prefix % _ALIGN)
+
+    # Write to a temp file and rename, so concurrent readers never see a partial store
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(store_path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_MAGIC)
+            f.write(np.uint32(len(header) + len(padding)).tobytes())
+            f.write(header + padding)
+            f.write(dense_block.tobytes())
+            f.write(runs_block.tobytes())
+        os.replace(tmp_path, store_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return store_path
+
+
+def read_store_header(store_path):
+    """Return (header dict, data offset) of a compiled store, or (None, 0) if it is not a valid store"""
+    try:
+        with open(store_path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                return None, 0
+            size = int(np.frombuffer(f.read(4), dtype=np.uint32)[0])
+            header = json.loads(f.read(size))
+    except (OSError, ValueError, IndexError):
+        return None, 0
+    if header.get("version") != _VERSION:
+        return None, 0
+    return header, len(_MAGIC) + 4 + size
+
+
+def open_store(store_path):
+    """
+    Memory-map a compiled store.
+
+    Returns:
+        dict: parameter name -> ConstantSeries, RunLengthSeries, or a read-only
+              1-D float64 array backed by the mapped file
+    """
+    header, offset = read_store_header(store_path)
+    if header is None:
+        raise ValueError(f"{store_path} is not a compiled parameter store")
+    dtype = np.dtype(header["dtype"])
+    n, T = header["dense_shape"]
+    n_runs = header["runs_count"]
+    data = np.memmap(store_path, dtype=dtype, mode="r", offset=offset, shape=(n * T + 2 * n_runs,)) \
+        if n * T + n_runs > 0 else np.zeros(0, dtype=dtype)
+    dense_block = np.asarray(data[:n * T]).reshape(n, T)
+    runs_block = np.asarray(data[n * T:]).reshape(2, n_runs)
+
+    params = {}
+    for k, enc in header["params"].items():
+        if enc["kind"] == "constant":
+            params[k] = ConstantSeries(enc["value"], enc["length"])
+        elif enc["kind"] == "runs":
+            block = runs_block[:, enc["offset"]:enc["offset"] + enc["count"]]
+            params[k] = RunLengthSeries(block[0], block[1], enc["length"])
+        else:
+            params[k] = dense_block[enc["row"], :enc["length"]]
+    return params
+
+
+def load_params(path):
+    """
+    Load a parameter directory as a dict of per-timestep series.
+
+    Constant and piecewise-constant series come back as ConstantSeries / RunLengthSeries
+    (index them like arrays; np.asarray() or densify() give a dense view), the others as
+    plain arrays. Uses the compiled store in `path`, (re)building it first when it is
+    missing or any source CSV changed. Arrays are read-only views of the memory-mapped
+    store, so all processes loading the same directory share the same page-cache pages.
+    Falls back to parsing the CSVs directly if the directory is not writable.
+    """
+    store_path = os.path.join(path, STORE_FILENAME)
+    header, _ = read_store_header(store_path)
+    if header is None or header["sources"] != _source_fingerprint(path):
+        try:
+            compile_params(path, store_path)
+        except OSError:
+            return _read_csv_dir(path)
+    return open_store(store_path)
+
+
+if __name__ == "__main__":
+    # Precompile parameter directories: python param_store.py data/parameters/1year data/testset/1year
+    for directory in sys.argv[1:]:
+        print(f"Compiled {compile_params(directory)}")
@@ -1,5 +1,10 @@
 import numpy as np
-from config import LOAD_BALANCE_WEIGHT, HEAT_BALANCE_WEIGHT, BATTERY_BOUNDS_WEIGHT, EV_SOC_BOUNDS_WEIGHT
+
+# Reward breakdown components (keys of the compute_reward insights)
+REWARD_COMPONENTS = ('total_true_cost', 'total_cost', 'penalty_load', 'penalty_heat', 'penalty_batt', 'penalty_ev')
+REWARD_DTYPE = np.dtype([(k, np.float64) for k in REWARD_COMPONENTS])
+TOTALS_DTYPE = np.dtype([(k, np.float64) for k in REWARD_COMPONENTS[:2]])
+DETAIL_LEVELS = ("none", "totals", "full")
 
 def compute_reward(
     t,
@@ -18,10 +23,16 @@ def compute_reward(
     # Energy states
     soc_es, soc_ev, ees_min, ees_max,
     # EV parameters
-    leave_possible, Eev_required
+    leave_possible, Eev_required,
+    # Output buffer
+    out=None
 ):
     """
     Compute reward based on economic cost and constraint satisfaction
+
+    Args:
+        out: optional 0-d REWARD_DTYPE record; when given the breakdown is written into
+             it (and returned) instead of a new insights dict
     
     Returns:
         float: reward value (negative cost minus penalties)
@@ -78,7 +89,6 @@ def compute_reward(
      
     
     # EV SOC bounds violation (only when leaving is possible)
-    penalty_ev = 0
     if leave_possible == 1:
         ev_violation = max(0, Eev_required - soc_ev)
         
@@ -93,13 +103,18 @@ def compute_reward(
     norm_ev_violation = ev_violation / (Eev_required + 1e-6)
     normalized_cost = total_cost / (load + H_demand + 1e-6)
 
-    # === 4. COEFFICIENTS ===
-    penalty_load = -LOAD_BALANCE_WEIGHT * norm_load_balance_violation
-    penalty_heat = -HEAT_BALANCE_WEIGHT * norm_heat_deficit
-    penalty_batt = -BATTERY_BOUNDS_WEIGHT * norm_battery_violation
-    penalty_ev = -EV_SOC_BOUNDS_WEIGHT * norm_ev_violation
+    # === 4. FINAL REWARD ===
+    reward = -normalized_cost 
+    #reward = np.clip(reward, -10, 10)
 
-    # === 5. FINAL REWARD ===
+    if out is not None:
+        out['total_true_cost'] = total_cost
+        out['total_cost'] = normalized_cost
+        out['penalty_load'] = norm_load_balance_violation
+        out['penalty_heat'] = norm_heat_deficit
+        out['penalty_batt'] = norm_battery_violation
+        out['penalty_ev'] = norm_ev_violation
+        return reward, out
 
     insights = {
         'total_true_cost': total_cost,
@@ -109,35 +124,85 @@ def compute_reward(
         'penalty_batt': norm_battery_violation,
         'penalty_ev': norm_ev_violation
     }
-    
-    reward_load = (
-    +5.0 * (1.0 - norm_load_balance_violation)
-    - LOAD_BALANCE_WEIGHT * norm_load_balance_violation
-)
-
-    reward_heat = (
-    +2.0 * (1.0 - norm_heat_deficit)
-    - HEAT_BALANCE_WEIGHT * norm_heat_deficit
-)
 
-    reward_batt = (
-    +1.0 * (1.0 - norm_battery_violation)
-    - BATTERY_BOUNDS_WEIGHT * norm_battery_violation
-)
+    return reward, insights
 
-    reward_ev = (
-    +1.0 * (1.0 - norm_ev_violation)
-    - EV_SOC_BOUNDS_WEIGHT * norm_ev_violation
-    )
+def compute_reward_batch(
+    # Power variables
+    p_import, p_export, p_wt, p_pv, p_chp, p_dg, p_dis_es, p_ch_es, p_ch_ev,
+    # Price parameters
+    price_import, price_export, price_ev,
+    # Cost parameters
+    Cop_ma_wt, Cop_ma_pv, rho_gas, rho_fuel, C_startup, C_degrad_es,
+    # Efficiency parameters
+    eta_chp, eta_dg,
+    # Binary states (current and previous)
+    u_chp, u_dg, prev_u_chp, prev_u_dg,
+    # Load and heat
+    load, H_demand, H_chp,
+    # Energy states
+    soc_es, soc_ev, ees_min, ees_max,
+    # EV parameters
+    leave_possible, Eev_required,
+    # Output control
+    detail="full", out=None
+):
+    """
+    Vectorized compute_reward: every argument is a NumPy array (one element per env
+    or per timestep, broadcast together) and the same cost and violation terms are
+    computed elementwise.
 
+    Args:
+        detail: breakdown to build, one of DETAIL_LEVELS
+                'none'   -> no breakdown (only the reward is computed)
+                'totals' -> total_true_cost and total_cost
+                'full'   -> every component of REWARD_COMPONENTS
+        out: optional preallocated structured array to write the breakdown into
+             (dtype REWARD_DTYPE, or TOTALS_DTYPE for 'totals'), e.g. reused every step
     
-
-
-
-
-
+    Returns:
+        tuple: (reward, components)
+               reward: array of rewards (negative normalized cost)
+               components: structured array of the selected components (None for 'none');
+                           components['penalty_load'] etc. read like the insights dict
+    """
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"detail must be one of {DETAIL_LEVELS}, got {detail!r}")
     
-    reward = -normalized_cost 
-    #reward = np.clip(reward, -10, 10)
+    # === 1. COST COMPONENTS ===
+    fuel_chp = np.where(eta_chp > 0, rho_gas * p_chp / np.where(eta_chp > 0, eta_chp, 1.0), 0.0)
+    fuel_dg = np.where(eta_dg > 0, rho_fuel * p_dg / np.where(eta_dg > 0, eta_dg, 1.0), 0.0)
+    startup = C_startup * (np.maximum(0, u_chp - prev_u_chp) + np.maximum(0, u_dg - prev_u_dg))
+    
+    total_cost = (
+        price_import * p_import
+        - price_export * p_export
+        - price_ev * p_ch_ev
+        + Cop_ma_wt * p_wt
+        + Cop_ma_pv * p_pv
+        + fuel_chp
+        + fuel_dg
+        + startup
+        + C_degrad_es * p_dis_es
+    )
+    normalized_cost = total_cost / (load + H_demand + 1e-6)
+    reward = -normalized_cost
+    if detail == "none":
+        return reward, None
 
-    return reward, insights
\ No newline at end of file
+    shape = np.broadcast_shapes(np.shape(total_cost), np.shape(H_chp), np.shape(soc_es), np.shape(soc_ev))
+    components = out if out is not None else np.empty(shape, dtype=REWARD_DTYPE if detail == "full" else TOTALS_DTYPE)
+    components['total_true_cost'] = total_cost
+    components['total_cost'] = normalized_cost
+    if detail == "totals":
+        return reward, components
+    
+    # === 2. CONSTRAINT PENALTIES (normalized) ===
+    total_supply = p_import + p_wt + p_pv + p_chp + p_dg + p_dis_es
+    total_demand = p_export + load + p_ch_es + p_ch_ev
+    components['penalty_load'] = np.abs(total_supply - total_demand) / (load + 1e-6)
+    components['penalty_heat'] = np.maximum(0, H_demand - H_chp) / (H_demand + 1e-6)
+    components['penalty_batt'] = (np.maximum(0, ees_min - soc_es) + np.maximum(0, soc_es - ees_max)) / (ees_max - ees_min + 1e-6)
+    components['penalty_ev'] = np.where(leave_possible == 1, np.maximum(0, Eev_required - soc_ev), 0.0) / (Eev_required + 1e-6)
+    
+    return reward, components
@@ -1,72 +1,308 @@
-from config import HORIZON
+from config import HORIZON, SCENARIO_TYPES
 
 import numpy as np
-import copy
-import random
 import os
-import pandas as pd
+import json
+import hashlib
+import tempfile
+from collections import OrderedDict
+from state_action import build_param_table, PARAM_KEYS, PARAM_INDEX
 
-def generate_mixed_scenario_dataset(data, total_hours=HORIZON, seed=19):
+# Disturbance events inserted into every scenario. Durations are drawn from
+# [min, max) hours; load spikes scale the load by a factor drawn per hour from `scale`.
+DEFAULT_EVENTS = (
+    {"kind": "outage", "duration": (24, 72), "count": 3},
+    {"kind": "storage_failure", "duration": (48, 72), "count": 1},
+    {"kind": "load_spike", "duration": (1, 3), "count": 1, "scale": (1.5, 2.5)},
+)
+
+# Parameter columns each event switches off
+EVENT_COLUMNS = {
+    "outage": [PARAM_INDEX["P_grid_import_max"], PARAM_INDEX["P_grid_export_max"]],
+    "storage_failure": [PARAM_INDEX["Pch_es_max"], PARAM_INDEX["Pdis_es_max"]],
+}
+SCENARIO_CODES = {kind: i for i, kind in enumerate(SCENARIO_TYPES)}
+# Parameters an event can change (they vary over time once events are sampled)
+EVENT_PARAM_KEYS = ("load",) + tuple(PARAM_KEYS[c] for cols in EVENT_COLUMNS.values() for c in cols)
+
+# Bit flags of the per-episode event overlay (see EventOverlay); events may overlap
+EVENT_FLAGS = {"outage": 1, "storage_failure": 2, "load_spike": 4}
+
+# On-disk scenario cache: one <key>.npz per scenario (arrays: table, tags, columns, scenario_types)
+SCENARIO_CACHE_DIR = '../output/scenarios/cache'
+# Hashed into every scenario_key: bump it whenever the generated scenarios change for the same
+# inputs (event sampling, random streams, table layout), so stale cache entries and the oracle
+# results stored under their keys are no longer found
+SCENARIO_FORMAT_VERSION = 2
+MEMORY_CACHE_SIZE = 64
+_memory_cache = OrderedDict()
+
+
+def sample_events(rng, total_hours, events=DEFAULT_EVENTS):
     """
-    Returns a full-length dataset with embedded scenario episodes.
+    Draw the disturbance events of one scenario.
+
+    Each spec inserts a fixed `count` of events, or, when it gives a `rate` (events per
+    hour) instead, a Poisson-distributed number of them.
+
+    Args:
+        rng: np.random.Generator for this scenario
+        total_hours: scenario length
+        events: event specification (see DEFAULT_EVENTS)
+
+    Returns:
+        list of (kind, start, duration, load_factors) tuples, in insertion order
+        (load_factors is None except for load spikes)
     """
-    random.seed(seed)
-    np.random.seed(seed)
-    new_data = {k: copy.deepcopy(v[:total_hours]) for k, v in data.items() if isinstance(v, list)}
-    scenario_tags = ['normal'] * total_hours
-    
-    def insert_event(kind, duration_range, count):
+    sampled = []
+    for spec in events:
+        count = rng.poisson(spec["rate"] * total_hours) if "rate" in spec else spec.get("count", 1)
         for _ in range(count):
-            duration = np.random.randint(*duration_range)
-            start = np.random.randint(0, total_hours - duration)
-            for t in range(start, start + duration):
-                scenario_tags[t] = kind
-
-                if kind == "storage_failure":
-                    if "pch_es_max" in new_data:
-                        new_data["pch_es_max"][t] = 0.0
-                    if "pdis_es_max" in new_data:
-                        new_data["pdis_es_max"][t] = 0.0
-                elif kind == "outage":
-                    if "P_grid_import_max" in new_data:
-                        new_data["P_grid_import_max"][t] = 0.0
-                    if "P_grid_export_max" in new_data:
-                        new_data["P_grid_export_max"][t] = 0.0
-                elif kind == "load_spike":
-                    if "load" in new_data:
-                        new_data["load"][t] *= np.random.uniform(1.5, 2.5)
-
-
-    def save_scenario(data, total_hours, seed, output_dir='../output/scenarios'):
-        """
-        Saves the scenario data as a CSV file in the specified directory.
+            duration = int(rng.integers(*spec["duration"]))
+            if duration < total_hours:
+                start = int(rng.integers(0, total_hours - duration))
+            else:
+                # Event longer than the episode: it covers the whole episode
+                start, duration = 0, total_hours
+            factors = rng.uniform(*spec.get("scale", (1.5, 2.5)), size=duration) if spec["kind"] == "load_spike" else None
+            sampled.append((spec["kind"], start, duration, factors))
+    return sampled
+
+
+def apply_events(table, tags, events):
+    """
+    Apply sampled events in place to one (T, N_PARAMS) parameter table and its (T,) tag codes.
+    Later events overwrite the tag of earlier ones; their parameter effects accumulate.
+    """
+    for kind, start, duration, factors in events:
+        stop = start + duration
+        tags[start:stop] = SCENARIO_CODES[kind]
+        if kind == "load_spike":
+            table[start:stop, PARAM_INDEX["load"]] *= factors
+        else:
+            table[start:stop, EVENT_COLUMNS[kind]] = 0.0
+    return table, tags
+
+
+def apply_overlay(rows, flags, load_scale):
+    """
+    Apply event overlay flags in place to parameter rows.
+
+    Args:
+        rows: (..., N_PARAMS) parameter rows (a copy, never the shared base table)
+        flags: (...) EVENT_FLAGS bit masks of the same hours
+        load_scale: (...) load multipliers of the same hours
+    """
+    for kind, bit in EVENT_FLAGS.items():
+        hit = (flags & bit) != 0
+        if kind == "load_spike":
+            rows[..., PARAM_INDEX["load"]] = np.where(hit, rows[..., PARAM_INDEX["load"]] * load_scale, rows[..., PARAM_INDEX["load"]])
+        else:
+            for col in EVENT_COLUMNS[kind]:
+                rows[..., col] = np.where(hit, 0.0, rows[..., col])
+    return rows
+
+
+class EventOverlay:
+    """
+    Disturbance events of one episode, kept apart from the (shared, read-only) parameter table.
+
+    The overlay is a (T,) int8 array of EVENT_FLAGS bits plus a (T,) load multiplier, with
+    the same semantics as apply_events. Resampling only rewinds the hours the previous draw
+    touched, so a reset costs O(event hours) rather than O(T) even on the full horizon.
+    """
 
+    def __init__(self, total_hours, events=DEFAULT_EVENTS, flags=None, load_scale=None):
+        """
         Args:
-            data (pd.DataFrame): The scenario data to save.
-            total_hours (int): Horizon value used in the filename.
-            seed (int): Seed value used in the filename.
-            output_dir (str): The directory to save the CSV file.
+            total_hours: episode length T
+            events: default event specification for sample() (see DEFAULT_EVENTS)
+            flags, load_scale: optional preallocated (T,) buffers (e.g. rows of a batched overlay)
         """
-        # Ensure output directory exists
-        os.makedirs(output_dir, exist_ok=True)
+        self.total_hours = int(total_hours)
+        self.events = events
+        self.flags = np.zeros(self.total_hours, dtype=np.int8) if flags is None else flags
+        self.load_scale = np.ones(self.total_hours) if load_scale is None else load_scale
+        self.tags = np.zeros(self.total_hours, dtype=np.int8)  # SCENARIO_TYPES codes, as in generate_scenario_batch
+        self.sampled = []
+
+    def clear(self):
+        """Remove all events (only the hours they covered are touched)"""
+        for _, start, duration, _ in self.sampled:
+            stop = start + duration
+            self.flags[start:stop] = 0
+            self.load_scale[start:stop] = 1.0
+            self.tags[start:stop] = 0
+        self.sampled = []
+
+    def set_events(self, sampled):
+        """Replace the overlay with already sampled (kind, start, duration, load_factors) events"""
+        self.clear()
+        for kind, start, duration, factors in sampled:
+            stop = start + duration
+            self.flags[start:stop] |= EVENT_FLAGS[kind]
+            self.tags[start:stop] = SCENARIO_CODES[kind]
+            if kind == "load_spike":
+                self.load_scale[start:stop] *= factors
+        self.sampled = list(sampled)
+
+    def sample(self, rng, events=None):
+        """Draw a fresh set of events from `rng` (defaults to this overlay's event specification)"""
+        events = self.events if events is None else events
+        self.set_events(sample_events(rng, self.total_hours, events) if events else [])
 
-        # Create the filename
-        filename = f'scenario_seed_{seed}_horizon_{total_hours}.csv'
+    def __bool__(self):
+        return bool(self.sampled)
 
-        # Construct full path
-        filepath = os.path.join(output_dir, filename)
 
-        # Save DataFrame to CSV
-        data.to_csv(filepath, index=False)
-        
-        print(f"Scenario saved to {filepath}")
+def generate_scenario_batch(data, seeds, total_hours=HORIZON, events=DEFAULT_EVENTS, dtype=np.float32):
+    """
+    Generate one scenario per seed from a base parameter dataset.
+
+    Each seed gets its own np.random.Generator, so scenarios are reproducible and
+    independent of the global random state and of each other.
 
+    Args:
+        data: base parameter dict (series per parameter)
+        seeds: iterable of K integer seeds
+        total_hours: scenario length T
+        events: event specification (see DEFAULT_EVENTS)
+        dtype: dtype of the returned tables
+
+    Returns:
+        tuple: (tables, tags)
+               tables: (K, T, N_PARAMS) parameter tables in state_action.PARAM_KEYS order
+               tags: (K, T) int8 codes indexing config.SCENARIO_TYPES
+    """
+    seeds = list(seeds)
+    base, _ = build_param_table(data, total_hours, dtype=dtype)
+    tables = np.repeat(base[None], len(seeds), axis=0)
+    tags = np.zeros((len(seeds), total_hours), dtype=np.int8)
+    for k, seed in enumerate(seeds):
+        rng = np.random.default_rng(seed)
+        apply_events(tables[k], tags[k], sample_events(rng, total_hours, events))
+    return tables, tags
 
-    # Insert events (customize as needed)
-    insert_event("outage", duration_range=(24, 72), count=3)
-    insert_event("storage_failure", duration_range=(48, 72), count=1)
-    insert_event("load_spike", duration_range=(1, 3), count=1)
 
-    new_data["scenario"] = scenario_tags
-    save_scenario(pd.DataFrame(new_data), total_hours, seed)
+def scenario_to_dict(data, table, tags):
+    """
+    Turn one generated (T, N_PARAMS) table back into a parameter dict shaped like `data`,
+    with a 'scenario' list of event tags.
+    """
+    total_hours = len(tags)
+    new_data = {}
+    for k, v in data.items():
+        if k in PARAM_INDEX:
+            new_data[k] = table[:min(len(v), total_hours), PARAM_INDEX[k]].astype(np.float64)
+        elif isinstance(v, (list, np.ndarray)) and k != "scenario":
+            new_data[k] = np.array(v[:total_hours], dtype=np.float64)
+    new_data["scenario"] = [SCENARIO_TYPES[c] for c in tags]
+    return new_data
+
+
+def scenario_key(data, seed, total_hours=HORIZON, events=DEFAULT_EVENTS):
+    """Content hash of (base parameter dataset, seed, horizon, event specification, SCENARIO_FORMAT_VERSION)"""
+    base, _ = build_param_table(data, total_hours, dtype=np.float64)
+    h = hashlib.sha256()
+    h.update(base.tobytes())
+    h.update(json.dumps({
+        "present": sorted((k, len(data[k])) for k in PARAM_KEYS if k in data),
+        "seed": int(seed),
+        "total_hours": int(total_hours),
+        "events": [dict(spec) for spec in events],
+        "format": SCENARIO_FORMAT_VERSION,
+    }, sort_keys=True).encode())
+    return h.hexdigest()[:32]
+
+
+def _load_cached(path):
+    try:
+        with np.load(path) as f:
+            return f["table"], f["tags"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _store_cached(path, table, tags):
+    # Write to a temp file and rename: concurrent workers requesting the same key
+    # may both write, but readers only ever see a complete file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, table=table, tags=tags, columns=np.array(PARAM_KEYS), scenario_types=np.array(SCENARIO_TYPES))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def get_scenario(data, seed, total_hours=HORIZON, events=DEFAULT_EVENTS, cache_dir=SCENARIO_CACHE_DIR):
+    """
+    Cached single-scenario generation.
+
+    Looks the scenario up by content key in memory, then in `cache_dir` (pass None to
+    skip the disk), and only generates it when neither has it.
+
+    Returns:
+        tuple: (table, tags) as for one entry of generate_scenario_batch (float64 table)
+    """
+    key = scenario_key(data, seed, total_hours, events)
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        return _memory_cache[key]
+
+    path = os.path.join(cache_dir, f"{key}.npz") if cache_dir else None
+    cached = _load_cached(path) if path and os.path.exists(path) else None
+    if cached is None:
+        tables, tags = generate_scenario_batch(data, [seed], total_hours, events, dtype=np.float64)
+        cached = tables[0], tags[0]
+        if path:
+            _store_cached(path, *cached)
+
+    for arr in cached:
+        arr.flags.writeable = False
+    _memory_cache[key] = cached
+    if len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+    return cached
+
+
+def save_scenario(data, total_hours, seed, output_dir='../output/scenarios'):
+    """
+    Saves the scenario data as a CSV file in the specified directory.
+
+    Args:
+        data (pd.DataFrame): The scenario data to save.
+        total_hours (int): Horizon value used in the filename.
+        seed (int): Seed value used in the filename.
+        output_dir (str): The directory to save the CSV file.
+    """
+    # Ensure output directory exists
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Create the filename
+    filename = f'scenario_seed_{seed}_horizon_{total_hours}.csv'
+
+    # Construct full path
+    filepath = os.path.join(output_dir, filename)
+
+    # Save DataFrame to CSV
+    data.to_csv(filepath, index=False)
+
+    print(f"Scenario saved to {filepath}")
+
+
+def generate_mixed_scenario_dataset(data, total_hours=HORIZON, seed=19, events=DEFAULT_EVENTS,
+                                    cache_dir=SCENARIO_CACHE_DIR, export_csv=False):
+    """
+    Returns a full-length dataset with embedded scenario episodes.
+    Scenarios are served from the scenario cache (see get_scenario); the CSV
+    export to ../output/scenarios is only written when export_csv is True.
+    """
+    table, tags = get_scenario(data, seed, total_hours, events, cache_dir)
+    new_data = scenario_to_dict(data, table, tags)
+    if export_csv:
+        import pandas as pd  # only needed for the CSV export
+        save_scenario(pd.DataFrame(new_data), total_hours, seed)
     return new_data
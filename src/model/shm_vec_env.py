@@ -0,0 +1,164 @@
+import os
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+from reward import REWARD_COMPONENTS
+from shm_worker import worker, block_layout, block_views, EnvFactories
+
+
+def default_worker_count(n_envs):
+    """Workers to start for n_envs: one per available core, at most one per env"""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return max(1, min(n_envs, cores))
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Subprocess vector env for MicrogridEnv that moves step data through shared memory.
+
+    Each worker process runs a contiguous group of envs. Actions, observations, rewards,
+    done flags and reward breakdowns live in one shared NumPy block; a step sends a
+    one-word command per worker and waits for a one-word ack, so nothing is pickled on
+    the hot path. Infos are rebuilt in the parent from the shared breakdown records (as
+    MicrogridVecEnv does); wrapper-added info keys (e.g. Monitor's "episode") are not
+    forwarded, so use VecMonitor for episode statistics.
+    """
+
+    def __init__(self, env_fns, start_method=None, n_workers=None, info_keys=REWARD_COMPONENTS):
+        """
+        Args:
+            env_fns: list of callables each returning a MicrogridEnv (optionally wrapped)
+            start_method: 'fork', 'forkserver' or 'spawn' (default: forkserver when available,
+                          else spawn, as SubprocVecEnv)
+            n_workers: number of worker processes (default: default_worker_count); envs are
+                       split evenly over them
+            info_keys: breakdown components copied into each env's info dict
+        """
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        n_workers = min(n_workers or default_worker_count(n_envs), n_envs)
+        bounds = np.linspace(0, n_envs, n_workers + 1).astype(int)
+        self._groups = [range(bounds[w], bounds[w + 1]) for w in range(n_workers)]
+
+        # Start the resource tracker before the workers, so that they share it with the parent
+        # (otherwise a forked worker starts its own, which unlinks the block when it exits)
+        resource_tracker.ensure_running()
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_workers)])
+        self.processes = []
+        for work_remote, remote, group in zip(self.work_remotes, self.remotes, self._groups):
+            fns = EnvFactories([env_fns[i] for i in group])
+            process = ctx.Process(target=worker, args=(work_remote, remote, fns, group.start), daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+        super().__init__(n_envs, observation_space, action_space)
+
+        layout, size = block_layout(n_envs, observation_space, action_space)
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._buf = block_views(self._shm.buf, layout)
+        for remote in self.remotes:
+            remote.send(("attach", (self._shm.name, layout)))
+        for remote in self.remotes:
+            remote.recv()
+
+        self.info_keys = list(info_keys)
+
+    def step_async(self, actions):
+        self._buf["actions"][:] = np.asarray(actions).reshape(self._buf["actions"].shape)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        for remote in self.remotes:
+            remote.recv()
+        self.waiting = False
+
+        buf = self._buf
+        if self.info_keys:
+            infos = [dict(zip(self.info_keys, values)) for values in buf["breakdown"][self.info_keys].tolist()]
+        else:
+            infos = [{} for _ in range(self.num_envs)]
+        dones = buf["dones"].copy()
+        for i in np.flatnonzero(dones):
+            if not buf["truncated"][i]:
+                infos[i]["cvar_vio"] = float(buf["cvar_vio"][i])
+            infos[i]["TimeLimit.truncated"] = bool(buf["truncated"][i])
+            infos[i]["terminal_observation"] = buf["terminal_obs"][i].copy()
+        return buf["obs"].copy(), buf["rewards"].copy(), dones, infos
+
+    def reset(self):
+        for remote, group in zip(self.remotes, self._groups):
+            remote.send(("reset", ([self._seeds[i] for i in group], [self._options[i] for i in group])))
+        for remote in self.remotes:
+            remote.recv()
+        self._reset_seeds()
+        self._reset_options()
+        return self._buf["obs"].copy()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self._buf = None
+        self._shm.close()
+        self._shm.unlink()
+        self.closed = True
+
+    def _dispatch(self, indices):
+        """(remote, local indices) of the workers owning the given env indices"""
+        indices = list(self._get_indices(indices))
+        for remote, group in zip(self.remotes, self._groups):
+            local = [i - group.start for i in indices if i in group]
+            if local:
+                yield remote, local
+
+    def _call(self, cmd, indices, *payload):
+        targets = list(self._dispatch(indices))
+        for remote, local in targets:
+            remote.send((cmd, (local,) + payload))
+        return [remote.recv() for remote, _ in targets]
+
+    def get_worker_stats(self, reset=False):
+        """
+        Per-worker step counters, one dict per worker process:
+        'steps' (vector steps served), 'step_ns' (time spent stepping its envs) and
+        'idle_ns' (time blocked waiting for the next command, e.g. while the policy runs).
+
+        Args:
+            reset: zero the counters after reading them
+        """
+        for remote in self.remotes:
+            remote.send(("worker_stats", reset))
+        return [remote.recv() for remote in self.remotes]
+
+    def get_attr(self, attr_name, indices=None):
+        return [v for values in self._call("get_attr", indices, attr_name) for v in values]
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._call("set_attr", indices, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [v for values in self._call("env_method", indices, method_name, method_args, method_kwargs) for v in values]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [v for values in self._call("is_wrapped", indices, wrapper_class) for v in values]
@@ -0,0 +1,131 @@
+import time
+import pickle
+from multiprocessing import shared_memory
+import numpy as np
+import cloudpickle
+from reward import REWARD_DTYPE
+
+# Worker side of SharedMemoryVecEnv. Kept free of stable_baselines3 / torch imports, so
+# that spawn / forkserver workers only load what their envs need.
+
+_ALIGN = 64
+
+
+def block_layout(n_envs, observation_space, action_space):
+    """(name, shape, dtype, offset) of every array in the shared block, and the block size"""
+    fields = [
+        ("obs", (n_envs,) + observation_space.shape, observation_space.dtype),
+        ("terminal_obs", (n_envs,) + observation_space.shape, observation_space.dtype),
+        ("actions", (n_envs,) + action_space.shape, action_space.dtype),
+        ("rewards", (n_envs,), np.float32),
+        ("dones", (n_envs,), np.bool_),
+        ("truncated", (n_envs,), np.bool_),
+        ("cvar_vio", (n_envs,), np.float64),
+        ("breakdown", (n_envs,), REWARD_DTYPE),
+    ]
+    layout, offset = [], 0
+    for name, shape, dtype in fields:
+        dtype = np.dtype(dtype)
+        layout.append((name, shape, dtype, offset))
+        offset += -(-int(np.prod(shape)) * dtype.itemsize // _ALIGN) * _ALIGN
+    return layout, max(offset, 1)
+
+
+def block_views(buf, layout):
+    """Dict of NumPy arrays backed by the shared block"""
+    return {
+        name: np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        for name, shape, dtype, offset in layout
+    }
+
+
+class EnvFactories:
+    """Env constructors sent to a worker, pickled with cloudpickle (lambdas and closures included)"""
+
+    def __init__(self, fns):
+        self.fns = fns
+
+    def __getstate__(self):
+        return cloudpickle.dumps(self.fns)
+
+    def __setstate__(self, state):
+        self.fns = pickle.loads(state)
+
+
+def worker(remote, parent_remote, env_fns, first):
+    """
+    Runs envs [first, first + len(env_fns)) of the vector env. Steps read actions from and
+    write results to the shared block; the pipe only carries commands and acknowledgements.
+    Also counts the time spent stepping and the time spent waiting for commands.
+    """
+    parent_remote.close()
+    envs = [fn() for fn in env_fns.fns]
+    shm, views = None, None
+    steps, step_ns, idle_ns = 0, 0, 0
+    while True:
+        try:
+            t_wait = time.perf_counter_ns()
+            cmd, data = remote.recv()
+            t_start = time.perf_counter_ns()
+            idle_ns += t_start - t_wait
+            if cmd == "step":
+                obs_buf, actions = views["obs"], views["actions"]
+                for j, env in enumerate(envs):
+                    i = first + j
+                    obs, reward, terminated, truncated, info = env.step(actions[i])
+                    core = env.unwrapped
+                    views["breakdown"][i] = core.breakdown
+                    views["rewards"][i] = reward
+                    done = terminated or truncated
+                    views["dones"][i] = done
+                    views["truncated"][i] = truncated and not terminated
+                    if done:
+                        views["terminal_obs"][i] = obs
+                        views["cvar_vio"][i] = info.get("cvar_vio", 0.0)
+                        obs, _ = env.reset()
+                    obs_buf[i] = obs
+                remote.send(None)
+                steps += 1
+                step_ns += time.perf_counter_ns() - t_start
+            elif cmd == "reset":
+                seeds, options = data
+                for j, env in enumerate(envs):
+                    kwargs = {"options": options[j]} if options[j] else {}
+                    obs, _ = env.reset(seed=seeds[j], **kwargs)
+                    views["obs"][first + j] = obs
+                remote.send(None)
+            elif cmd == "get_spaces":
+                remote.send((envs[0].observation_space, envs[0].action_space))
+            elif cmd == "attach":
+                # Workers share the parent's resource tracker: the parent unlinks the block on close
+                shm = shared_memory.SharedMemory(name=data[0])
+                views = block_views(shm.buf, data[1])
+                remote.send(None)
+            elif cmd == "get_attr":
+                remote.send([envs[j].get_wrapper_attr(data[1]) for j in data[0]])
+            elif cmd == "set_attr":
+                for j in data[0]:
+                    setattr(envs[j], data[1], data[2])
+                remote.send(None)
+            elif cmd == "env_method":
+                local, name, args, kwargs = data
+                remote.send([envs[j].get_wrapper_attr(name)(*args, **kwargs) for j in local])
+            elif cmd == "worker_stats":
+                remote.send({"steps": steps, "step_ns": step_ns, "idle_ns": idle_ns})
+                if data:
+                    steps, step_ns, idle_ns = 0, 0, 0
+            elif cmd == "is_wrapped":
+                from stable_baselines3.common.env_util import is_wrapped
+                remote.send([is_wrapped(envs[j], data[1]) for j in data[0]])
+            elif cmd == "close":
+                for env in envs:
+                    env.close()
+                views = None
+                if shm is not None:
+                    shm.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except (EOFError, KeyboardInterrupt):
+            break
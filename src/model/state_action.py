@@ -2,11 +2,85 @@ import numpy as np
 from gymnasium import spaces
 from config import OBS_DIM, ACT_DIM
 
-def get_observation_space():
+# Parameter features of the observation, in the order get_observation_space lays them out.
+PARAM_KEYS = (
+    "load",
+    "price_import", "price_export", "price_ev",
+    "rho_gas", "Cop_ma_wt", "Cop_ma_pv", "rho_fuel", "C_startup", "C_degrad_es",
+    "eta_chp", "eta_dg", "eta_ch_es", "eta_dis_es", "eta_ch_ev", "alpha_chp",
+    "H_demand",
+    "P_grid_import_max", "P_grid_export_max", "PWT_max", "PPV_max", "PCHP_max", "PDG_max", "Pdis_es_max", "Pch_es_max",
+    "PEV_max",
+    "Ees_min", "Ees_max",
+    "Eev_required",
+    "A", "session_start", "leave_possible",
+)
+PARAM_INDEX = {name: i for i, name in enumerate(PARAM_KEYS)}
+N_PARAMS = len(PARAM_KEYS)
+
+# Fallback values used by the dynamics when a parameter series is missing (the observation shows 0 instead)
+PARAM_DEFAULTS = {
+    "P_grid_import_max": 100, "P_grid_export_max": 100,
+    "Pch_es_max": 50, "Pdis_es_max": 50,
+    "PWT_max": 50, "PPV_max": 50, "PCHP_max": 25, "PDG_max": 30, "PEV_max": 60,
+    "eta_ch_es": 0.9, "eta_dis_es": 0.9, "eta_ch_ev": 0.95, "alpha_chp": 0.8,
+    "eta_chp": 0.9, "eta_dg": 0.9,
+    "Ees_max": 300,
+}
+
+
+# Previous-step decision variables that follow the parameters in the observation
+DECISION_KEYS = (
+    "prev_p_import", "prev_p_export", "prev_p_wt", "prev_p_pv", "prev_p_chp",
+    "prev_p_dg", "prev_p_ch_es", "prev_p_dis_es", "prev_p_ch_ev",
+    "prev_H_chp",
+    "prev_soc_es", "prev_soc_ev",
+    "prev_u_chp", "prev_u_dg", "prev_u_es", "prev_u_maingrid",
+)
+OBS_KEYS = PARAM_KEYS + DECISION_KEYS
+OBS_INDEX = {name: i for i, name in enumerate(OBS_KEYS)}
+
+
+def build_param_table(params, T, defaults=None, dtype=np.float32):
+    """
+    Compile a dict of parameter time-series into a contiguous (T, N_PARAMS) table
+    with columns in PARAM_KEYS order.
+
+    Args:
+        params: dict mapping parameter name to a sequence of per-timestep values
+        T: number of rows (timesteps) of the table
+        defaults: optional dict of fill values for missing series or timesteps (0 otherwise)
+        dtype: dtype of the table
+
+    Returns:
+        tuple: (table, complete)
+               table: (T, N_PARAMS) array
+               complete: True if every column was fully covered by params
+    """
+    table = np.zeros((T, N_PARAMS), dtype=dtype)
+    complete = True
+    for j, name in enumerate(PARAM_KEYS):
+        series = params.get(name)
+        n = 0 if series is None else min(len(series), T)
+        if n > 0:
+            table[:n, j] = np.asarray(series[:n], dtype=dtype)
+        if n < T:
+            complete = False
+            if defaults and name in defaults:
+                table[n:, j] = defaults[name]
+    return table, complete
+
+def get_observation_space(schema=None):
     """
     Define observation space with appropriate bounds for each state variable.
     State vector includes all parameters from data/parameters/default plus decision variables.
+
+    Args:
+        schema: optional ObservationSchema; the space then holds only its features,
+                in its order and dtype (default: the full OBS_DIM float32 layout)
     """
+    if schema is not None:
+        return schema.space()
     
     # We'll build the bounds dynamically based on the specification
     low_bounds = []
@@ -125,4 +199,68 @@ def get_action_space():
             low = low[:ACT_DIM]
             high = high[:ACT_DIM]
     
-    return spaces.Box(low=low, high=high, dtype=np.float32)
\ No newline at end of file
+    return spaces.Box(low=low, high=high, dtype=np.float32)
+
+class ObservationSchema:
+    """
+    Which observation features a policy sees, in which order and dtype.
+
+    The env always builds the full OBS_KEYS layout; the schema selects from it, and
+    get_observation_space(schema) derives the matching space, so the two cannot drift
+    apart. A policy must be evaluated with the schema it was trained with (keep `keys`).
+    """
+
+    def __init__(self, keys=OBS_KEYS, dtype=np.float32):
+        """
+        Args:
+            keys: feature names (from OBS_KEYS) in the order they appear in the observation
+            dtype: observation dtype (e.g. np.float16 to halve rollout-buffer memory)
+        """
+        unknown = [k for k in keys if k not in OBS_INDEX]
+        if unknown:
+            raise ValueError(f"Unknown observation features: {unknown}")
+        self.keys = tuple(keys)
+        self.index = np.array([OBS_INDEX[k] for k in self.keys], dtype=np.intp)
+        self.dtype = np.dtype(dtype)
+        # Full layout in float32: observations can be passed through untouched
+        self.is_full = self.keys == OBS_KEYS and self.dtype == np.float32
+
+    @classmethod
+    def compact(cls, tables, keep=(), order=None, dtype=np.float32):
+        """
+        Schema without the parameter features that are constant over the given data.
+
+        Args:
+            tables: (T, N_PARAMS) parameter table, or a list of them (e.g. one per env);
+                    a feature is dropped only if it holds one value across all of them
+            keep: feature names to keep even when constant (e.g. columns an event overlay changes)
+            order: optional feature order; features missing from it follow in OBS_KEYS order
+            dtype: observation dtype
+        """
+        tables = [tables] if isinstance(tables, np.ndarray) and tables.ndim == 2 else list(tables)
+        stacked = np.concatenate([np.asarray(t).reshape(-1, N_PARAMS) for t in tables])
+        constant = (stacked == stacked[:1]).all(axis=0) if len(stacked) else np.zeros(N_PARAMS, dtype=bool)
+        keys = [k for k in OBS_KEYS if not (k in PARAM_INDEX and constant[PARAM_INDEX[k]] and k not in keep)]
+        if order is not None:
+            keys = [k for k in order if k in keys] + [k for k in keys if k not in order]
+        return cls(keys, dtype)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def space(self):
+        """Observation space of the selected features"""
+        full = get_observation_space()
+        return spaces.Box(low=full.low[self.index].astype(self.dtype), high=full.high[self.index].astype(self.dtype), dtype=self.dtype)
+
+    def select(self, obs, out=None):
+        """Select the schema features from full-layout observations (..., OBS_DIM)"""
+        if self.is_full:
+            return obs
+        if out is None:
+            return obs[..., self.index].astype(self.dtype)
+        out[...] = obs[..., self.index]
+        return out
+
+    def __repr__(self):
+        return f"ObservationSchema({len(self.keys)} features, dtype={self.dtype.name})"
@@ -1,34 +1,24 @@
-import os
 import numpy as np
-import pandas as pd
-from stable_baselines3 import PPO
-from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.vec_env import DummyVecEnv
-from env import MicrogridEnv
 from scenarios import generate_mixed_scenario_dataset
-from baseline import BaselineController
-import matplotlib.pyplot as plt
-# from milp import solve_milp    # uncomment if you have a MILP solver function
+from param_store import load_params
+# evaluation (which loads the vector env, stable_baselines3 and torch), pandas and matplotlib
+# are imported where they are used, so that importing this module loads none of them
+# MILP reference costs come from the oracle batch job, run after this script has cached the scenarios:
+#   cd ../offline && python oracle.py --horizons 1752
 
 SEED=19
-# Utility to load parameter CSVs into a dict of lists
-def load_params(path):
-    params = {}
-    for fname in os.listdir(path):
-        if fname.endswith('.csv'):
-            key = fname.replace('.csv','')
-            params[key] = pd.read_csv(os.path.join(path, fname)).iloc[:,0].tolist()
-    return params
+N_EVAL_SEEDS=0  # > 0: also compare PPO and baseline over this many scenario seeds (in a process pool)
 
 
 
 
 
 
-def evaluate_policy(policy: PPO, scenario: dict, horizon: int) -> float:
+def evaluate_policy(policy: "PPO", scenario: dict, horizon: int) -> float:
     """
-    Roll out `policy` for exactly one episode of length `horizon` on MicrogridEnv,
+    Roll out `policy` for exactly one episode of length `horizon` on the microgrid env,
     and return the accumulated `total_true_cost` from each step's breakdown.
+    Use evaluation.evaluate_batch / evaluate_scenarios to score many scenarios at once.
     
     Args:
         policy:    a loaded PPO model
@@ -38,25 +28,8 @@ def evaluate_policy(policy: PPO, scenario: dict, horizon: int) -> float:
     Returns:
         total_cost: the sum of breakdown['total_true_cost'] over the episode
     """
-    # 1) Construct the env
-    env = MicrogridEnv({}, scenario, horizon=horizon)
-    
-    # 2) Reset; gymnasium reset returns (obs, info)
-    obs, _    = env.reset()
-    done      = False
-    cost = []
-    
-    # 3) Step until termination
-    while not done:
-        action, _ = policy.predict(obs, deterministic=True)
-        obs, reward, terminated, truncated, breakdown = env.step(action)
-        
-        # Breakdown contains your insights dict from compute_reward()
-        # which now has 'total_true_cost' (raw, un‑normalized)
-        cost.append(breakdown.get("total_true_cost", 0.0))
-
-        done = terminated or truncated
-
+    from evaluation import evaluate_batch
+    cost = evaluate_batch(policy, [scenario], horizon=horizon)["costs"][0].tolist()
     return sum(cost), cost
 
 
@@ -70,19 +43,8 @@ def evaluate_baseline(params: dict, horizon: int) -> float:
     Roll out your BaselineController for one episode of exactly `horizon` steps,
     summing breakdown['total_cost'] each step.
     """
-    env        = MicrogridEnv({}, params, horizon=horizon)
-    obs, _     = env.reset()
-    done       = False
-    cost = []
-    baseline   = BaselineController(params)
-
-    while not done:
-        t          = env.t                         # current timestep index
-        action     = baseline.select_action(t)     # returns shape (7,)
-        obs, _, terminated, truncated, breakdown = env.step(action)
-        cost.append(breakdown.get("total_true_cost", 0.0))
-        done = terminated or truncated
-
+    from evaluation import evaluate_batch
+    cost = evaluate_batch("baseline", [params], horizon=horizon)["costs"][0].tolist()
     return sum(cost),cost
 
 
@@ -93,11 +55,12 @@ def plot_cost_comparison(
     label_1="PPO",
     label_2="Baseline",
     graph_title="Cost Evolution Comparison",
-    scenario_csv_path=None
+    scenario_csv_path=None,
+    scenario_tags=None
 ):
     """
     Plots the evolution of one or two cost sequences over time,
-    with optional scenario indicators from a CSV file.
+    with optional scenario indicators from a tag list or a CSV file.
 
     Parameters:
     - cost_list_1: First list of cost values (e.g., PPO).
@@ -106,7 +69,10 @@ def plot_cost_comparison(
     - label_2: Label for the second cost list.
     - graph_title: Title of the plot.
     - scenario_csv_path: Optional path to CSV file containing a 'scenario' column.
+    - scenario_tags: Optional list of per-hour scenario tags (e.g. scenario['scenario']).
     """
+    import pandas as pd
+    import matplotlib.pyplot as plt
     hours = list(range(len(cost_list_1)))
 
     if cost_list_2 is not None and cost_list_1 is not None and len(cost_list_2) != len(cost_list_1):
@@ -129,8 +95,10 @@ def plot_cost_comparison(
     
         
     max_cost = max(max_cost_1, max_cost_2,1)
-    # Add scenario markers if CSV is provided
-    if scenario_csv_path:
+    # Add scenario markers if tags or a CSV are provided
+    if scenario_tags is not None:
+        scenario_series = pd.Series(scenario_tags).fillna("normal").astype(str).str.lower()
+    elif scenario_csv_path:
         df = pd.read_csv(scenario_csv_path)
         scenario_col = None
         for col in df.columns:
@@ -142,6 +110,10 @@ def plot_cost_comparison(
             raise ValueError("No 'scenario' column found in the CSV file.")
 
         scenario_series = df[scenario_col].fillna("normal").astype(str).str.lower()
+    else:
+        scenario_series = None
+
+    if scenario_series is not None:
         unique_scenarios = sorted(set(scenario_series.unique()) - {"normal"})
 
         for scen in unique_scenarios:
@@ -165,6 +137,7 @@ def plot_cost_evolution(cost_list, graph_title="Cost Evolution Over Time"):
     - cost_list: List of cost values over time.
     - graph_title: Title of the plot.
     """
+    import matplotlib.pyplot as plt
     hours = list(range(len(cost_list)))
     
     plt.figure(figsize=(10, 6))
@@ -215,7 +188,10 @@ if __name__ == '__main__':
     #'ppo_3_M_microgrid_model_cost_importance_0.1':PPO 13
     #best_model_path = "./best_model/best_model"
     
-    policy = PPO.load('ppo_0.4_M_microgrid_model_cost_importance_0.1_v4') 
+    from stable_baselines3 import PPO
+    from evaluation import evaluate_scenarios, scenario_suite, suite_keys, load_oracle_results
+    model_path = 'ppo_0.4_M_microgrid_model_cost_importance_0.1_v4'
+    policy = PPO.load(model_path) 
 
 
     #ppo_cost_48h, ppo_cost_breakdown_48h = evaluate_policy(policy, scenario=params_48h,horizon=48)
@@ -239,7 +215,29 @@ if __name__ == '__main__':
 
     print(f"20%1y PPO cost: {ppo_cost_1y:.2f}")
     print(f"20%1y Baseline cost: {baseline_cost_1y:.2f}")
+    milp_1y = load_oracle_results(suite_keys(params_1y, seeds=(SEED,), horizons=(1752,)))
+    if milp_1y["status"][0] != "missing":
+        short = {k: v[0] for k, v in milp_1y["shortfall"].items()}
+        print(f"20%1y MILP cost: {milp_1y['total_cost'][0]:.2f} ({milp_1y['status'][0]}, gap {milp_1y['gap'][0]:.3%}), "
+              f"unserved load {short['load']:.1f} kWh, heat {short['heat']:.1f} kWh, EV {short['ev']:.1f} kWh")
     #plot_cost_evolution(moving_average_list(ppo_cost_breakdown_1y), graph_title="PPO Cost Evolution Over 48 Hours")
     #plot_cost_evolution(moving_average_list(baseline_cost_breakdown_1y), graph_title="Baseline Cost Evolution Over 48 Hours")
     #plot_cost_evolution(baseline_cost_breakdown_1y, graph_title="Baseline Cost Evolution Over 48 Hours")
-    plot_cost_comparison(cost_list_1=moving_average_list(ppo_cost_breakdown_1y), cost_list_2=moving_average_list(baseline_cost_breakdown_1y), label_1="PPO", label_2="Baseline", graph_title="20% 1-Year Cost Comparison", scenario_csv_path="../output/scenarios/scenario_seed_19_horizon_1752.csv")
+    plot_cost_comparison(cost_list_1=moving_average_list(ppo_cost_breakdown_1y), cost_list_2=moving_average_list(baseline_cost_breakdown_1y), label_1="PPO", label_2="Baseline", graph_title="20% 1-Year Cost Comparison", scenario_tags=scenario_1y["scenario"])
+
+    # --- Same comparison over many scenario seeds, batched and sharded over processes ---
+    if N_EVAL_SEEDS > 0:
+        suite = scenario_suite(params_1y, seeds=range(SEED, SEED + N_EVAL_SEEDS), horizons=(1752,))
+        ppo_eval = evaluate_scenarios(model_path, suite)
+        baseline_eval = evaluate_scenarios("baseline", suite)
+        print(f"{N_EVAL_SEEDS} seeds PPO cost: {ppo_eval['total_cost'].mean():.2f} ± {ppo_eval['total_cost'].std():.2f}")
+        print(f"{N_EVAL_SEEDS} seeds Baseline cost: {baseline_eval['total_cost'].mean():.2f} ± {baseline_eval['total_cost'].std():.2f}")
+        milp_eval = load_oracle_results(suite_keys(params_1y, seeds=range(SEED, SEED + N_EVAL_SEEDS), horizons=(1752,)))
+        solved = np.isfinite(milp_eval["total_cost"])
+        if solved.any():
+            milp_cost = milp_eval["total_cost"][solved]
+            print(f"{solved.sum()}/{N_EVAL_SEEDS} seeds MILP cost: {milp_cost.mean():.2f} ± {milp_cost.std():.2f}, "
+                  f"unserved load {milp_eval['shortfall']['load'][solved].mean():.1f} kWh per scenario")
+            for name, ev in (("PPO", ppo_eval), ("Baseline", baseline_eval)):
+                excess = (ev["total_cost"][solved] - milp_cost) / np.abs(milp_cost)
+                print(f"{name} cost relative to MILP: {excess.mean():+.2%} (worst {excess.max():+.2%})")
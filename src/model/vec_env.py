@@ -0,0 +1,376 @@
+import numpy as np
+import time
+from stable_baselines3.common.vec_env import VecEnv
+from state_action import get_observation_space, get_action_space, build_param_table, N_PARAMS, PARAM_INDEX, PARAM_DEFAULTS, ObservationSchema
+from config import OBS_DIM, HORIZON, CVAR_ALPHA, CVAR_VIOL_WEIGHT
+from dynamics import update_battery_soc, update_ev_soc_batch, process_grid_action_batch, process_battery_action_batch
+from reward import compute_reward_batch, REWARD_DTYPE, REWARD_COMPONENTS
+from scenarios import EventOverlay, apply_overlay, EVENT_PARAM_KEYS
+from monitor import cvar, RewardTracker
+from env import STEP_PHASES
+
+# MicrogridEnv methods whose result depends on the env: env_method calls their _<name>(i, ...)
+PER_ENV_METHODS = ('reward_summary',)
+
+
+class MicrogridVecEnv(VecEnv):
+    """
+    Steps N microgrid scenarios in lockstep inside a single process.
+
+    Each scenario is compiled into the same (T, N_PARAMS) table as MicrogridEnv and
+    stacked into an (N, T_max, N_PARAMS) array, so action processing, SOC updates and
+    the reward terms run as one NumPy operation over all envs. Every env follows
+    MicrogridEnv.step exactly and is reset on its own when its episode ends
+    (SB3 auto-reset: the last observation is returned in info["terminal_observation"]).
+    """
+
+    def __init__(self, scenarios, horizon=HORIZON, randomize_events=None, info_keys=REWARD_COMPONENTS,
+                 obs_schema=None, time_phases=False, track_rewards=True, seed=None):
+        """
+        Args:
+            scenarios: list of parameter dicts (one per env), as passed to MicrogridEnv
+            horizon: episode length used when a scenario has no 'load' series
+            randomize_events: optional event specification (see scenarios.DEFAULT_EVENTS);
+                every env draws a fresh set of events on each of its resets, as MicrogridEnv does
+            info_keys: breakdown components copied into each env's info dict (as in MicrogridEnv);
+                the whole (N,) breakdown of the last step is always in self.breakdown
+            obs_schema: state_action.ObservationSchema, or "compact" to drop the parameters
+                that are constant over all scenarios (as in MicrogridEnv). Default: full layout.
+            time_phases: accumulate per-phase step timings from the start (see set_phase_timing)
+            track_rewards: keep per-env reward statistics (a RewardTracker per env, fed one whole
+                episode at a time), readable with env_method("reward_summary")
+            seed: seed of the per-env event generators, spawned from one SeedSequence so that
+                the envs draw independent events (None: fresh entropy); seed() reseeds them
+        """
+        n_envs = len(scenarios)
+        self.render_mode = None
+
+        self.T = np.array([len(p.get("load", [horizon])) for p in scenarios], dtype=np.int64)
+        T_max = int(self.T.max())
+
+        # Stack the per-scenario tables; rows past an env's own horizon are never read.
+        # Dynamics and reward read the float64 tables; only the observation copies are float32.
+        self._param_table = np.zeros((n_envs, T_max, N_PARAMS), dtype=np.float64)
+        obs_tables = None
+        for i, params in enumerate(scenarios):
+            table, complete = build_param_table(params, T_max, PARAM_DEFAULTS, dtype=np.float64)
+            self._param_table[i] = table
+            if not complete and obs_tables is None:
+                obs_tables = self._param_table.astype(np.float32)
+            if obs_tables is not None:
+                obs_tables[i] = build_param_table(params, T_max)[0]
+        self._obs_param_table = self._param_table.astype(np.float32) if obs_tables is None else obs_tables
+
+        if isinstance(obs_schema, str):
+            if obs_schema != "compact":
+                raise ValueError(f"Unknown obs_schema {obs_schema!r}")
+            obs_schema = ObservationSchema.compact(
+                [self._obs_param_table[i, :self.T[i]] for i in range(n_envs)],
+                keep=EVENT_PARAM_KEYS if randomize_events else ()
+            )
+        self.obs_schema = obs_schema or ObservationSchema()
+        super().__init__(n_envs, get_observation_space(self.obs_schema), get_action_space())
+
+        self._env_idx = np.arange(n_envs)
+        self._obs = np.zeros((n_envs, OBS_DIM), dtype=np.float32)
+        # Reward breakdown of the last step, rewritten in place every step
+        self.breakdown = np.zeros(n_envs, dtype=REWARD_DTYPE)
+        self.info_keys = list(info_keys)
+        # Per-step sum of normalized violations, for the CVaR term at episode end
+        self._violations = np.zeros((n_envs, T_max), dtype=np.float64)
+        # Per-step breakdown of the running episodes, folded into the env's tracker when it ends
+        self.reward_trackers = [RewardTracker(capacity=1) for _ in range(n_envs)] if track_rewards else None
+        self._episode_breakdown = np.zeros((n_envs, T_max, len(REWARD_COMPONENTS))) if track_rewards else None
+
+        # Per-episode event overlays, one row of the batched flag / load-scale arrays per env
+        self.randomize_events = randomize_events
+        self._event_flags = np.zeros((n_envs, T_max), dtype=np.int8)
+        self._event_load_scale = np.ones((n_envs, T_max))
+        self._overlays = [
+            EventOverlay(self.T[i], randomize_events, self._event_flags[i, :self.T[i]], self._event_load_scale[i, :self.T[i]])
+            for i in range(n_envs)
+        ]
+        self._rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(n_envs)]
+
+        self.t = np.zeros(n_envs, dtype=np.int64)
+        self.soc_es = np.zeros(n_envs)
+        self.soc_ev = np.zeros(n_envs)
+        self.prev_u_chp = np.zeros(n_envs)
+        self.prev_u_dg = np.zeros(n_envs)
+        self.prev_u_es = np.zeros(n_envs)
+        self.prev_u_maingrid = np.zeros(n_envs)
+        # p_import, p_export, p_wt, p_pv, p_chp, p_dg, p_ch_es, p_dis_es, p_ch_ev
+        self.prev_powers = np.zeros((n_envs, 9))
+        self.prev_H_chp = np.zeros(n_envs)
+        self.prev_soc_es = np.zeros(n_envs)
+        self.prev_soc_ev = np.zeros(n_envs)
+        self._actions = None
+
+        # Per-phase timers of the batched step (as MicrogridEnv); off unless enabled
+        self._clock = None
+        self._phase_ns = [0] * len(STEP_PHASES)
+        self._phase_calls = [0] * len(STEP_PHASES)
+        self.set_phase_timing(time_phases)
+
+    def _reset_envs(self, idx):
+        """Reset the state of the envs in `idx` (index array or boolean mask)"""
+        self.t[idx] = 0
+        self.soc_es[idx] = self._param_table[idx, 0, PARAM_INDEX["Ees_min"]]
+        self.soc_ev[idx] = 0.0
+        self.prev_u_chp[idx] = 0
+        self.prev_u_dg[idx] = 0
+        self.prev_u_es[idx] = 0
+        self.prev_u_maingrid[idx] = 0
+        self.prev_powers[idx] = 0
+        self.prev_H_chp[idx] = 0
+        self.prev_soc_es[idx] = self.soc_es[idx]
+        self.prev_soc_ev[idx] = self.soc_ev[idx]
+        if self.randomize_events:
+            for i in self._env_idx[idx]:
+                self._overlays[i].sample(self._rngs[i])
+
+    def _get_obs(self):
+        """Build the (N, OBS_DIM) observation batch in the MicrogridEnv layout"""
+        obs = self._obs
+        t = np.minimum(self.t, self._param_table.shape[1] - 1)
+        obs[:, :N_PARAMS] = self._obs_param_table[self._env_idx, t]
+        if self.randomize_events:
+            apply_overlay(obs[:, :N_PARAMS], self._event_flags[self._env_idx, t], self._event_load_scale[self._env_idx, t])
+        # Parameters read as 0 once an env is past its horizon
+        obs[self.t >= self.T, :N_PARAMS] = 0.0
+
+        idx = N_PARAMS
+        obs[:, idx:idx+9] = self.prev_powers
+        idx += 9
+        obs[:, idx] = self.prev_H_chp
+        idx += 1
+        obs[:, idx] = self.prev_soc_es
+        obs[:, idx+1] = self.prev_soc_ev
+        idx += 2
+        obs[:, idx] = self.prev_u_chp
+        obs[:, idx+1] = self.prev_u_dg
+        obs[:, idx+2] = self.prev_u_es
+        obs[:, idx+3] = self.prev_u_maingrid
+        return obs
+
+    def _observe(self, obs):
+        """Fresh array of the schema's features from full-layout observations"""
+        return obs.copy() if self.obs_schema.is_full else self.obs_schema.select(obs)
+
+    def reset(self):
+        for i, seed in enumerate(self._seeds):
+            if seed is not None:
+                self._rngs[i] = np.random.default_rng(seed)
+        if self.reward_trackers is not None:
+            # Episodes cut short by an explicit reset are folded in as they are (as MicrogridEnv does)
+            for i in np.flatnonzero(self.t):
+                self.reward_trackers[i].log_episode(self._episode_breakdown[i, :self.t[i]])
+        self._reset_envs(self._env_idx)
+        self._reset_seeds()
+        self._reset_options()
+        return self._observe(self._get_obs())
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, -1)
+
+    def step_wait(self):
+        action = self._actions
+        t = self.t
+        clock = self._clock  # None unless phase timing is enabled
+        if clock is not None:
+            t0 = clock()
+
+        # === STEP 1: Extract Parameters ===
+        row = self._param_table[self._env_idx, t]  # fancy indexing: a copy the overlay may modify
+        if self.randomize_events:
+            apply_overlay(row, self._event_flags[self._env_idx, t], self._event_load_scale[self._env_idx, t])
+        row = row.T
+        (current_load,
+         price_import, price_export, price_ev,
+         rho_gas, Cop_ma_wt, Cop_ma_pv, rho_fuel, C_startup, C_degrad_es,
+         eta_chp, eta_dg, eta_ch_es, eta_dis_es, eta_ch_ev, alpha_chp,
+         H_demand,
+         p_import_max, p_export_max, p_wt_max, p_pv_max, p_chp_max, p_dg_max, p_dis_es_max, p_ch_es_max,
+         p_ev_max,
+         ees_min, ees_max,
+         Eev_required,
+         ev_availability, session_start, leave_possible) = row
+        if clock is not None:
+            t0 = self._lap(0, t0)
+
+        # === STEP 2: Process Actions ===
+        p_import, p_export, u_maingrid = process_grid_action_batch(action[:, 0], p_import_max, p_export_max)
+        p_ch_es, p_dis_es, u_es = process_battery_action_batch(action[:, 1], p_ch_es_max, p_dis_es_max)
+        p_wt = action[:, 2] * p_wt_max
+        p_chp = action[:, 3] * p_chp_max
+        p_dg = action[:, 4] * p_dg_max
+        p_ch_ev = action[:, 5] * p_ev_max * ev_availability
+        p_pv = action[:, 6] * p_pv_max
+
+        # === STEP 3: Compute Decision Variables ===
+        H_chp = alpha_chp * p_chp
+        u_chp = (p_chp > 0).astype(np.float64)
+        u_dg = (p_dg > 0).astype(np.float64)
+
+        # === STEP 4: Update Energy States ===
+        new_soc_es = update_battery_soc(self.soc_es, p_ch_es, p_dis_es, eta_ch_es, eta_dis_es)
+        new_soc_es = np.maximum(ees_min, np.minimum(new_soc_es, ees_max))
+        new_soc_ev = update_ev_soc_batch(self.soc_ev, p_ch_ev, eta_ch_ev, session_start == 1)
+        new_soc_ev = np.clip(new_soc_ev, 0.2 * 70, 70)
+
+        # === STEP 5: Store Current State for Next Timestep ===
+        # Same ordering as MicrogridEnv.step, so the reward sees the updated previous states
+        self.prev_powers[:] = np.stack(
+            [p_import, p_export, p_wt, p_pv, p_chp, p_dg, p_ch_es, p_dis_es, p_ch_ev], axis=1
+        )
+        self.prev_H_chp[:] = H_chp
+        self.prev_soc_es[:] = self.soc_es
+        self.prev_soc_ev[:] = self.soc_ev
+        self.prev_u_chp[:] = u_chp
+        self.prev_u_dg[:] = u_dg
+        self.prev_u_es[:] = u_es
+        self.prev_u_maingrid[:] = u_maingrid
+        self.soc_es[:] = new_soc_es
+        self.soc_ev[:] = new_soc_ev
+        if clock is not None:
+            t0 = self._lap(1, t0)
+
+        # === STEP 6: Compute Reward ===
+        reward, breakdown = compute_reward_batch(
+            p_import=p_import, p_export=p_export, p_wt=p_wt, p_pv=p_pv,
+            p_chp=p_chp, p_dg=p_dg, p_dis_es=p_dis_es, p_ch_es=p_ch_es, p_ch_ev=p_ch_ev,
+            price_import=price_import, price_export=price_export, price_ev=price_ev,
+            Cop_ma_wt=Cop_ma_wt, Cop_ma_pv=Cop_ma_pv,
+            rho_gas=rho_gas, rho_fuel=rho_fuel,
+            C_startup=C_startup, C_degrad_es=C_degrad_es,
+            eta_chp=eta_chp, eta_dg=eta_dg,
+            u_chp=u_chp, u_dg=u_dg,
+            prev_u_chp=self.prev_u_chp, prev_u_dg=self.prev_u_dg,
+            load=current_load, H_demand=H_demand, H_chp=H_chp,
+            soc_es=self.soc_es, soc_ev=self.soc_ev,
+            ees_min=ees_min, ees_max=ees_max,
+            leave_possible=leave_possible, Eev_required=Eev_required,
+            detail="full", out=self.breakdown
+        )
+        if clock is not None:
+            t0 = self._lap(2, t0)
+        self._violations[self._env_idx, t] = (
+            breakdown['penalty_load'] + breakdown['penalty_heat']
+            + breakdown['penalty_batt'] + breakdown['penalty_ev']
+        )
+        if self.reward_trackers is not None:
+            self._episode_breakdown[self._env_idx, t] = breakdown.view((np.float64, len(REWARD_COMPONENTS)))
+
+        # === STEP 7: Update Time and Check Termination ===
+        self.t += 1
+        dones = self.t >= self.T
+        if self.info_keys:
+            keys = self.info_keys
+            infos = [dict(zip(keys, values)) for values in breakdown[keys].tolist()]
+        else:
+            infos = [{} for _ in range(self.num_envs)]
+        if clock is not None:
+            t0 = self._lap(3, t0)
+
+        obs = self._get_obs()
+        if dones.any():
+            if clock is not None:
+                t0 = self._lap(5, t0, count=False)
+            for i in np.flatnonzero(dones):
+                cvar_vio = self._compute_cvar(i, alpha=CVAR_ALPHA)
+                reward[i] -= CVAR_VIOL_WEIGHT * cvar_vio
+                infos[i]["cvar_vio"] = cvar_vio
+                infos[i]["TimeLimit.truncated"] = False
+                infos[i]["terminal_observation"] = self._observe(obs[i])
+                if self.reward_trackers is not None:
+                    self.reward_trackers[i].log_episode(self._episode_breakdown[i, :self.T[i]])
+            if clock is not None:
+                t0 = self._lap(4, t0)
+            # Auto-reset and the fresh observations are charged to 'obs'
+            self._reset_envs(dones)
+            obs = self._get_obs()
+
+        obs = self._observe(obs)
+        if clock is not None:
+            self._lap(5, t0)
+        return obs, reward.astype(np.float32), dones, infos
+
+    def _compute_cvar(self, i, alpha=0.05):
+        """CVaR of the summed normalized violations over env i's finished episode"""
+        return cvar(self._violations[i, :self.T[i]], alpha)
+
+    def _lap(self, phase, t0, count=True):
+        """Charge the time since t0 to `phase` (index into STEP_PHASES) and return the current time"""
+        t1 = self._clock()
+        self._phase_ns[phase] += t1 - t0
+        self._phase_calls[phase] += count
+        return t1
+
+    def set_phase_timing(self, enabled=True):
+        """Turn the per-phase step timers on or off (they time the batched step of all envs)"""
+        self._clock = time.perf_counter_ns if enabled else None
+
+    def get_phase_timings(self, reset=False):
+        """
+        Accumulated timings of the batched step per phase, as MicrogridEnv.get_phase_timings.
+
+        The timers cover all envs at once: env_method("get_phase_timings") reports them under
+        the first index only (zeros for the others), so summing over the envs gives the totals,
+        as it does for a vector of MicrogridEnv workers.
+        """
+        timings = {phase: {'ns': ns, 'calls': calls}
+                   for phase, ns, calls in zip(STEP_PHASES, self._phase_ns, self._phase_calls)}
+        if reset:
+            self._phase_ns = [0] * len(STEP_PHASES)
+            self._phase_calls = [0] * len(STEP_PHASES)
+        return timings
+
+    def reward_summary(self, series=False):
+        """Reward statistics of the finished episodes (see RewardTracker.summary), one summary per env"""
+        return [self._reward_summary(i, series) for i in range(self.num_envs)]
+
+    def _reward_summary(self, i, series=False):
+        if self.reward_trackers is None:
+            raise ValueError("reward tracking is disabled (track_rewards=False)")
+        return self.reward_trackers[i].summary(series)
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        """
+        Attributes live on the vector env. Per-env state arrays (leading dim N) are
+        indexed per env; anything else is shared and returned once per index.
+        """
+        value = getattr(self, attr_name)
+        if isinstance(value, np.ndarray) and value.shape[:1] == (self.num_envs,):
+            return [value[i] for i in self._get_indices(indices)]
+        return [value for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        current = getattr(self, attr_name, None)
+        if isinstance(current, np.ndarray) and current.shape[:1] == (self.num_envs,):
+            for i in self._get_indices(indices):
+                current[i] = value
+        else:
+            setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """
+        Call a MicrogridEnv method once per index. Methods reading per-env state have a
+        `_<name>(i, ...)` counterpart that receives the env index; the others act on the
+        whole vector env (see get_phase_timings for how the shared timers are reported).
+        """
+        indices = list(self._get_indices(indices))
+        if method_name in PER_ENV_METHODS:
+            per_env = getattr(self, f"_{method_name}")
+            return [per_env(i, *method_args, **method_kwargs) for i in indices]
+        if method_name == "get_phase_timings":
+            timings = self.get_phase_timings(*method_args, **method_kwargs)
+            zeros = {phase: {'ns': 0, 'calls': 0} for phase in STEP_PHASES}
+            return [timings if k == 0 else zeros for k in range(len(indices))]
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in indices]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -5,6 +5,26 @@ TIME_STEPS = list(range(1, HOURS_NUMBER))  #to modify depending on data
 
 DATA_DIR = "data/parameters/48"
 
+# Rolling horizon (rolling_horizon.py): hours per window and hours committed before moving on
+ROLLING_WINDOW = 48
+ROLLING_COMMIT = 24
+
+# Temporal decomposition (decomposition.py): hours per block, relative gap at which to stop, iteration cap
+DECOMPOSITION_BLOCK = 168
+DECOMPOSITION_TOL = 1e-3
+DECOMPOSITION_MAX_ITER = 30
+
+# MILP oracle (oracle.py): RL scenario cache it reads (see src/model/scenarios.py), result directory,
+# solver time limit per scenario (s), extra wall-clock seconds before a job is killed, relative MIP gap
+SCENARIO_CACHE_DIR = '../output/scenarios/cache'
+ORACLE_DIR = '../output/oracle'
+ORACLE_TIME_LIMIT = 600
+ORACLE_GRACE = 120
+ORACLE_MIP_GAP = 1e-4
+# Value of lost load of the oracle's shortfall slack, as a multiple of the dearest kWh of power
+# (see oracle.shortfall_costs)
+ORACLE_VOLL_FACTOR = 10
+
 
 # Each CSV has one column with header matching the key
 PARAM_FILES = {
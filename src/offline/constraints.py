@@ -1,43 +1,44 @@
-from pyomo.environ import Constraint
+from pyomo.environ import Constraint, value
+from model import param_at
 
 def add_constraints(m):
     
 
     # Grid Import
     m.grid_import_lower = Constraint(m.T, rule=lambda m, t: m.p_import[t] >= 0)
-    m.grid_import_upper = Constraint(m.T, rule=lambda m, t: m.p_import[t] <= m.u_maingrid[t] * m.P_grid_import_max[t])
+    m.grid_import_upper = Constraint(m.T, rule=lambda m, t: m.p_import[t] <= m.u_maingrid[t] * param_at(m.P_grid_import_max, t))
     
     # Grid Export
     m.grid_export_lower = Constraint(m.T, rule=lambda m, t: m.p_export[t] >= 0)
-    m.grid_export_upper = Constraint(m.T, rule=lambda m, t: m.p_export[t] <= (1-m.u_maingrid[t]) * m.P_grid_export_max[t])
+    m.grid_export_upper = Constraint(m.T, rule=lambda m, t: m.p_export[t] <= (1-m.u_maingrid[t]) * param_at(m.P_grid_export_max, t))
     
     # # Wind Turbine
     m.wt_lower = Constraint(m.T, rule=lambda m, t: m.p_wt[t] >= 0)
-    m.wt_upper = Constraint(m.T, rule=lambda m, t: m.p_wt[t] <= m.PWT_max[t])
+    m.wt_upper = Constraint(m.T, rule=lambda m, t: m.p_wt[t] <= param_at(m.PWT_max, t))
     
     # # PV
     m.pv_lower = Constraint(m.T, rule=lambda m, t: m.p_pv[t] >= 0)
-    m.pv_upper = Constraint(m.T, rule=lambda m, t: m.p_pv[t] <= m.PPV_max[t])
+    m.pv_upper = Constraint(m.T, rule=lambda m, t: m.p_pv[t] <= param_at(m.PPV_max, t))
     
     # CHP with binaries
     m.chp_lower = Constraint(m.T, rule=lambda m, t: m.p_chp[t] >= 0)
-    m.chp_upper = Constraint(m.T, rule=lambda m, t: m.p_chp[t] <= m.PCHP_max[t] * m.u_chp[t])
+    m.chp_upper = Constraint(m.T, rule=lambda m, t: m.p_chp[t] <= param_at(m.PCHP_max, t) * m.u_chp[t])
     
     # # DG with binaries
     m.dg_lower = Constraint(m.T, rule=lambda m, t: m.p_dg[t] >= 0)
-    m.dg_upper = Constraint(m.T, rule=lambda m, t: m.p_dg[t] <= m.PDG_max[t] * m.u_dg[t])
+    m.dg_upper = Constraint(m.T, rule=lambda m, t: m.p_dg[t] <= param_at(m.PDG_max, t) * m.u_dg[t])
     
     # # Storage charge
     m.ch_es_lower = Constraint(m.T, rule=lambda m, t: m.p_ch_es[t] >= 0)
-    m.ch_es_upper = Constraint(m.T, rule=lambda m, t: m.p_ch_es[t] <= m.Pch_es_max[t] * m.u_ch_es[t])
+    m.ch_es_upper = Constraint(m.T, rule=lambda m, t: m.p_ch_es[t] <= param_at(m.Pch_es_max, t) * m.u_ch_es[t])
     
     # # Storage discharge
     m.dis_es_lower = Constraint(m.T, rule=lambda m, t: m.p_dis_es[t] >= 0)
-    m.dis_es_upper = Constraint(m.T, rule=lambda m, t: m.p_dis_es[t] <= m.Pdis_es_max[t] * m.u_dis_es[t])
+    m.dis_es_upper = Constraint(m.T, rule=lambda m, t: m.p_dis_es[t] <= param_at(m.Pdis_es_max, t) * m.u_dis_es[t])
     
     # EV charging limit
     m.ev_charge_lower = Constraint(m.T, rule=lambda m, t: m.p_ch_ev[t] >= 0)
-    m.ev_charge_upper = Constraint(m.T, rule=lambda m, t: m.p_ch_ev[t] <= m.PEV_max[t] * m.A[t])
+    m.ev_charge_upper = Constraint(m.T, rule=lambda m, t: m.p_ch_ev[t] <= param_at(m.PEV_max, t) * param_at(m.A, t))
     
     # Mutually exclusive storage modes
     m.no_charge_discharge = Constraint(m.T, rule=lambda m, t: m.u_ch_es[t] + m.u_dis_es[t] <= 1)
@@ -58,23 +59,23 @@ def add_constraints(m):
 
 
     # Heat production constraints
-    m.heat_balance = Constraint(m.T, rule=lambda m, t: m.H_chp[t] == m.alpha_chp[t] * m.p_chp[t])
-    m.heat_demand  = Constraint(m.T, rule=lambda m, t: m.H_demand[t] <= m.H_chp[t])
+    m.heat_balance = Constraint(m.T, rule=lambda m, t: m.H_chp[t] == param_at(m.alpha_chp, t) * m.p_chp[t])
+    m.heat_demand  = Constraint(m.T, rule=lambda m, t: param_at(m.H_demand, t) <= m.H_chp[t])
 
     #SOC dynamics for battery
     def soc_batt(m, t):
-        prev = m.Ees_min[t] if t == m.T.first() else m.ees[m.T.prev(t)]
-        return m.ees[t] == prev + m.eta_ch_es[t] * m.p_ch_es[t] - m.p_dis_es[t] / m.eta_dis_es[t]
+        prev = param_at(m.Ees_min, t) if t == m.T.first() else m.ees[m.T.prev(t)]
+        return m.ees[t] == prev + param_at(m.eta_ch_es, t) * m.p_ch_es[t] - m.p_dis_es[t] / param_at(m.eta_dis_es, t)
     m.soc_batt = Constraint(m.T, rule=soc_batt)
-    m.soc_min  = Constraint(m.T, rule=lambda m, t: m.ees[t] >= m.Ees_min[t])
-    m.soc_max  = Constraint(m.T, rule=lambda m, t: m.ees[t] <= m.Ees_max[t])
+    m.soc_min  = Constraint(m.T, rule=lambda m, t: m.ees[t] >= param_at(m.Ees_min, t))
+    m.soc_max  = Constraint(m.T, rule=lambda m, t: m.ees[t] <= param_at(m.Ees_max, t))
 
     #SOC dynamics for EV + Ensure EV energy is 0 at session start
     def soc_ev(m, t):
         if t == m.T.first():
             return m.eev[t] == 0  # or any appropriate init value
         prev = m.T.prev(t)
-        return m.eev[t] == (0 if m.session_start[t] == 1 else m.eev[prev]) + m.eta_ch_ev[t] * m.p_ch_ev[t]
+        return m.eev[t] == (0 if value(param_at(m.session_start, t)) == 1 else m.eev[prev]) + param_at(m.eta_ch_ev, t) * m.p_ch_ev[t]
     m.soc_ev = Constraint(m.T, rule=soc_ev)
 
 # Ensure EV energy is within bounds
@@ -93,14 +94,14 @@ def add_constraints(m):
 
     #Ensure EV energy ≥ required at session end (leave)
     def ev_leave_requirement(m, t):
-        if m.leave_possible[t] == 1:
-            return m.eev[t] >= m.Eev_required[t]
+        if value(param_at(m.leave_possible, t)) == 1:
+            return m.eev[t] >= param_at(m.Eev_required, t)
         return Constraint.Skip
     m.ev_leave_requirement = Constraint(m.T, rule=ev_leave_requirement)
 
     # Power balance
     m.power_balance = Constraint(m.T, rule=lambda m, t:
         m.p_import[t]  + m.p_wt[t] + m.p_pv[t] + m.p_chp[t]+ m.p_dg[t] + m.p_dis_es[t] 
-        == m.p_export[t] + m.param_load[t] +  m.p_ch_es[t] + m.p_ch_ev[t])
+        == m.p_export[t] + param_at(m.param_load, t) +  m.p_ch_es[t] + m.p_ch_ev[t])
 
     return m
@@ -1,12 +1,115 @@
 import os
+import json
+import numpy as np
 import pandas as pd
 from config import DATA_DIR, PARAM_FILES, TIME_STEPS
+
+# Parameter store compiled by the RL side (src/model/param_store.py) next to the CSVs.
+# Only its file layout is shared: magic | uint32 header length | JSON header | float64 data,
+# with a (n_dense, T_max) block of dense series followed by a (2, n_runs) block of run
+# starts/values, and constant series in the header. It is read here into owned arrays.
+STORE_FILENAME = "_params.store"
+_STORE_MAGIC = b"MGPSTORE"
+_STORE_VERSION = 2
+
+
+def _csv_fingerprint(path):
+    # (name, size, mtime) of every CSV, as recorded in the store header
+    fingerprint = []
+    for fname in sorted(os.listdir(path)):
+        if fname.endswith(".csv"):
+            st = os.stat(os.path.join(path, fname))
+            fingerprint.append([fname, st.st_size, st.st_mtime_ns])
+    return fingerprint
+
+
+def _read_store(path):
+    # {file stem: array} from the compiled store, or None when it is missing, invalid or stale
+    store_path = os.path.join(path, STORE_FILENAME)
+    try:
+        with open(store_path, "rb") as f:
+            if f.read(len(_STORE_MAGIC)) != _STORE_MAGIC:
+                return None
+            size = int(np.frombuffer(f.read(4), dtype=np.uint32)[0])
+            header = json.loads(f.read(size))
+            if header.get("version") != _STORE_VERSION or header["sources"] != _csv_fingerprint(path):
+                return None
+            n, T = header["dense_shape"]
+            data = np.fromfile(f, dtype=np.dtype(header["dtype"]), count=n * T + 2 * header["runs_count"])
+    except (OSError, ValueError, IndexError, KeyError):
+        return None
+    dense = data[:n * T].reshape(n, T)
+    runs = data[n * T:].reshape(2, -1)
+
+    series = {}
+    for stem, enc in header["params"].items():
+        if enc["kind"] == "constant":
+            series[stem] = np.full(enc["length"], enc["value"])
+        elif enc["kind"] == "runs":
+            starts, values = runs[:, enc["offset"]:enc["offset"] + enc["count"]]
+            series[stem] = np.repeat(values, np.diff(np.append(starts, enc["length"])).astype(np.int64))
+        else:
+            series[stem] = dense[enc["row"], :enc["length"]].copy()
+    return series
+
+
+def _read_csvs(path):
+    # A single-row CSV is a scalar parameter, broadcast to the length of the longest series
+    raw = {fname.replace(".csv", ""): pd.read_csv(os.path.join(path, fname)).iloc[:, 0].to_numpy(dtype=np.float64)
+           for fname in sorted(os.listdir(path)) if fname.endswith(".csv")}
+    T = max((len(v) for v in raw.values()), default=0)
+    return {k: np.full(T, v[0]) if len(v) == 1 else v for k, v in raw.items()}
+
+
+def load_series(path=DATA_DIR):
+    """
+    Every parameter series of a directory as a writable float64 array.
+
+    Reads the store compiled by the RL side when it is up to date with the CSVs,
+    else parses the CSVs.
+
+    Args:
+        path: directory of parameter CSVs
+
+    Returns:
+        dict: {file stem: (length,) array}
+    """
+    series = _read_store(path)
+    return _read_csvs(path) if series is None else series
+
+
 #dict of parameters to load from CSV files
+# (a float for parameters constant over the horizon, else a {t: float} dict; all values are
+# plain Python floats owned by the caller)
 def load_parameters():
+    series = load_series(DATA_DIR)
     params = {}
     for name, fname in PARAM_FILES.items():
-        path = os.path.join(DATA_DIR, fname)
-        df = pd.read_csv(path)
-        series = df.iloc[:, 0].to_dict()
-        params[name] = {t: series.get(t, 0) for t in TIME_STEPS}
-    return params 
\ No newline at end of file
+        values = series[fname.replace(".csv", "")]
+        if len(values) > TIME_STEPS[-1] and np.all(values == values[0]):
+            params[name] = float(values[0])
+        else:
+            params[name] = {t: float(values[t]) if t < len(values) else 0 for t in TIME_STEPS}
+    return params
+
+
+def load_parameter_arrays(series=None, time_steps=TIME_STEPS):
+    """
+    Parameters as one float array per PARAM_FILES key, aligned with `time_steps`
+    (0 past the end of a series, as in load_parameters).
+
+    Args:
+        series: {file stem: array-like series} as returned by load_series (default: DATA_DIR)
+        time_steps: hours of the model horizon
+
+    Returns:
+        dict: {parameter name: (len(time_steps),) array}, new writable arrays
+    """
+    if series is None:
+        series = load_series(DATA_DIR)
+    steps = np.asarray(time_steps)
+    arrays = {}
+    for name, fname in PARAM_FILES.items():
+        values = np.asarray(series[fname.replace(".csv", "")], dtype=np.float64)
+        arrays[name] = np.where(steps < len(values), values[np.minimum(steps, len(values) - 1)], 0.0)
+    return arrays
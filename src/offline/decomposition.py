@@ -0,0 +1,302 @@
+import os
+import copy
+import time
+import contextlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from config import TIME_STEPS, DECOMPOSITION_BLOCK, DECOMPOSITION_TOL, DECOMPOSITION_MAX_ITER
+from data_loader import load_parameter_arrays
+from sparse_model import SparseModel, PersistentHighs, VARIABLES, STATE_VARIABLES, EV_SOC_MAX, make_report
+
+
+def block_bounds(n_hours, block=DECOMPOSITION_BLOCK):
+    """(start, stop) hour indices of consecutive blocks of `block` hours (the last one may be shorter)"""
+    return [(start, min(start + block, n_hours)) for start in range(0, n_hours, block)]
+
+
+# === POOL WORKERS ===
+# Every block is owned by one worker process, which alone builds its model and keeps one HiGHS
+# instance for it, so an iteration only ships boundary states and prices.
+
+_worker = {}
+
+
+def _init_worker(blocks, mip_gap, time_limit, threads):
+    """
+    Args:
+        blocks: {block index: (params, time_steps, (Ees_min, Ees_max) of the hour before it)}
+                for the blocks this worker owns
+    """
+    _worker.update(blocks=blocks, options=(mip_gap, time_limit, threads), models={}, solvers={}, last={})
+
+
+def _block_model(b):
+    """Block model with its initial state as columns (fixed to the start of the horizon for block 0)"""
+    if b not in _worker['models']:
+        params, steps, _ = _worker['blocks'][b]
+        state = None if b == 0 else dict.fromkeys(STATE_VARIABLES, 0.0)
+        _worker['models'][b] = SparseModel(params, steps, state, state_columns=True)
+        _worker['solvers'][b] = PersistentHighs(*_worker['options'])
+    return _worker['models'][b]
+
+
+def _owner_pools(params, steps, bounds, n_workers, mip_gap, time_limit, threads, stack):
+    """
+    One single-process pool per worker, each owning a contiguous run of blocks.
+
+    Returns:
+        run(jobs): solve a list of _solve_block argument tuples, each on the pool that owns its
+                   block, in parallel across pools; results in job order
+    """
+    n_blocks = len(bounds)
+    owner = np.arange(n_blocks) * n_workers // n_blocks
+    pools = []
+    for w in range(n_workers):
+        owned = {}
+        for b in np.flatnonzero(owner == w).tolist():
+            start, stop = bounds[b]
+            ees_prev = (params['Ees_min'][start - 1], params['Ees_max'][start - 1]) if start > 0 else None
+            owned[b] = ({name: a[start:stop].copy() for name, a in params.items()}, steps[start:stop], ees_prev)
+        pools.append(stack.enter_context(ProcessPoolExecutor(1, initializer=_init_worker,
+                                                             initargs=(owned, mip_gap, time_limit, threads))))
+
+    def run(jobs):
+        futures = [pools[owner[job[0]]].submit(_solve_block, *job) for job in jobs]
+        return [f.result() for f in futures]
+    return run
+
+
+def _solve_block(b, state_in, state_out, price_in, price_out):
+    """
+    Solve one block.
+
+    Args:
+        b: block index
+        state_in: state before the block (None: free within its bounds; block 0 is always fixed)
+        state_out: state the block must end in (None: free)
+        price_in, price_out: multipliers added to the initial and subtracted from the final
+                             state in the objective (None: not priced)
+
+    Returns:
+        dict: 'x', 'cost' (unpriced), 'bound' (priced objective bound), 'status', 'solve_time',
+              'in' and 'out' (initial and final state, in STATE_VARIABLES order)
+    """
+    base = _block_model(b)
+    model = copy.copy(base)
+    model.c, model.col_lower, model.col_upper = base.c.copy(), base.col_lower.copy(), base.col_upper.copy()
+    in_cols = np.array([base.state_col(name) for name in STATE_VARIABLES])
+    out_cols = np.array([base.col(name)[-1] for name in STATE_VARIABLES])
+
+    if b > 0:
+        if state_in is None:
+            ees_min, ees_max = _worker['blocks'][b][2]
+            model.col_lower[in_cols] = [ees_min, 0, 0, 0]
+            model.col_upper[in_cols] = [ees_max, EV_SOC_MAX, 1, 1]
+        else:
+            model.col_lower[in_cols] = model.col_upper[in_cols] = state_in
+    if state_out is not None:
+        model.col_lower[out_cols] = model.col_upper[out_cols] = state_out
+    if price_in is not None:
+        model.c[in_cols] += price_in
+    if price_out is not None:
+        model.c[out_cols] -= price_out
+
+    # Warm start from the block's previous solve of the same kind (Lagrangian or exchange)
+    solver, key = _worker['solvers'][b], (b, state_in is None)
+    solver.update(model)
+    result = solver.solve(_worker['last'].get(key))
+    x = result['x']
+    if x is not None:
+        _worker['last'][key] = x
+    return {
+        'x': x,
+        'cost': float(base.c @ x) if x is not None else np.nan,
+        'bound': result['bound'],
+        'status': result['status'],
+        'solve_time': result['solve_time'],
+        'in': x[in_cols] if x is not None else None,
+        'out': x[out_cols] if x is not None else None,
+    }
+
+
+# === COORDINATION ===
+
+def _lp_start(params, steps, bounds):
+    """
+    LP relaxation of the full problem: its objective is a lower bound, and the duals of the
+    rows linking the last hour of a block to the next one are the Lagrange multipliers of the
+    relaxed linking constraints (multiplier = row dual times the coefficient of the previous hour).
+
+    Returns:
+        (LP objective, (B - 1, S) multipliers, (B - 1, S) LP states at the block boundaries)
+    """
+    model = SparseModel(params, steps)
+    model.integrality = np.zeros_like(model.integrality)
+    solver = PersistentHighs().load(model)
+    result = solver.solve()
+    if result['x'] is None:
+        raise RuntimeError(f"LP relaxation: no solution ({result['status']})")
+    duals = np.array(solver.h.getSolution().row_dual)
+    starts = np.array([start for start, _ in bounds[1:]], dtype=np.int64)
+    carry = np.where(params['session_start'][starts] == 1, 0.0, -1.0)
+    prices = np.column_stack([
+        -duals[model.row('soc_batt')[starts]],
+        carry * duals[model.row('soc_ev')[starts]],
+        duals[model.row('chp_startup')[starts]],
+        duals[model.row('dg_startup')[starts]],
+    ])
+    states = np.column_stack([result['x'][model.col(name)[starts - 1]] for name in STATE_VARIABLES])
+    return result['objective'], prices.reshape(-1, len(STATE_VARIABLES)), states.reshape(-1, len(STATE_VARIABLES))
+
+
+def solve_decomposed(params=None, time_steps=TIME_STEPS, block=DECOMPOSITION_BLOCK, n_workers=None,
+                     tol=DECOMPOSITION_TOL, max_iter=DECOMPOSITION_MAX_ITER, mip_gap=1e-4, time_limit=None,
+                     threads=1, step_scale=1.0, lp_start=True, verbose=True):
+    """
+    Temporal decomposition of the dispatch MILP: the horizon is split into blocks solved in
+    parallel, coupled through the state at block boundaries (battery SOC `ees`, EV SOC `eev`,
+    CHP/DG on states).
+
+    Each iteration runs two parallel passes:
+      - Lagrangian pass: every block chooses its own initial state, and the mismatch with the
+        previous block's final state is priced by multipliers. The sum of the block bounds is a
+        lower bound of the full problem; the multipliers then take a subgradient (Polyak) step.
+      - Boundary exchange pass: every boundary is fixed to the final state the block before it
+        reached in the Lagrangian pass, to the initial state the block after it chose, or halfway
+        between the two, and the blocks are solved again; each complete set is a feasible
+        schedule (an upper bound).
+    It stops when the gap between the best upper and lower bounds is within `tol`. The
+    multipliers start from the duals of the LP relaxation, whose objective is also the first
+    lower bound and whose boundary states are the first exchange candidate. When the bound
+    stalls for two iterations, the step restarts from the best multipliers at half the size.
+
+    It costs many more block solves than solve_rolling_horizon and only beats it on wall time
+    with enough cores; what it adds is the lower bound (hence the gap) and usually a cheaper
+    schedule. `python decomposition.py --data <dir> --hours <n>` times the two on the same data.
+
+    Args:
+        params: {parameter name: (H,) array} over time_steps (default: load_parameter_arrays)
+        time_steps: hours of the full horizon
+        block: hours per block
+        n_workers: worker processes, each owning a contiguous run of blocks (None: one per core)
+        tol: relative gap at which to stop
+        max_iter: iteration cap
+        mip_gap: relative MIP gap of the block solves (it loosens the lower bound accordingly)
+        time_limit: time limit per block solve in seconds (None: no limit)
+        threads: HiGHS threads per block solve
+        step_scale: initial scale of the Polyak step (0 < step_scale <= 2)
+        lp_start: start from the LP relaxation (else from zero multipliers)
+        verbose: print one line per iteration
+
+    Returns:
+        report: best schedule found, in the format of solver.solve_model
+        info: dict with 'upper_bound', 'lower_bound', 'gap', 'iterations', 'blocks', 'wall_time'
+              and 'history' (one dict per iteration: bounds, gap, max boundary mismatch, time)
+    """
+    steps = np.asarray(time_steps)
+    if params is None:
+        params = load_parameter_arrays(time_steps=time_steps)
+    bounds = block_bounds(len(steps), block)
+    n_blocks = len(bounds)
+    blocks = range(n_blocks)
+    prices = np.zeros((n_blocks - 1, len(STATE_VARIABLES)))
+    binary = np.array([name.startswith('u_') for name in STATE_VARIABLES])
+    candidates = []  # boundary states to try in the next exchange pass
+    best_upper, best_lower, best, history = np.inf, -np.inf, None, []
+    start_time = time.perf_counter()
+    if lp_start and n_blocks > 1:
+        best_lower, prices, lp_states = _lp_start(params, steps, bounds)
+        candidates.append(lp_states)
+        if verbose:
+            print(f"LP relaxation: lower {best_lower:.4f}, {time.perf_counter() - start_time:.2f}s")
+    best_dual, stalled = -np.inf, 0
+
+    n_workers = min(n_workers or os.cpu_count() or 1, n_blocks)
+    with contextlib.ExitStack() as stack:
+        run = _owner_pools(params, steps, bounds, n_workers, mip_gap, time_limit, threads, stack)
+        for k in range(max_iter):
+            t0 = time.perf_counter()
+            price_in = [prices[b - 1] if b > 0 else None for b in blocks]
+            price_out = [prices[b] if b < n_blocks - 1 else None for b in blocks]
+            relaxed = run([(b, None, None, price_in[b], price_out[b]) for b in blocks])
+            for b, r in enumerate(relaxed):
+                if r['x'] is None:
+                    raise RuntimeError(f"Block {b}: no feasible solution ({r['status']})")
+            lower = sum(r['bound'] for r in relaxed)
+            best_lower = max(best_lower, lower)
+            mismatch = np.array([relaxed[b + 1]['in'] - relaxed[b]['out'] for b in range(n_blocks - 1)]).reshape(-1, len(STATE_VARIABLES))
+            if lower > best_dual:
+                best_dual, best_prices, best_mismatch, stalled = lower, prices.copy(), mismatch, 0
+            else:
+                stalled += 1
+
+            # Boundary exchange: each candidate fixes every boundary, all blocks of all candidates in one pass
+            candidates += [np.array([r['out'] for r in relaxed[:-1]]), np.array([r['in'] for r in relaxed[1:]])]
+            candidates.append((candidates[-2] + candidates[-1]) / 2)
+            candidates = [np.where(binary, np.round(z), z).reshape(-1, len(STATE_VARIABLES)) for z in candidates]
+            jobs = [(z, b) for z in candidates for b in blocks]
+            primal = run([(b, z[b - 1] if b > 0 else None, z[b] if b < n_blocks - 1 else None, None, None)
+                          for z, b in jobs])
+            for c in range(len(candidates)):
+                results = primal[c * n_blocks:(c + 1) * n_blocks]
+                if all(r['x'] is not None for r in results) and sum(r['cost'] for r in results) < best_upper:
+                    best_upper, best = sum(r['cost'] for r in results), [r['x'] for r in results]
+            candidates = []
+
+            gap = (best_upper - best_lower) / max(abs(best_upper), 1e-9) if np.isfinite(best_upper) else np.inf
+            history.append({'iteration': k, 'lower_bound': lower, 'upper_bound': best_upper, 'gap': gap,
+                            'mismatch': float(np.abs(mismatch).max(initial=0.0)), 'time': time.perf_counter() - t0})
+            if verbose:
+                h = history[-1]
+                print(f"Iteration {k}: lower {lower:.4f}, upper {best_upper:.4f}, gap {gap:.3%}, "
+                      f"max boundary mismatch {h['mismatch']:.4f}, {h['time']:.2f}s")
+            if gap <= tol or not mismatch.any():
+                break
+
+            # Subgradient step towards the best known upper bound, restarted from the best
+            # multipliers with half the step when the Lagrangian bound stalls
+            if stalled >= 2:
+                step_scale, stalled = step_scale / 2, 0
+                prices, mismatch, lower = best_prices.copy(), best_mismatch, best_dual
+            target = best_upper if np.isfinite(best_upper) else lower + 0.05 * abs(lower) + 1.0
+            prices = prices + step_scale * max(target - lower, 0.0) / float((mismatch ** 2).sum()) * mismatch
+
+    if best is None:
+        raise RuntimeError("No feasible schedule found: the boundary exchange failed at every iteration")
+    # Variable k of a block of T hours is in columns k * T to (k + 1) * T (see SparseModel)
+    values = {name: np.concatenate([x[k * (stop - start):(k + 1) * (stop - start)] for x, (start, stop) in zip(best, bounds)])
+              for k, (name, _) in enumerate(VARIABLES)}
+    info = {'upper_bound': best_upper, 'lower_bound': best_lower, 'gap': history[-1]['gap'],
+            'iterations': len(history), 'blocks': n_blocks, 'wall_time': time.perf_counter() - start_time,
+            'history': history}
+    return make_report(values, params, steps), info
+
+
+if __name__ == '__main__':
+    import argparse
+    from output import save_report
+    from data_loader import load_series
+    from rolling_horizon import solve_rolling_horizon
+    parser = argparse.ArgumentParser(description="Temporal decomposition of the dispatch MILP, timed against the rolling horizon")
+    parser.add_argument("--data", default=None, help="parameter directory (default: config.DATA_DIR over config.TIME_STEPS)")
+    parser.add_argument("--hours", type=int, default=None, help="hours of --data to solve, from hour 0 (default: all)")
+    parser.add_argument("--block", type=int, default=DECOMPOSITION_BLOCK, help="hours per block")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    time_steps, params = TIME_STEPS, None
+    if args.data:
+        series = load_series(args.data)
+        time_steps = range(args.hours or max(len(v) for v in series.values()))
+        params = load_parameter_arrays(series, time_steps)
+    report, info = solve_decomposed(params, time_steps, args.block, args.workers)
+    print(f"Best schedule {info['upper_bound']:.4f}, lower bound {info['lower_bound']:.4f}, "
+          f"gap {info['gap']:.3%}, {info['iterations']} iterations, {info['wall_time']:.1f}s")
+    save_report(report, 'output/decomposition_results.csv')
+
+    start = time.perf_counter()
+    _, windows = solve_rolling_horizon(params, time_steps, verbose=False)
+    rolling_time = time.perf_counter() - start
+    print(f"=== {len(time_steps)} hours: decomposition {info['upper_bound']:.4f} in {info['wall_time']:.1f}s "
+          f"({info['blocks']} blocks), rolling horizon {sum(w['committed_cost'] for w in windows):.4f} "
+          f"in {rolling_time:.1f}s ({len(windows)} windows) ===")
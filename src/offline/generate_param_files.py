@@ -98,9 +98,9 @@ for param in time_series_params:
      df[[param]].to_csv(f"{output_dir}/{param}.csv", index=False)
 
 df = df.iloc[:HOURS]
-# Saving constant files as repeated 8760-row 
+# Saving constant files as a single row (param_store broadcasts them to the dataset length)
 for param, value in constants.items():
-    pd.DataFrame({param: [value] * len(df)}).to_csv(f"{output_dir}/{param}.csv", index=False)
+    pd.DataFrame({param: [value]}).to_csv(f"{output_dir}/{param}.csv", index=False)
 
 # generating EV availability with 10-hour random sessions
 hours_per_year = len(df)
@@ -81,10 +81,10 @@ for param in time_series_params:
     df_train[[param]].to_csv(f"{output_dir}/{param}.csv", index=False)
     df_test[[param]].to_csv(f"{output_test_dir}/{param}.csv", index=False)
 
-# --- Save constants ---
+# --- Save constants (single row, broadcast to the dataset length by param_store) ---
 for param, value in constants.items():
-    pd.DataFrame({param: [value] * len(df_train)}).to_csv(f"{output_dir}/{param}.csv", index=False)
-    pd.DataFrame({param: [value] * len(df_test)}).to_csv(f"{output_test_dir}/{param}.csv", index=False)
+    pd.DataFrame({param: [value]}).to_csv(f"{output_dir}/{param}.csv", index=False)
+    pd.DataFrame({param: [value]}).to_csv(f"{output_test_dir}/{param}.csv", index=False)
 
 # --- Generate EV availability ---
 hours_per_year = len(df)
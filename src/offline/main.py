@@ -1,11 +1,13 @@
-from solver import solve_model
+from solver import solve_model, gurobi_available
 from output import plot_results, save_report
 
 def main():
-    import gurobipy
-    print(gurobipy.__version__)
+    use_gurobi = gurobi_available()  # else the sparse builder with HiGHS/CBC (see solver.solve_model)
+    if use_gurobi:
+        import gurobipy
+        print(gurobipy.__version__)
 
-    sol = solve_model()
+    sol = solve_model('gurobi' if use_gurobi else None)
     print("Optimal import profile:")
     for t, val in sol['Import'].items():
         print(f"t={t}, import={val}")
@@ -16,6 +18,8 @@ def main():
     # Plot visualization of results
     plot_results(sol)
     
+    if not use_gurobi:
+        return
     try:
         from convergence import plot_convergence
         plot_convergence('output/gurobi_log.txt')
@@ -2,13 +2,22 @@ from pyomo.environ import ConcreteModel, Set, Param, Var, NonNegativeReals, Bina
 from config import TIME_STEPS
 from data_loader import load_parameters
 
-def create_model():
+def param_at(p, t):
+    # value of a parameter at time t, for both indexed and scalar (constant) Params
+    return p[t] if p.is_indexed() else p
+
+def create_model(params=None, mutable=False):
+    # params: as returned by load_parameters (default: loaded from config.DATA_DIR)
+    # mutable: make the Params mutable, so that a built model can be re-solved with new values (see sweep.py)
     m = ConcreteModel()
     m.T = Set(initialize=TIME_STEPS, ordered=True)
-    # load parameters
-    raw = load_parameters()
+    # load parameters: constant ones become scalar Params instead of one entry per hour
+    raw = load_parameters() if params is None else params
     for pname, pvals in raw.items():
-        setattr(m, pname, Param(m.T, initialize=pvals, mutable=False))
+        if isinstance(pvals, dict):
+            setattr(m, pname, Param(m.T, initialize=pvals, mutable=mutable))
+        else:
+            setattr(m, pname, Param(initialize=pvals, mutable=mutable))
     # Power vars
     m.p_import = Var(m.T, domain=NonNegativeReals)
     m.p_export = Var(m.T, domain=NonNegativeReals)
@@ -0,0 +1,275 @@
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+from multiprocessing.connection import wait
+import numpy as np
+from config import (SCENARIO_CACHE_DIR, ORACLE_DIR, ORACLE_TIME_LIMIT, ORACLE_GRACE, ORACLE_MIP_GAP,
+                    ORACLE_VOLL_FACTOR)
+from data_loader import load_parameter_arrays
+from sparse_model import SparseModel, solve_sparse, VARIABLES, SHORTFALL_VARIABLES
+
+# Scenarios are read from the RL side's scenario cache (src/model/scenarios.py): one <key>.npz
+# per scenario with a (T, N_PARAMS) 'table' whose 'columns' are parameter store file stems.
+# Each result is written to <ORACLE_DIR>/<key>.npz, so the RL evaluation finds it by the same key.
+
+# Parameter each shortfall is normalized by in the env's violation diagnostics (penalty_load,
+# penalty_heat, penalty_ev of src/model/reward.py)
+SHORTFALL_NORMS = {'s_load': 'param_load', 's_heat': 'H_demand', 's_ev': 'Eev_required'}
+
+
+def cached_scenario_keys(cache_dir=SCENARIO_CACHE_DIR, horizons=None):
+    """
+    Keys of the scenarios in the cache, sorted.
+
+    Args:
+        cache_dir: scenario cache directory
+        horizons: keep only scenarios of these lengths (None: all)
+    """
+    keys = sorted(f[:-4] for f in os.listdir(cache_dir) if f.endswith('.npz'))
+    if horizons is None:
+        return keys
+    kept = []
+    for key in keys:
+        with np.load(os.path.join(cache_dir, f"{key}.npz")) as f:
+            if len(f['tags']) in horizons:
+                kept.append(key)
+    return kept
+
+
+def load_cached_scenario(key, cache_dir=SCENARIO_CACHE_DIR):
+    """
+    Read one cached scenario.
+
+    Returns:
+        series: {file stem: (T,) array}, as accepted by data_loader.load_parameter_arrays
+        tags: (T,) scenario type codes
+    """
+    with np.load(os.path.join(cache_dir, f"{key}.npz")) as f:
+        table, columns, tags = f['table'], f['columns'], f['tags']
+    return {str(c): table[:, i].astype(np.float64) for i, c in enumerate(columns)}, tags
+
+
+def shortfall_costs(params, voll_factor=ORACLE_VOLL_FACTOR):
+    """
+    Cost per unit of shortfall: a value of lost load above every way of supplying it, so that
+    the MILP only falls short where the demand cannot be met at all (e.g. a grid outage with
+    more load than the DG, CHP and renewables cover).
+
+    The dearest kWh of power is a DG or CHP start plus an hour at the dearest of DG, CHP and
+    import; a kWh of heat takes 1 / alpha_chp kWh of CHP output and a kWh of EV energy
+    1 / eta_ch_ev kWh of charging.
+
+    Args:
+        params: {parameter name: (T,) array}
+        voll_factor: value of lost load as a multiple of the dearest kWh of power
+
+    Returns:
+        dict: {SHORTFALL_VARIABLES entry: (T,) cost}
+    """
+    marginal = np.maximum.reduce([params['price_import'], params['rho_fuel'] / params['eta_dg'],
+                                  params['rho_gas'] / params['eta_chp']])
+    voll = voll_factor * float(np.max(marginal + params['C_startup'], initial=0.0))
+    return {'s_load': np.full(len(marginal), voll), 's_heat': voll / params['alpha_chp'], 's_ev': voll / params['eta_ch_ev']}
+
+
+def scenario_model(series, n_hours, voll_factor=ORACLE_VOLL_FACTOR):
+    """
+    SparseModel of a scenario over hours 0..n_hours-1, starting where the RL env starts:
+    battery at Ees_min, EV empty, CHP and DG off.
+
+    Args:
+        voll_factor: value of lost load factor (see shortfall_costs); None keeps the load
+                     balance, heat demand and EV leave requirement hard, and events such as
+                     grid outages then often make the scenario infeasible
+    """
+    hours = range(n_hours)
+    params = load_parameter_arrays(series, hours)
+    state = {'ees': params['Ees_min'][0], 'eev': 0.0, 'u_chp': 0, 'u_dg': 0}
+    costs = shortfall_costs(params, voll_factor) if voll_factor is not None else None
+    return SparseModel(params, hours, initial_state=state, shortfall_costs=costs)
+
+
+def solve_scenario(series, n_hours, mip_gap=ORACLE_MIP_GAP, time_limit=ORACLE_TIME_LIMIT, threads=1, solver='highs',
+                   voll_factor=ORACLE_VOLL_FACTOR):
+    """
+    Solve the dispatch MILP of one scenario.
+
+    Args:
+        series: {file stem: series} of the scenario
+        n_hours: scenario length
+        mip_gap: relative MIP gap
+        time_limit: solver time limit in seconds (None: no limit); the solver checks it itself,
+                    so the model build is not counted and a solve may overrun it slightly
+        threads: solver threads
+        solver: solve_sparse backend
+        voll_factor: value of lost load factor (see scenario_model)
+
+    Returns:
+        dict: 'status', 'objective' (cost plus the value of lost load), 'bound', 'gap', 'solve_time'
+              (s, build included), 'solver', 'costs' ((T,) cost per hour without the lost load,
+              as the env's total_true_cost), 'dispatch' ((T, len(VARIABLES)) values),
+              'shortfall' ((T, len(SHORTFALL_VARIABLES)) kW(h) short) and 'penalties' (the same,
+              normalized as the env's violation diagnostics); NaN arrays without a feasible solution
+    """
+    start = time.perf_counter()
+    model = scenario_model(series, n_hours, voll_factor)
+    try:
+        result = solve_sparse(model, solver, mip_gap, time_limit, threads)
+    except RuntimeError as e:
+        result = {'x': None, 'status': str(e), 'objective': np.nan, 'bound': np.nan, 'gap': np.nan}
+
+    x = result['x']
+    if x is None:
+        costs = np.full(n_hours, np.nan)
+        dispatch = np.full((n_hours, len(VARIABLES)), np.nan)
+        shortfall = np.full((n_hours, len(SHORTFALL_VARIABLES)), np.nan)
+    else:
+        costs = sum(model.c[model.col(name)] * x[model.col(name)] for name, _ in VARIABLES)
+        dispatch = np.stack([model.values(x, name) for name, _ in VARIABLES], axis=1)
+        if model.shortfall_costs:
+            shortfall = np.stack([x[model.shortfall_col(name)] for name in SHORTFALL_VARIABLES], axis=1)
+        else:
+            shortfall = np.zeros((n_hours, len(SHORTFALL_VARIABLES)))
+    norms = np.stack([model.params[SHORTFALL_NORMS[name]] for name in SHORTFALL_VARIABLES], axis=1)
+    return {
+        'status': result['status'], 'objective': result['objective'], 'bound': result['bound'],
+        'gap': result['gap'], 'solve_time': time.perf_counter() - start, 'solver': solver,
+        'costs': costs, 'dispatch': dispatch, 'shortfall': shortfall, 'penalties': shortfall / (norms + 1e-6),
+    }
+
+
+def save_result(path, result):
+    # Temp file and rename, as for the scenario cache: a killed run never leaves a partial result
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, variables=np.array([name for name, _ in VARIABLES]),
+                     shortfall_variables=np.array(SHORTFALL_VARIABLES), **result)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _failure(status, start, solver):
+    return {'status': status, 'objective': np.nan, 'bound': np.nan, 'gap': np.nan,
+            'solve_time': time.perf_counter() - start, 'solver': solver}
+
+
+def _solve_job(job, conn):
+    """Worker process: solve one scenario, save it and send back its summary (or the failure)"""
+    key, cache_dir, output_dir, mip_gap, time_limit, threads, solver, voll_factor = job
+    start = time.perf_counter()
+    try:
+        series, tags = load_cached_scenario(key, cache_dir)
+        result = solve_scenario(series, len(tags), mip_gap, time_limit, threads, solver, voll_factor)
+        save_result(os.path.join(output_dir, f"{key}.npz"), result)
+        summary = {k: v for k, v in result.items() if np.ndim(v) == 0}
+    except Exception as e:
+        summary = _failure(f"failed: {type(e).__name__}: {e}", start, solver)
+    conn.send(summary)
+    conn.close()
+
+
+def solve_scenarios(keys=None, cache_dir=SCENARIO_CACHE_DIR, output_dir=ORACLE_DIR, n_workers=None, threads=1,
+                    mip_gap=ORACLE_MIP_GAP, time_limit=ORACLE_TIME_LIMIT, wall_limit=None, solver='highs',
+                    voll_factor=ORACLE_VOLL_FACTOR, overwrite=False, verbose=True):
+    """
+    Solve the MILP of many cached scenarios, each job in its own worker process, at most
+    n_workers at a time.
+
+    Every job is capped at `threads` solver threads and writes its result to
+    <output_dir>/<key>.npz as soon as it finishes. Scenarios that already have a result are
+    skipped unless `overwrite`, so an interrupted batch resumes where it stopped. A job that
+    raises, crashes or outlives `wall_limit` seconds is killed and recorded as failed without
+    stopping the others; it has no result file, so the next run retries it.
+
+    Args:
+        keys: scenario keys (default: every scenario in cache_dir)
+        cache_dir: scenario cache directory
+        output_dir: result directory
+        n_workers: parallel jobs (default: os.cpu_count() // threads)
+        threads: solver threads per job
+        mip_gap: relative MIP gap
+        time_limit: solver time limit per job in seconds (None: no limit)
+        wall_limit: wall-clock limit per job, build and save included, after which the worker is
+                    killed (default: time_limit + ORACLE_GRACE; None without a time limit)
+        solver: solve_sparse backend
+        voll_factor: value of lost load factor (see scenario_model)
+        overwrite: re-solve scenarios that already have a result
+        verbose: print one line per finished scenario
+
+    Returns:
+        dict: {key: {'status', 'objective', 'bound', 'gap', 'solve_time', 'solver'}} for the
+              scenarios handled in this call, in key order (status 'failed: ...' or 'killed: ...'
+              for jobs that did not finish)
+    """
+    keys = cached_scenario_keys(cache_dir) if keys is None else list(keys)
+    if not overwrite:
+        keys = [k for k in keys if not os.path.exists(os.path.join(output_dir, f"{k}.npz"))]
+    if wall_limit is None and time_limit is not None:
+        wall_limit = time_limit + ORACLE_GRACE
+    n_workers = n_workers or max(1, (os.cpu_count() or 1) // threads)
+    pending = [(k, cache_dir, output_dir, mip_gap, time_limit, threads, solver, voll_factor) for k in keys]
+    pending.reverse()
+    running, results = {}, {}
+
+    while pending or running:
+        while pending and len(running) < n_workers:
+            job = pending.pop()
+            recv, send = multiprocessing.Pipe(duplex=False)
+            proc = multiprocessing.Process(target=_solve_job, args=(job, send), daemon=True)
+            proc.start()
+            send.close()
+            running[job[0]] = (proc, recv, time.perf_counter())
+
+        ready = wait([recv for _, recv, _ in running.values()], timeout=1.0)
+        for key, (proc, recv, started) in list(running.items()):
+            if recv in ready:
+                try:
+                    results[key] = recv.recv()
+                except EOFError:  # the worker died before sending anything
+                    proc.join()
+                    results[key] = _failure(f"failed: worker exited with code {proc.exitcode}", started, solver)
+            elif wall_limit is not None and time.perf_counter() - started > wall_limit:
+                proc.kill()
+                results[key] = _failure(f"killed: wall-clock limit of {wall_limit:.0f}s", started, solver)
+            else:
+                continue
+            proc.join()
+            recv.close()
+            del running[key]
+            if verbose:
+                r = results[key]
+                print(f"[{len(results)}/{len(keys)}] {key}: {r['status']}, objective {r['objective']:.4f}, "
+                      f"gap {r['gap']:.3%}, {r['solve_time']:.1f}s")
+    return {k: results[k] for k in keys}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="MILP oracle: optimal dispatch of the cached RL scenarios")
+    parser.add_argument("--cache-dir", default=SCENARIO_CACHE_DIR, help="scenario cache directory")
+    parser.add_argument("--output-dir", default=ORACLE_DIR, help="result directory")
+    parser.add_argument("--horizons", type=int, nargs="+", default=None, help="only scenarios of these lengths")
+    parser.add_argument("--workers", type=int, default=None, help="parallel jobs (default: cores // threads)")
+    parser.add_argument("--threads", type=int, default=1, help="solver threads per job")
+    parser.add_argument("--time-limit", type=float, default=ORACLE_TIME_LIMIT, help="solver seconds per job")
+    parser.add_argument("--wall-limit", type=float, default=None,
+                        help="seconds after which a job is killed (default: time limit + ORACLE_GRACE)")
+    parser.add_argument("--mip-gap", type=float, default=ORACLE_MIP_GAP, help="relative MIP gap")
+    parser.add_argument("--solver", default="highs", help="solve_sparse backend")
+    parser.add_argument("--voll-factor", type=float, default=ORACLE_VOLL_FACTOR,
+                        help="value of lost load, as a multiple of the dearest kWh of power")
+    parser.add_argument("--hard", action="store_true", help="no shortfall slack: load, heat and EV constraints are hard")
+    parser.add_argument("--overwrite", action="store_true", help="re-solve scenarios that already have a result")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = solve_scenarios(cached_scenario_keys(args.cache_dir, args.horizons), args.cache_dir, args.output_dir,
+                              args.workers, args.threads, args.mip_gap, args.time_limit, args.wall_limit, args.solver,
+                              None if args.hard else args.voll_factor, args.overwrite)
+    solved = sum(np.isfinite(r['objective']) for r in results.values())
+    print(f"=== {len(results)} scenarios solved ({solved} with a solution) in {time.perf_counter() - start:.1f}s ===")
@@ -0,0 +1,112 @@
+import time
+import numpy as np
+from config import TIME_STEPS, ROLLING_WINDOW, ROLLING_COMMIT
+from data_loader import load_parameter_arrays
+from sparse_model import SparseModel, PersistentHighs, VARIABLES, make_report
+
+
+def window_bounds(n_hours, window=ROLLING_WINDOW, commit=ROLLING_COMMIT):
+    """
+    Rolling windows over n_hours hours.
+
+    Returns:
+        list of (start, stop, committed) hour indices: the window covers [start, stop) and its
+        solution is kept for [start, committed); the last window runs to the end and keeps it all
+    """
+    if not 0 < commit <= window:
+        raise ValueError(f"Need 0 < commit <= window, got commit={commit}, window={window}")
+    bounds, start = [], 0
+    while start < n_hours:
+        stop = min(start + window, n_hours)
+        committed = stop if stop == n_hours else start + commit
+        bounds.append((start, stop, committed))
+        start = committed
+    return bounds
+
+
+def _shifted_start(previous, model):
+    """Warm start for a window from the previous window's solution, shifted to the new first hour"""
+    prev_model, x, shift = previous
+    overlap = prev_model.T - shift
+    if overlap <= 0:
+        return None
+    hours = np.arange(min(overlap, model.T))
+    index = np.concatenate([model.col(name)[hours] for name, _ in VARIABLES])
+    values = np.concatenate([x[prev_model.col(name)[hours + shift]] for name, _ in VARIABLES])
+    values = np.where(model.integrality[index] == 1, np.round(values), values)
+    return index, values
+
+
+def solve_rolling_horizon(params=None, time_steps=TIME_STEPS, window=ROLLING_WINDOW, commit=ROLLING_COMMIT,
+                          mip_gap=0.001, time_limit=None, threads=None, warm_start=True, log_file=None, verbose=True):
+    """
+    Receding-horizon solve of the dispatch MILP: each window is optimized over `window` hours,
+    its first `commit` hours are kept and the next window starts from the battery SOC, EV SOC
+    and unit on/off states reached at the end of them.
+
+    One HiGHS instance is kept across windows and receives only the values that change
+    (parameters and initial state); each window is warm-started from the previous solution.
+
+    Args:
+        params: {parameter name: (H,) array} over time_steps (default: load_parameter_arrays)
+        time_steps: hours of the full horizon
+        window: hours per window
+        commit: hours kept per window
+        mip_gap: relative MIP gap per window
+        time_limit: time limit per window in seconds (None: no limit)
+        threads: HiGHS threads (None: HiGHS default)
+        warm_start: start each window from the overlap with the previous solution
+        log_file: HiGHS log file
+        verbose: print one line per window
+
+    Returns:
+        report: stitched schedule in the format of solver.solve_model
+        windows: one dict per window: 'start', 'stop', 'committed' (hours), 'status', 'objective',
+                 'gap', 'committed_cost', 'update_time', 'solve_time' (s), 'changed' (values sent)
+    """
+    steps = np.asarray(time_steps)
+    if params is None:
+        params = load_parameter_arrays(time_steps=time_steps)
+    values = {name: np.zeros(len(steps)) for name, _ in VARIABLES}
+    solver = PersistentHighs(mip_gap, time_limit, threads, log_file)
+    state, previous, windows = None, None, []
+
+    for k, (start, stop, committed) in enumerate(window_bounds(len(steps), window, commit)):
+        t0 = time.perf_counter()
+        model = SparseModel({name: a[start:stop] for name, a in params.items()}, steps[start:stop], initial_state=state)
+        changed = solver.update(model)
+        update_time = time.perf_counter() - t0
+
+        result = solver.solve(_shifted_start(previous, model) if warm_start and previous else None)
+        if result['x'] is None:
+            raise RuntimeError(f"Window {k} (hours {steps[start]}-{steps[stop - 1]}): no feasible solution ({result['status']})")
+        x, n = result['x'], committed - start
+
+        for name, _ in VARIABLES:
+            values[name][start:committed] = model.values(x, name)[:n]
+        kept = np.tile(np.arange(model.T) < n, len(VARIABLES))
+        state = model.final_state(x, n - 1)
+        previous = (model, x, n)
+
+        windows.append({
+            'start': int(steps[start]), 'stop': int(steps[stop - 1]), 'committed': int(steps[committed - 1]),
+            'status': result['status'], 'objective': result['objective'], 'gap': result['gap'],
+            'committed_cost': float(model.c[kept] @ x[kept]),
+            'update_time': update_time, 'solve_time': result['solve_time'], 'changed': changed,
+        })
+        if verbose:
+            w = windows[-1]
+            print(f"Window {k}: hours {w['start']}-{w['stop']} (keep to {w['committed']}), {w['status']}, "
+                  f"objective {w['objective']:.4f}, gap {w['gap']:.3%}, solve {w['solve_time']:.2f}s")
+
+    if verbose:
+        total = sum(w['committed_cost'] for w in windows)
+        print(f"=== {len(windows)} windows: cost {total:.4f}, "
+              f"solve time {sum(w['solve_time'] for w in windows):.1f}s ===")
+    return make_report(values, params, steps), windows
+
+
+if __name__ == '__main__':
+    from output import save_report
+    report, windows = solve_rolling_horizon()
+    save_report(report, 'output/rolling_horizon_results.csv')
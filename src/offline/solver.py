@@ -1,9 +1,31 @@
-from pyomo.environ import SolverFactory
-from model import create_model
+import numpy as np
+from pyomo.environ import SolverFactory, Constraint, Objective, value
+from model import create_model, param_at
 from constraints import add_constraints
 from objective import add_objective
+from sparse_model import SparseModel, solve_sparse, SOLVERS, VARIABLES
+
+
+def gurobi_available():
+    return SolverFactory('gurobi').available(exception_flag=False)
+
+
+def solve_model(solver_name=None):
+    """
+    Solve the dispatch MILP over config.TIME_STEPS.
+
+    Args:
+        solver_name: 'gurobi' (Pyomo model), or 'highs', 'scipy' or 'cbc' (sparse_model builder)
+                     (default: gurobi when available, else the first available open-source solver)
+
+    Returns:
+        dict: {report key: {t: value}}
+    """
+    if solver_name is None:
+        solver_name = 'gurobi' if gurobi_available() else None
+    if solver_name != 'gurobi':
+        return solve_sparse_model(solver_name)
 
-def solve_model():
     m = create_model()
     m = add_constraints(m)
     m = add_objective(m)
@@ -13,7 +35,11 @@ def solve_model():
     results = solver.solve(m, tee=True,options={"DualReductions": 0})
     m.solutions.load_from(results)
 
-    # Extracting the output
+    return extract_report(m)
+
+
+def extract_report(m):
+    """Solution values of a solved Pyomo model as {report key: {t: value}}"""
     report = {
     'Import':   {t: m.p_import[t].value for t in m.T},
     'Export':   {t: m.p_export[t].value for t in m.T},
@@ -34,10 +60,96 @@ def solve_model():
     'startup_DG':  {t: m.e_startup_dg[t].value for t in m.T},
     'startup_CHP': {t: m.e_startup_chp[t].value for t in m.T},
     "u_maingrid": {t: m.u_maingrid[t].value for t in m.T},
-    'Load_el':  {t: m.param_load[t] for t in m.T},
-    'Load_th':  {t: m.H_demand[t] for t in m.T},
+    'Load_el':  {t: value(param_at(m.param_load, t)) for t in m.T},
+    'Load_th':  {t: value(param_at(m.H_demand, t)) for t in m.T},
 }
 
 
     return report
 
+
+def solve_sparse_model(solver_name=None):
+    """Build the model as sparse matrices and solve it with an open-source solver (see solve_model)"""
+    if solver_name is not None and solver_name not in SOLVERS:
+        raise ValueError(f"Unknown solver {solver_name!r}, expected 'gurobi' or one of {SOLVERS}")
+    model = SparseModel()
+    result = solve_sparse(model, solver=solver_name, mip_gap=0.001, log_file='output/solver_log.txt', tee=True)
+    print(f"{result['solver']}: {result['status']}, objective {result['objective']:.4f}, gap {result['gap']:.4%}, {result['solve_time']:.2f}s")
+    return model.report(result['x'])
+
+
+def check_sparse_model(mip_gap=1e-4, tol=1e-5):
+    """
+    Check that SparseModel is the same MILP as the Pyomo model over config.TIME_STEPS.
+
+    Both are solved (the Pyomo model with Gurobi when available, else APPSI HiGHS) and their
+    objectives must agree within the MIP gap. Each optimal schedule must also be feasible in
+    the other formulation, with the same objective value there: this covers the constraints
+    on a single variable that SparseModel turns into column bounds (e.g. H_chp >= H_demand).
+
+    Args:
+        mip_gap: relative MIP gap of both solves
+        tol: absolute tolerance on constraint violations and objective values
+
+    Returns:
+        dict: 'pyomo' and 'sparse' objectives, and the largest violation of each schedule
+              in the other formulation ('pyomo_in_sparse', 'sparse_in_pyomo')
+
+    Raises:
+        AssertionError: on any mismatch (raised explicitly, so `python -O` still checks)
+    """
+    m = add_objective(add_constraints(create_model()))
+    if gurobi_available():
+        solver = SolverFactory('gurobi')
+        solver.options['MIPGap'] = mip_gap
+    else:
+        solver = SolverFactory('appsi_highs')
+        solver.options['mip_rel_gap'] = mip_gap
+    solver.solve(m)
+    obj = next(m.component_data_objects(Objective, active=True))
+    pyomo_objective = value(obj)
+
+    sparse = SparseModel()
+    result = solve_sparse(sparse, mip_gap=mip_gap)
+    scale = max(abs(pyomo_objective), abs(result['objective']), 1.0)
+    if abs(pyomo_objective - result['objective']) > mip_gap * scale + tol:
+        raise AssertionError(f"Objectives differ: Pyomo {pyomo_objective:.6f}, sparse {result['objective']:.6f}")
+
+    # Pyomo schedule in the sparse model: rows, column bounds, integrality and cost
+    x = np.zeros(sparse.n_cols)
+    for name, _ in VARIABLES:
+        x[sparse.col(name)] = [getattr(m, name)[t].value or 0.0 for t in m.T]
+    ax = sparse.A @ x
+    pyomo_in_sparse = max(np.max(sparse.row_lower - ax, initial=0), np.max(ax - sparse.row_upper, initial=0),
+                          np.max(sparse.col_lower - x, initial=0), np.max(x - sparse.col_upper, initial=0),
+                          np.max(np.abs(x - np.round(x))[sparse.integrality == 1], initial=0))
+    if pyomo_in_sparse > tol:
+        raise AssertionError(f"Pyomo schedule violates the sparse model by {pyomo_in_sparse:.3g}")
+    if abs(sparse.c @ x - pyomo_objective) > tol * scale:
+        raise AssertionError("Sparse costs differ from the Pyomo objective")
+
+    # Sparse schedule in the Pyomo model: variable bounds and every constraint
+    for name, _ in VARIABLES:
+        for t, v in zip(m.T, sparse.values(result['x'], name)):
+            getattr(m, name)[t].set_value(float(v), skip_validation=True)
+    violations = [0.0]
+    for name, _ in VARIABLES:
+        for var in getattr(m, name).values():
+            violations += [(var.lb or 0) - var.value if var.lb is not None else 0,
+                           var.value - var.ub if var.ub is not None else 0]
+    for c in m.component_data_objects(Constraint, active=True):
+        body = value(c.body)
+        violations += [value(c.lower) - body if c.has_lb() else 0, body - value(c.upper) if c.has_ub() else 0]
+    sparse_in_pyomo = max(violations)
+    if sparse_in_pyomo > tol:
+        raise AssertionError(f"Sparse schedule violates the Pyomo model by {sparse_in_pyomo:.3g}")
+    if abs(value(obj) - result['objective']) > tol * scale:
+        raise AssertionError("Pyomo objective differs from the sparse costs")
+
+    return {'pyomo': pyomo_objective, 'sparse': result['objective'],
+            'pyomo_in_sparse': pyomo_in_sparse, 'sparse_in_pyomo': sparse_in_pyomo}
+
+
+if __name__ == '__main__':
+    # python solver.py: check the sparse builder against the Pyomo model on the DATA_DIR data
+    print(check_sparse_model())
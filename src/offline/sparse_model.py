@@ -0,0 +1,617 @@
+import os
+import time
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+from config import TIME_STEPS
+from data_loader import load_parameter_arrays
+
+# Variables of model.create_model, in column-block order: (name, binary)
+VARIABLES = (
+    ('p_import', False), ('p_export', False), ('p_wt', False), ('p_pv', False),
+    ('p_chp', False), ('p_dg', False), ('H_chp', False),
+    ('u_chp', True), ('u_dg', True), ('u_maingrid', True),
+    ('e_startup_chp', True), ('e_startup_dg', True),
+    ('p_ch_es', False), ('p_dis_es', False), ('u_ch_es', True), ('u_dis_es', True),
+    ('ees', False), ('p_ch_ev', False), ('eev', False),
+)
+
+# Report key -> variable, as in solver.solve_model
+REPORT_VARIABLES = {
+    'Import': 'p_import', 'Export': 'p_export', 'PV': 'p_pv', 'WT': 'p_wt', 'DG': 'p_dg',
+    'CHP': 'p_chp', 'Heat_CHP': 'H_chp', 'SOC': 'ees', 'EV_SOC': 'eev',
+    'EV_Charging': 'p_ch_ev', 'ES_Charging': 'p_ch_es', 'ES_Discharging': 'p_dis_es',
+    'u_CHP': 'u_chp', 'u_DG': 'u_dg', 'u_CH_ES': 'u_ch_es', 'u_DIS_ES': 'u_dis_es',
+    'startup_DG': 'e_startup_dg', 'startup_CHP': 'e_startup_chp', 'u_maingrid': 'u_maingrid',
+}
+
+# State carried from one hour to the next: battery SOC, EV SOC, unit on/off
+STATE_VARIABLES = ('ees', 'eev', 'u_chp', 'u_dg')
+
+EV_SOC_MAX = 70  # stop_ev_charging
+
+# Slack columns of a model with shortfall_costs: unserved load, unmet heat demand and EV energy
+# short of the leave requirement
+SHORTFALL_VARIABLES = ('s_load', 's_heat', 's_ev')
+
+# Open-source backends of solve_sparse, in the order they are tried
+SOLVERS = ('highs', 'scipy', 'cbc')
+
+
+class SparseModel:
+    """
+    The offline dispatch MILP of model.create_model, constraints.add_constraints and
+    objective.add_objective, assembled from parameter arrays as
+
+        min c x   s.t.   row_lower <= A x <= row_upper,   col_lower <= x <= col_upper,
+
+    with x[j] binary where integrality[j] is 1. Columns are variable-major: the variable
+    VARIABLES[k] at the i-th hour of `time_steps` is column k * T + i. Constraints on a single
+    variable (WT/PV/EV limits, SOC limits, heat demand, EV leave requirement) are column
+    bounds instead of rows; the feasible set is the same.
+
+    The row and column layout only depends on T (and, with shortfall_costs, on the hours where
+    leave_possible is set), so models of equal length built from other parameters or initial
+    states differ in values only (see PersistentHighs.update).
+    With state_columns, the initial state is held by one extra column per STATE_VARIABLES
+    entry after the hourly ones, fixed by its bounds, so that it can be freed or priced.
+    With shortfall_costs, the power balance, heat demand and EV leave requirement are soft:
+    one slack column per SHORTFALL_VARIABLES entry and hour follows, priced per unit.
+    """
+
+    def __init__(self, params=None, time_steps=TIME_STEPS, initial_state=None, state_columns=False,
+                 shortfall_costs=None):
+        """
+        Args:
+            params: {parameter name: (T,) array} as returned by data_loader.load_parameter_arrays
+                    (default: the parameters of config.DATA_DIR)
+            time_steps: hours of the horizon (used for labels only)
+            initial_state: state before the first hour, e.g. the end of a previous window:
+                           {'ees': battery SOC, 'eev': EV SOC, 'u_chp': 0/1, 'u_dg': 0/1}
+                           (default: as the Pyomo model, battery at Ees_min, EV SOC 0 at the
+                           first hour, units off)
+            state_columns: model the initial state as columns (see state_col) instead of constants
+            shortfall_costs: {SHORTFALL_VARIABLES entry: (T,) cost per kW(h) short} to allow
+                             shortfalls at that cost (default: hard constraints)
+        """
+        self.time_steps = np.asarray(time_steps)
+        self.params = load_parameter_arrays(time_steps=time_steps) if params is None else params
+        self.initial_state = initial_state
+        self.state_columns = state_columns
+        self.shortfall_costs = shortfall_costs
+        self.T = len(self.time_steps)
+        self._shortfall_start = len(VARIABLES) * self.T + (len(STATE_VARIABLES) if state_columns else 0)
+        self.n_cols = self._shortfall_start + (len(SHORTFALL_VARIABLES) * self.T if shortfall_costs else 0)
+        self._index = {name: k for k, (name, _) in enumerate(VARIABLES)}
+        self.build()
+
+    def col(self, name):
+        """Column indices of a variable, one per hour"""
+        k = self._index[name]
+        return np.arange(k * self.T, (k + 1) * self.T)
+
+    def row(self, name):
+        """Row indices of a constraint, one per row of its block"""
+        for block, first, hours in self.row_blocks:
+            if block == name:
+                return np.arange(first, first + len(hours))
+        raise KeyError(name)
+
+    def state_col(self, name):
+        """Column of the initial value of a STATE_VARIABLES entry (state_columns models only)"""
+        return len(VARIABLES) * self.T + STATE_VARIABLES.index(name)
+
+    def shortfall_col(self, name):
+        """Column indices of a SHORTFALL_VARIABLES slack, one per hour (shortfall_costs models only)"""
+        k = SHORTFALL_VARIABLES.index(name)
+        return np.arange(self._shortfall_start + k * self.T, self._shortfall_start + (k + 1) * self.T)
+
+    def build(self):
+        """Assemble c, A, the row and column bounds and the integrality vector"""
+        p, T, col = self.params, self.T, self.col
+        i = np.arange(T)
+        self._rows, self._cols, self._vals = [], [], []
+        self._lower, self._upper = [], []
+        self.row_blocks = []  # (constraint name, first row, hour of each row)
+        self.n_rows = 0
+
+        state = self.initial_state or {}
+        initial_values = {'ees': p['Ees_min'][0] if T else 0.0, 'eev': 0.0, 'u_chp': 0.0, 'u_dg': 0.0}
+        initial_values.update(state)
+
+        # === COLUMN BOUNDS ===
+        self.integrality = np.repeat([int(binary) for _, binary in VARIABLES], T).astype(np.uint8)
+        if self.state_columns:
+            self.integrality = np.append(self.integrality, [int(name.startswith('u_')) for name in STATE_VARIABLES]).astype(np.uint8)
+        soft = bool(self.shortfall_costs)
+        if soft:
+            self.integrality = np.append(self.integrality, np.zeros(len(SHORTFALL_VARIABLES) * T, dtype=np.uint8))
+        self.col_lower = np.zeros(self.n_cols)
+        self.col_upper = np.where(self.integrality == 1, 1.0, np.inf)
+        self.col_upper[col('p_wt')] = p['PWT_max']
+        self.col_upper[col('p_pv')] = p['PPV_max']
+        self.col_upper[col('p_ch_ev')] = p['PEV_max'] * p['A']
+        self.col_lower[col('ees')] = p['Ees_min']
+        self.col_upper[col('ees')] = p['Ees_max']
+        self.col_upper[col('eev')] = EV_SOC_MAX
+        leave = p['leave_possible'] == 1
+        required = np.where(leave, np.maximum(p['Eev_required'], 0), 0.0)
+        if soft:
+            # Shortfalls are at most the demand they fall short of
+            self.col_upper[self.shortfall_col('s_load')] = np.maximum(p['param_load'], 0)
+            self.col_upper[self.shortfall_col('s_heat')] = np.maximum(p['H_demand'], 0)
+            self.col_upper[self.shortfall_col('s_ev')] = required
+        else:
+            self.col_lower[col('H_chp')] = p['H_demand']
+            self.col_lower[col('eev')[leave]] = required[leave]
+        if self.state_columns:
+            state_cols = [self.state_col(name) for name in STATE_VARIABLES]
+            self.col_lower[state_cols] = self.col_upper[state_cols] = [initial_values[name] for name in STATE_VARIABLES]
+        first = i[:1]
+
+        # === CONSTRAINTS ===
+        inf = np.inf
+        self._add('grid_import_upper', i, [(i, col('p_import'), 1), (i, col('u_maingrid'), -p['P_grid_import_max'])], -inf, 0)
+        self._add('grid_export_upper', i, [(i, col('p_export'), 1), (i, col('u_maingrid'), p['P_grid_export_max'])], -inf, p['P_grid_export_max'])
+        self._add('chp_upper', i, [(i, col('p_chp'), 1), (i, col('u_chp'), -p['PCHP_max'])], -inf, 0)
+        self._add('dg_upper', i, [(i, col('p_dg'), 1), (i, col('u_dg'), -p['PDG_max'])], -inf, 0)
+        self._add('ch_es_upper', i, [(i, col('p_ch_es'), 1), (i, col('u_ch_es'), -p['Pch_es_max'])], -inf, 0)
+        self._add('dis_es_upper', i, [(i, col('p_dis_es'), 1), (i, col('u_dis_es'), -p['Pdis_es_max'])], -inf, 0)
+        self._add('no_charge_discharge', i, [(i, col('u_ch_es'), 1), (i, col('u_dis_es'), 1)], -inf, 1)
+
+        # Startups: e[t] >= u[t] - u[t-1] (u[t-1] from the initial state at the first hour)
+        for unit in ('dg', 'chp'):
+            u = col(f'u_{unit}')
+            terms = [(i, col(f'e_startup_{unit}'), 1), (i, u, -1), (i[1:], u[:-1], 1)]
+            lower = np.zeros(T)
+            if self.state_columns:
+                terms.append((first, [self.state_col(f'u_{unit}')], 1))
+            else:
+                lower[:1] = -initial_values[f'u_{unit}']
+            self._add(f'{unit}_startup', i, terms, lower, inf)
+
+        self._add('heat_balance', i, [(i, col('H_chp'), 1), (i, col('p_chp'), -p['alpha_chp'])], 0, 0)
+        if soft:
+            self._add('heat_demand', i, [(i, col('H_chp'), 1), (i, self.shortfall_col('s_heat'), 1)], p['H_demand'], inf)
+            hours = i[leave]
+            rows = np.arange(len(hours))
+            self._add('ev_leave', hours, [(rows, col('eev')[hours], 1), (rows, self.shortfall_col('s_ev')[hours], 1)],
+                      required[hours], inf)
+
+        # Battery SOC: ees[t] - ees[t-1] - eta_ch p_ch[t] + p_dis[t] / eta_dis = 0 (ees[t-1] from the initial state)
+        ees = col('ees')
+        terms = [(i, ees, 1), (i[1:], ees[:-1], -1), (i, col('p_ch_es'), -p['eta_ch_es']), (i, col('p_dis_es'), 1 / p['eta_dis_es'])]
+        initial = np.zeros(T)
+        if self.state_columns:
+            terms.append((first, [self.state_col('ees')], -1))
+        else:
+            initial[:1] = initial_values['ees']
+        self._add('soc_batt', i, terms, initial, initial)
+
+        # EV SOC: eev[t] = eev[t-1] + eta_ch_ev p_ch_ev[t], restarting from 0 at a session start.
+        # Without an initial state the first hour is eev = 0, as in the Pyomo model
+        eev = col('eev')
+        carry = np.where(p['session_start'] == 1, 0.0, -1.0)
+        charge = -p['eta_ch_ev'].copy()
+        terms = [(i, eev, 1), (i[1:], eev[:-1], carry[1:]), (i, col('p_ch_ev'), charge)]
+        initial = np.zeros(T)
+        if 'eev' not in state:
+            charge[:1] = 0
+        elif self.state_columns:
+            terms.append((first, [self.state_col('eev')], carry[:1]))
+        else:
+            initial[:1] = -carry[:1] * state['eev']
+        self._add('soc_ev', i, terms, initial, initial)
+
+        supply = ('p_import', 'p_wt', 'p_pv', 'p_chp', 'p_dg', 'p_dis_es')
+        demand = ('p_export', 'p_ch_es', 'p_ch_ev')
+        terms = [(i, col(v), 1) for v in supply] + [(i, col(v), -1) for v in demand]
+        if soft:
+            terms.append((i, self.shortfall_col('s_load'), 1))
+        self._add('power_balance', i, terms, p['param_load'], p['param_load'])
+
+        self.A = sp.csr_matrix((np.concatenate(self._vals), (np.concatenate(self._rows), np.concatenate(self._cols))),
+                               shape=(self.n_rows, self.n_cols))
+        self.A.eliminate_zeros()
+        self.row_lower = np.concatenate(self._lower)
+        self.row_upper = np.concatenate(self._upper)
+        del self._rows, self._cols, self._vals, self._lower, self._upper
+
+        # === OBJECTIVE ===
+        self.c = np.zeros(self.n_cols)
+        self.c[col('p_import')] = p['price_import']
+        self.c[col('p_export')] = -p['price_export']
+        self.c[col('p_wt')] = p['Cop_ma_wt']
+        self.c[col('p_pv')] = p['Cop_ma_pv']
+        self.c[col('p_chp')] = p['rho_gas'] / p['eta_chp']
+        self.c[col('p_dg')] = p['rho_fuel'] / p['eta_dg']
+        self.c[col('e_startup_chp')] = p['C_startup']
+        self.c[col('e_startup_dg')] = p['C_startup']
+        self.c[col('p_ch_ev')] = -p['price_ev']
+        self.c[col('p_dis_es')] = p['C_degrad_es']
+        if soft:
+            for name in SHORTFALL_VARIABLES:
+                self.c[self.shortfall_col(name)] = self.shortfall_costs[name]
+        return self
+
+    def _add(self, name, hours, terms, lower, upper):
+        """
+        Append one row per entry of `hours` (indices into time_steps).
+
+        Args:
+            name: constraint name (row labels are name_<hour>)
+            hours: (m,) hour index of each row
+            terms: list of (local rows, columns, coefficients), coefficients scalar or per entry
+            lower, upper: row bounds, scalar or (m,)
+        """
+        m = len(hours)
+        for rows, cols, coef in terms:
+            self._rows.append(self.n_rows + rows)
+            self._cols.append(cols)
+            self._vals.append(np.broadcast_to(np.asarray(coef, dtype=np.float64), len(rows)))
+        self._lower.append(np.broadcast_to(np.asarray(lower, dtype=np.float64), m))
+        self._upper.append(np.broadcast_to(np.asarray(upper, dtype=np.float64), m))
+        self.row_blocks.append((name, self.n_rows, self.time_steps[hours]))
+        self.n_rows += m
+
+    # === LABELS AND REPORT ===
+
+    def col_names(self):
+        names = [f"{name}_{t}" for name, _ in VARIABLES for t in self.time_steps.tolist()]
+        if self.state_columns:
+            names += [f"{name}_in" for name in STATE_VARIABLES]
+        if self.shortfall_costs:
+            names += [f"{name}_{t}" for name in SHORTFALL_VARIABLES for t in self.time_steps.tolist()]
+        return names
+
+    def row_names(self):
+        return [f"{name}_{t}" for name, _, hours in self.row_blocks for t in hours.tolist()]
+
+    def values(self, x, name):
+        """(T,) values of one variable in a solution vector"""
+        return x[self.col(name)]
+
+    def final_state(self, x, hour=-1):
+        """State after the given hour index of a solution, as accepted by initial_state"""
+        values = {name: x[self.col(name)[hour]] for name in STATE_VARIABLES}
+        return {name: float(round(v) if name.startswith('u_') else v) for name, v in values.items()}
+
+    def report(self, x):
+        """Solution in the report format of solver.solve_model ({key: {t: value}})"""
+        return make_report({name: self.values(x, name) for name, _ in VARIABLES}, self.params, self.time_steps)
+
+    # === FILE OUTPUT ===
+
+    def write(self, path):
+        """Write the model as free-format MPS (.mps) or CPLEX LP (.lp), by file extension"""
+        if path.endswith('.lp'):
+            lines = self._lp_lines()
+        elif path.endswith('.mps'):
+            lines = self._mps_lines()
+        else:
+            raise ValueError(f"Unknown model file format: {path} (expected .mps or .lp)")
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines))
+            f.write('\n')
+        return path
+
+    def _mps_lines(self):
+        cols, rows = self.col_names(), ['obj'] + self.row_names()
+        lo, hi = self.row_lower, self.row_upper
+        sense = np.where(lo == hi, 'E', np.where(np.isinf(lo), 'L', 'G'))
+
+        lines = ['NAME microgrid', 'ROWS', ' N  obj']
+        lines += [f" {s}  {r}" for s, r in zip(sense.tolist(), rows[1:])]
+
+        # Objective as row 0; columns without any coefficient keep an explicit zero objective entry
+        keep = (self.c != 0) | (np.diff(self.A.tocsc().indptr) == 0)
+        obj = sp.csr_matrix((self.c[keep], (np.zeros(keep.sum(), dtype=np.int64), np.flatnonzero(keep))), shape=(1, self.n_cols))
+        M = sp.vstack([obj, self.A]).tocsc()
+        entry_cols = np.repeat(np.arange(self.n_cols), np.diff(M.indptr))
+        entries = [f"    {cols[j]} {rows[r]} {v!r}" for j, r, v in zip(entry_cols.tolist(), M.indices.tolist(), M.data.tolist())]
+
+        lines.append('COLUMNS')
+        for k, (name, binary) in enumerate(VARIABLES):
+            block = entries[M.indptr[k * self.T]:M.indptr[(k + 1) * self.T]]
+            if binary:
+                lines += [f"    M{k} 'MARKER' 'INTORG'"] + block + [f"    M{k} 'MARKER' 'INTEND'"]
+            else:
+                lines += block
+        for j in range(len(VARIABLES) * self.T, self.n_cols):
+            block = entries[M.indptr[j]:M.indptr[j + 1]]
+            if self.integrality[j]:
+                block = [f"    S{j} 'MARKER' 'INTORG'"] + block + [f"    S{j} 'MARKER' 'INTEND'"]
+            lines += block
+
+        rhs = np.where(sense == 'G', lo, hi)
+        lines.append('RHS')
+        nz = np.flatnonzero(rhs != 0)
+        lines += [f"    RHS {rows[r + 1]} {v!r}" for r, v in zip(nz.tolist(), rhs[nz].tolist())]
+
+        lines.append('BOUNDS')
+        for j, (l, u) in enumerate(zip(self.col_lower.tolist(), self.col_upper.tolist())):
+            if l == u:
+                lines.append(f" FX BND {cols[j]} {l!r}")
+                continue
+            if l == -np.inf:
+                lines.append(f" MI BND {cols[j]}")
+            elif l != 0:
+                lines.append(f" LO BND {cols[j]} {l!r}")
+            if u != np.inf:
+                lines.append(f" UP BND {cols[j]} {u!r}")
+        lines.append('ENDATA')
+        return lines
+
+    def _lp_lines(self):
+        cols, rows = self.col_names(), self.row_names()
+
+        def terms(idx, vals):
+            return ' '.join(f"{'-' if v < 0 else '+'} {abs(v)!r} {cols[j]}" for j, v in zip(idx, vals))
+
+        lines = ['\\ microgrid dispatch', 'Minimize']
+        nz = np.flatnonzero(self.c)
+        lines.append(' obj:')
+        lines += [f" {terms([j], [v])}" for j, v in zip(nz.tolist(), self.c[nz].tolist())]
+
+        lines.append('Subject To')
+        A = self.A
+        for r, (l, u) in enumerate(zip(self.row_lower.tolist(), self.row_upper.tolist())):
+            lhs = terms(A.indices[A.indptr[r]:A.indptr[r + 1]].tolist(), A.data[A.indptr[r]:A.indptr[r + 1]].tolist())
+            if l == u:
+                lines.append(f" {rows[r]}: {lhs} = {u!r}")
+            elif l == -np.inf:
+                lines.append(f" {rows[r]}: {lhs} <= {u!r}")
+            elif u == np.inf:
+                lines.append(f" {rows[r]}: {lhs} >= {l!r}")
+            else:
+                lines.append(f" {rows[r]}: {l!r} <= {lhs} <= {u!r}")
+
+        lines.append('Bounds')
+        for j, (l, u) in enumerate(zip(self.col_lower.tolist(), self.col_upper.tolist())):
+            if l == u:
+                lines.append(f" {cols[j]} = {l!r}")
+            elif u != np.inf or l != 0:
+                lower = '-inf' if l == -np.inf else repr(l)
+                upper = '+inf' if u == np.inf else repr(u)
+                lines.append(f" {lower} <= {cols[j]} <= {upper}")
+        lines.append('Binaries')
+        lines += [f" {cols[j]}" for j in np.flatnonzero(self.integrality).tolist()]
+        lines.append('End')
+        return lines
+
+
+def make_report(values, params, time_steps):
+    """
+    Report in the format of solver.solve_model.
+
+    Args:
+        values: {variable name: (T,) array}
+        params: {parameter name: (T,) array}
+        time_steps: hours of the arrays
+
+    Returns:
+        dict: {report key: {t: value}}
+    """
+    hours = np.asarray(time_steps).tolist()
+    report = {key: dict(zip(hours, np.asarray(values[name]).tolist())) for key, name in REPORT_VARIABLES.items()}
+    report['Load_el'] = dict(zip(hours, params['param_load'].tolist()))
+    report['Load_th'] = dict(zip(hours, params['H_demand'].tolist()))
+    return report
+
+
+# === SOLVERS ===
+
+def available_solvers():
+    """Backends of solve_sparse that can run here, in preference order"""
+    found = []
+    try:
+        import highspy  # noqa: F401
+        found.append('highs')
+    except ImportError:
+        pass
+    try:
+        from scipy.optimize import milp  # noqa: F401  (SciPy >= 1.9 ships HiGHS)
+        found.append('scipy')
+    except ImportError:
+        pass
+    try:
+        import pulp
+        if pulp.PULP_CBC_CMD().available():
+            found.append('cbc')
+    except ImportError:
+        pass
+    return found
+
+
+def solve_sparse(model, solver=None, mip_gap=0.001, time_limit=None, threads=None, log_file=None, tee=False):
+    """
+    Solve a SparseModel with an open-source MILP solver.
+
+    Args:
+        model: SparseModel
+        solver: 'highs' (highspy), 'scipy' (scipy.optimize.milp, also HiGHS) or 'cbc' (PuLP)
+                (default: the first of available_solvers())
+        mip_gap: relative MIP gap at which to stop
+        time_limit: wall-clock limit in seconds (None: no limit)
+        threads: solver threads (None: solver default; ignored by 'scipy')
+        log_file: solver log file ('highs' and 'cbc')
+        tee: print the solver log
+
+    Returns:
+        dict: 'x' (solution vector), 'objective', 'bound' (best lower bound), 'gap',
+              'status', 'solve_time' (s), 'solver'
+    """
+    if solver is None:
+        found = available_solvers()
+        if not found:
+            raise RuntimeError(f"No open-source MILP solver available (tried {', '.join(SOLVERS)})")
+        solver = found[0]
+    backends = {'highs': _solve_highs, 'scipy': _solve_scipy, 'cbc': _solve_cbc}
+    if solver not in backends:
+        raise ValueError(f"Unknown solver {solver!r}, expected one of {SOLVERS}")
+
+    start = time.perf_counter()
+    result = backends[solver](model, mip_gap, time_limit, threads, log_file, tee)
+    result['solve_time'] = time.perf_counter() - start
+    result['solver'] = solver
+    if result['x'] is None:
+        raise RuntimeError(f"{solver}: no feasible solution found ({result['status']})")
+    return result
+
+
+def _solve_highs(model, mip_gap, time_limit, threads, log_file, tee):
+    return PersistentHighs(mip_gap, time_limit, threads, log_file, tee).load(model).solve()
+
+
+class PersistentHighs:
+    """
+    A HiGHS instance that keeps a SparseModel loaded between solves.
+
+    update() sends only the costs, bounds and matrix coefficients that differ from the loaded
+    model, so a sequence of models with the same layout (rolling windows, parameter sweeps)
+    is not passed to the solver again as a whole. solve() can start from a (partial) solution.
+    """
+
+    def __init__(self, mip_gap=0.001, time_limit=None, threads=None, log_file=None, tee=False):
+        """
+        Args:
+            mip_gap: relative MIP gap at which to stop
+            time_limit: wall-clock limit per solve in seconds (None: no limit)
+            threads: HiGHS threads (None: HiGHS default)
+            log_file: HiGHS log file
+            tee: print the HiGHS log
+        """
+        import highspy
+        self._highspy = highspy
+        self.h = highspy.Highs()
+        self.h.setOptionValue('output_flag', bool(tee or log_file))
+        self.h.setOptionValue('log_to_console', bool(tee))
+        self.h.setOptionValue('mip_rel_gap', mip_gap)
+        if time_limit is not None:
+            self.h.setOptionValue('time_limit', float(time_limit))
+        if threads is not None:
+            self.h.setOptionValue('threads', int(threads))
+        if log_file:
+            self.h.setOptionValue('log_file', log_file)
+        self.model = None
+
+    def load(self, model):
+        """Pass a whole model to HiGHS"""
+        highspy = self._highspy
+        A = model.A.tocsc()
+        lp = highspy.HighsLp()
+        lp.num_col_, lp.num_row_ = model.n_cols, model.n_rows
+        lp.col_cost_ = model.c
+        lp.col_lower_, lp.col_upper_ = model.col_lower, model.col_upper
+        lp.row_lower_, lp.row_upper_ = model.row_lower, model.row_upper
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_, lp.a_matrix_.index_, lp.a_matrix_.value_ = A.indptr, A.indices, A.data
+        lp.integrality_ = [highspy.HighsVarType.kInteger if v else highspy.HighsVarType.kContinuous for v in model.integrality.tolist()]
+        self.h.passModel(lp)
+        self._loaded = self._snapshot(model)
+        self.model = model
+        return self
+
+    @staticmethod
+    def _snapshot(model):
+        return {'c': model.c.copy(), 'col_lower': model.col_lower.copy(), 'col_upper': model.col_upper.copy(),
+                'row_lower': model.row_lower.copy(), 'row_upper': model.row_upper.copy(), 'A': model.A.copy()}
+
+    def update(self, model):
+        """
+        Replace the loaded model by one of the same layout, sending only the changed values
+        (falls back to load() when the shape differs).
+
+        Returns:
+            int: number of changed values sent
+        """
+        if self.model is None or model.A.shape != self.model.A.shape:
+            self.load(model)
+            return model.n_cols + model.n_rows + model.A.nnz
+        h, old = self.h, self._loaded
+
+        cost = np.flatnonzero(model.c != old['c'])
+        if len(cost):
+            h.changeColsCost(len(cost), cost.astype(np.int32), model.c[cost])
+        cols = np.flatnonzero((model.col_lower != old['col_lower']) | (model.col_upper != old['col_upper']))
+        if len(cols):
+            h.changeColsBounds(len(cols), cols.astype(np.int32), model.col_lower[cols], model.col_upper[cols])
+        rows = np.flatnonzero((model.row_lower != old['row_lower']) | (model.row_upper != old['row_upper']))
+        if len(rows):
+            h.changeRowsBounds(len(rows), rows.astype(np.int32), model.row_lower[rows], model.row_upper[rows])
+        diff = (model.A - old['A']).tocoo()
+        diff.eliminate_zeros()
+        if diff.nnz:
+            new = np.asarray(model.A[diff.row, diff.col]).ravel()
+            for r, c, v in zip(diff.row.tolist(), diff.col.tolist(), new.tolist()):
+                h.changeCoeff(r, c, v)
+
+        self._loaded = self._snapshot(model)
+        self.model = model
+        return len(cost) + len(cols) + len(rows) + diff.nnz
+
+    def solve(self, warm_start=None):
+        """
+        Solve the loaded model.
+
+        Args:
+            warm_start: starting solution, either a full (n_cols,) vector or a partial one as
+                        (column indices, values); HiGHS completes and repairs it if it can
+
+        Returns:
+            dict: as solve_sparse
+        """
+        h = self.h
+        if warm_start is not None:
+            if isinstance(warm_start, tuple):
+                index, values = warm_start
+            else:
+                index, values = np.arange(self.model.n_cols), warm_start
+            h.setSolution(len(index), np.asarray(index, dtype=np.int32), np.asarray(values, dtype=np.float64))
+        start = time.perf_counter()
+        h.run()
+        info = h.getInfo()
+        has_solution = info.primal_solution_status == 2  # kSolutionStatusFeasible
+        return {
+            'x': np.array(h.getSolution().col_value) if has_solution else None,
+            'objective': info.objective_function_value if has_solution else np.nan,
+            'bound': info.mip_dual_bound,
+            'gap': info.mip_gap,
+            'status': h.modelStatusToString(h.getModelStatus()),
+            'solve_time': time.perf_counter() - start,
+            'solver': 'highs',
+        }
+
+
+def _solve_scipy(model, mip_gap, time_limit, threads, log_file, tee):
+    from scipy.optimize import milp, Bounds, LinearConstraint
+    options = {'disp': bool(tee), 'mip_rel_gap': mip_gap}
+    if time_limit is not None:
+        options['time_limit'] = float(time_limit)
+    res = milp(model.c, integrality=model.integrality, bounds=Bounds(model.col_lower, model.col_upper),
+               constraints=LinearConstraint(model.A, model.row_lower, model.row_upper), options=options)
+    return {
+        'x': res.x,
+        'objective': res.fun if res.x is not None else np.nan,
+        'bound': getattr(res, 'mip_dual_bound', np.nan),
+        'gap': getattr(res, 'mip_gap', np.nan),
+        'status': res.message,
+    }
+
+
+def _solve_cbc(model, mip_gap, time_limit, threads, log_file, tee):
+    import pulp
+    with tempfile.TemporaryDirectory() as tmp:
+        variables, problem = pulp.LpProblem.fromMPS(model.write(os.path.join(tmp, 'model.mps')), sense=pulp.LpMinimize)
+        cmd = pulp.PULP_CBC_CMD(msg=bool(tee), gapRel=mip_gap, timeLimit=time_limit, threads=threads, logPath=log_file)
+        problem.solve(cmd)
+    status = pulp.LpStatus[problem.status]
+    values = [variables[name].varValue for name in model.col_names()]
+    has_solution = problem.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible)
+    return {
+        'x': np.array(values, dtype=np.float64) if has_solution else None,
+        'objective': pulp.value(problem.objective) if has_solution else np.nan,
+        'bound': np.nan,  # not reported by PuLP
+        'gap': np.nan,
+        'status': status,
+    }
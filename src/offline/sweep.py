@@ -0,0 +1,186 @@
+import time
+import numpy as np
+from config import PARAM_FILES
+from data_loader import load_parameters
+from model import create_model
+from constraints import add_constraints
+from objective import add_objective
+from solver import extract_report
+
+# Parameters read while the constraints are built (which hours start an EV session or carry a
+# leave requirement): changing them needs a new model
+STRUCTURAL_PARAMS = ('session_start', 'leave_possible')
+
+
+def persistent_solver(solver_name='highs', mip_gap=0.001, time_limit=None, tee=False):
+    """
+    Pyomo APPSI persistent solver that keeps the model loaded between solves.
+
+    The model structure is taken as fixed: on each solve only the values of mutable Params are
+    re-read and the coefficients, bounds and costs depending on changed ones are updated.
+
+    Args:
+        solver_name: 'highs' or 'gurobi'
+        mip_gap: relative MIP gap
+        time_limit: time limit per solve in seconds (None: no limit)
+        tee: print the solver log
+    """
+    from pyomo.contrib.appsi.solvers import Highs, Gurobi
+    solvers = {'highs': Highs, 'gurobi': Gurobi}
+    if solver_name not in solvers:
+        raise ValueError(f"Unknown persistent solver {solver_name!r}, expected one of {tuple(solvers)}")
+    opt = solvers[solver_name]()
+    if not opt.available():
+        raise RuntimeError(f"Persistent solver {solver_name!r} is not available")
+    opt.config.mip_gap = mip_gap
+    opt.config.time_limit = time_limit
+    opt.config.stream_solver = tee
+    opt.config.load_solution = False
+
+    update = opt.update_config
+    update.check_for_new_or_removed_constraints = False
+    update.check_for_new_or_removed_vars = False
+    update.check_for_new_or_removed_params = False
+    update.check_for_new_objective = False
+    update.update_constraints = False
+    update.update_vars = False
+    update.update_named_expressions = False
+    update.update_objective = False
+    update.update_params = True
+    return opt
+
+
+class ParameterSweep:
+    """
+    Re-solve the Pyomo dispatch model for many parameter values without rebuilding it.
+
+    The model is built once with mutable Params and kept in a persistent solver. Each point
+    sets its parameters, puts back the base values of those the previous point changed, and
+    only the values that differ are written to the model (and passed on to the solver).
+    """
+
+    def __init__(self, params=None, solver_name='highs', mip_gap=0.001, time_limit=None, tee=False):
+        """
+        Args:
+            params: base parameters as returned by data_loader.load_parameters (default: loaded once)
+            solver_name: persistent solver, 'highs' or 'gurobi'
+            mip_gap: relative MIP gap
+            time_limit: time limit per solve in seconds (None: no limit)
+            tee: print the solver log
+        """
+        self.params = load_parameters() if params is None else params
+        self.model = add_objective(add_constraints(create_model(self.params, mutable=True)))
+        self.solver = persistent_solver(solver_name, mip_gap, time_limit, tee)
+        self._changed = set()  # parameters away from their base values
+
+    def set_params(self, changes):
+        """
+        Set parameters to new values and every other one back to its base value.
+
+        Args:
+            changes: {parameter name: value}, where the value is a scalar (the same at every
+                     hour), a (T,) array over config.TIME_STEPS or a {t: value} dict
+
+        Returns:
+            int: number of Param values written
+        """
+        written = sum(self._assign(name, self.params[name]) for name in self._changed - set(changes))
+        written += sum(self._assign(name, values) for name, values in changes.items())
+        self._changed = set(changes)
+        return written
+
+    def _assign(self, name, values):
+        if name not in PARAM_FILES:
+            raise ValueError(f"Unknown parameter {name!r}")
+        if name in STRUCTURAL_PARAMS:
+            raise ValueError(f"{name} shapes the constraints and cannot be swept on a built model")
+        p = getattr(self.model, name)
+        if not p.is_indexed():
+            if np.ndim(values) != 0:
+                raise ValueError(f"{name} is constant over the horizon in the base data: give a scalar")
+            if p.value == values:
+                return 0
+            p.value = float(values)
+            return 1
+
+        if isinstance(values, dict):
+            items = values.items()
+        elif np.ndim(values) == 0:
+            items = ((t, values) for t in self.model.T)
+        else:
+            values = np.asarray(values, dtype=np.float64)
+            if len(values) != len(self.model.T):
+                raise ValueError(f"{name}: expected {len(self.model.T)} values, got {len(values)}")
+            items = zip(self.model.T, values.tolist())
+        written = 0
+        for t, v in items:
+            if p[t].value != v:
+                p[t] = float(v)
+                written += 1
+        return written
+
+    def solve(self, changes=None, report=False):
+        """
+        Solve with the given parameter changes on top of the base values.
+
+        Args:
+            changes: {parameter name: value} (see set_params)
+            report: also return the schedule in the format of solver.solve_model
+
+        Returns:
+            dict: 'params', 'objective' (None without a feasible solution), 'bound', 'status',
+                  'solve_time' (s), 'changed' (Param values written) and optionally 'report'
+        """
+        changed = self.set_params(changes or {})
+        start = time.perf_counter()
+        res = self.solver.solve(self.model)
+        result = {
+            'params': changes or {},
+            'objective': res.best_feasible_objective,
+            'bound': res.best_objective_bound,
+            'status': res.termination_condition.name,
+            'solve_time': time.perf_counter() - start,
+            'changed': changed,
+        }
+        if report and res.best_feasible_objective is not None:
+            res.solution_loader.load_vars()
+            result['report'] = extract_report(self.model)
+        return result
+
+    def run(self, points, report=False, verbose=True):
+        """
+        Solve every point of a sweep, then restore the base values.
+
+        Args:
+            points: list of {parameter name: value} dicts
+            report: also return each schedule
+            verbose: print one line per point
+
+        Returns:
+            list of dicts as returned by solve()
+        """
+        results = []
+        for i, point in enumerate(points):
+            results.append(self.solve(point, report))
+            if verbose:
+                r = results[-1]
+                objective = 'n/a' if r['objective'] is None else f"{r['objective']:.4f}"
+                print(f"Point {i}: {r['status']}, objective {objective}, "
+                      f"{r['changed']} values changed, {r['solve_time']:.3f}s")
+        self.set_params({})
+        return results
+
+
+def scaled_points(params, name, factors):
+    """Sweep points that scale the base values of one parameter by each factor"""
+    base = params[name]
+    if isinstance(base, dict):
+        return [{name: {t: v * f for t, v in base.items()}} for f in factors]
+    return [{name: base * f} for f in factors]
+
+
+if __name__ == '__main__':
+    sweep = ParameterSweep()
+    for name in ('rho_fuel', 'C_startup', 'price_import'):
+        print(f"=== {name} ===")
+        sweep.run(scaled_points(sweep.params, name, np.linspace(0.5, 1.5, 11)))